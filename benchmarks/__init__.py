@@ -0,0 +1,13 @@
+# benchmarks/__init__.py
+"""
+Micro-benchmarks of the hot paths. Each module runs on its own:
+
+    python -m benchmarks.<module> [--help]
+
+They use the same placeholder configuration as the tests and never touch
+Meta, OpenAI or a real database.
+"""
+from core.testing import use_placeholder_env
+
+# La configuración se valida al importar core: mismos valores que los tests
+use_placeholder_env()
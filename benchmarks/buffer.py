@@ -0,0 +1,146 @@
+# benchmarks/buffer.py
+"""
+Memory and CPU of the message buffers with many live conversations:
+MessageBufferManager (only unprocessed messages, indexed by id) against the
+previous layout (every message kept in a list with a `processed` flag until
+the buffer TTL). Each conversation receives `messages` messages, drained in
+groups of `group` like a debounced turn. Both keep at most 10k buffers.
+
+    python -m benchmarks.buffer [--conversations 10000] [--messages 20] [--group 4]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from cachetools import TTLCache
+
+from core.storage.cache import MessageBufferManager
+
+
+class _ListBuffers:
+    """Layout anterior: lista de mensajes con flag `processed` hasta el TTL"""
+
+    def __init__(self):
+        self.buffer = TTLCache(maxsize=10000, ttl=3600)
+        self._arrivals = {}
+
+    def create(self, key: str) -> None:
+        if key not in self.buffer:
+            self.buffer[key] = {
+                "metadata": {"sender": key, "last_message_at": time.monotonic()},
+                "messages": [],
+            }
+
+    async def add_message(self, key: str, message_data: dict) -> None:
+        self.buffer[key]["messages"].append(
+            {
+                **message_data,
+                "processed": False,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        self.buffer[key]["metadata"]["last_message_at"] = time.monotonic()
+        arrival = self._arrivals.pop(key, None)
+        if arrival:
+            arrival.set()
+
+    def get_unprocessed_messages(self, key: str) -> list:
+        return [
+            msg for msg in self.buffer[key]["messages"] if not msg.get("processed", False)
+        ]
+
+    async def has_new_pending_messages(self, key: str, ids: list) -> bool:
+        unprocessed = self.get_unprocessed_messages(key)
+        return len([m for m in unprocessed if m["message"]["id"] not in ids]) > 0
+
+    def mark_messages_processed(self, key: str, ids: list) -> None:
+        for message in self.buffer[key]["messages"]:
+            if message.get("message", {}).get("id") in ids:
+                message["processed"] = True
+
+
+class _IndexedBuffers:
+    def __init__(self):
+        self.manager = MessageBufferManager(buffer_ttl=3600)
+        self.waba = SimpleNamespace(waba_id="w1")
+
+    def create(self, key: str) -> None:
+        self.manager.get_or_create_buffer(self.waba, key, f"conv-{key}")
+
+    async def add_message(self, key: str, message: dict) -> None:
+        await self.manager.add_message(f"{key}_w1", message)
+
+    def get_unprocessed_messages(self, key: str) -> list:
+        return self.manager.get_unprocessed_messages(f"{key}_w1")
+
+    async def has_new_pending_messages(self, key: str, ids: list) -> bool:
+        return await self.manager.has_new_pending_messages(f"{key}_w1", ids)
+
+    def mark_messages_processed(self, key: str, ids: list) -> None:
+        self.manager.mark_messages_processed(f"{key}_w1", ids)
+
+
+def _message(sender: str, i: int) -> dict:
+    return {
+        "message": {
+            "id": f"wamid.{sender}.{i}",
+            "from": sender,
+            "timestamp": "1700000000",
+            "type": "text",
+            "text": {"body": "Hola, quería consultar por el curso " * 3},
+        },
+        "type": "text",
+        "sender": sender,
+    }
+
+
+async def _workload(buffers, conversations: int, messages: int, group: int) -> None:
+    senders = [f"549{i:08d}" for i in range(conversations)]
+    for sender in senders:
+        buffers.create(sender)
+    for start in range(0, messages, group):
+        for sender in senders:
+            for i in range(start, min(start + group, messages)):
+                await buffers.add_message(sender, _message(sender, i))
+            ids = [m["message"]["id"] for m in buffers.get_unprocessed_messages(sender)]
+            await buffers.has_new_pending_messages(sender, ids)
+            buffers.mark_messages_processed(sender, ids)
+
+
+def _run(factory, conversations: int, messages: int, group: int):
+    # CPU sin tracemalloc, memoria retenida en una segunda pasada
+    buffers = factory()
+    start = time.process_time()
+    asyncio.run(_workload(buffers, conversations, messages, group))
+    cpu = time.process_time() - start
+    del buffers
+
+    tracemalloc.start()
+    buffers = factory()
+    asyncio.run(_workload(buffers, conversations, messages, group))
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, retained / 2**20, peak / 2**20
+
+
+def main(conversations: int, messages: int, group: int) -> None:
+    print(f"{conversations} conversations x {messages} messages, drained in groups of {group}")
+    print(f"{'layout':>10} {'cpu s':>7} {'retained MB':>12} {'peak MB':>9}")
+    for name, factory in (
+        ("list", _ListBuffers),
+        ("indexed", _IndexedBuffers),
+    ):
+        cpu, retained, peak = _run(factory, conversations, messages, group)
+        print(f"{name:>10} {cpu:>7.2f} {retained:>12.1f} {peak:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--conversations", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--group", type=int, default=4)
+    args = parser.parse_args()
+    main(args.conversations, args.messages, args.group)
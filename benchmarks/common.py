@@ -0,0 +1,96 @@
+# benchmarks/common.py
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Sequence
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile, 0 for an empty sample"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summary(values: Sequence[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values), 3) if values else 0.0,
+    }
+
+
+class LoopLag:
+    """
+    Measures event-loop lag: a ticker sleeps `interval` seconds and records
+    how late it wakes up. A blocked loop shows up as large lags.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.lags_ms: List[float] = []
+        self._task = None
+
+    async def _tick(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags_ms.append((time.perf_counter() - start - self.interval) * 1000)
+
+    async def __aenter__(self) -> "LoopLag":
+        self._task = asyncio.create_task(self._tick())
+        # El ticker arranca antes que la carga medida
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        # Deja registrar el tick atrasado por un loop que estuvo bloqueado
+        await asyncio.sleep(self.interval * 2)
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+class _FakeRestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.03
+
+    def _reply(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(self.latency)
+        now = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+        body = json.dumps([{"id": "c1", "last_activity_at": f"{now}.0"}]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PATCH = _reply
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@contextmanager
+def fake_rest_server(latency: float = 0.03) -> Iterator[str]:
+    """
+    Local PostgREST stand-in answering every request after `latency`
+    seconds with one conversation row. Yields its base URL
+    """
+    handler = type("Handler", (_FakeRestHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
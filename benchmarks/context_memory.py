@@ -0,0 +1,104 @@
+# benchmarks/context_memory.py
+"""
+Memory of the in-process conversation history: ConversationContext
+(slotted ContextMessage records) against the previous layout (a dict per
+conversation holding {"role", "content"} dicts). Every conversation is
+primed with `messages` rows freshly decoded from JSON, as hydration does.
+
+    python -m benchmarks.context_memory [--conversations 10000 50000 100000]
+        [--messages 10]
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from cachetools import TTLCache
+
+from core.storage.cache import ConversationContext
+from core.utils.tokens import count_message_tokens
+
+
+class _DictContext:
+    """Layout anterior: un dict por conversación con los mensajes como dicts"""
+
+    def __init__(self, max_contexts: int):
+        self.contexts = TTLCache(maxsize=max_contexts, ttl=3600)
+
+    def prime(self, waba_id: str, sender: str, messages: list) -> None:
+        key = f"{sender}_{waba_id}"
+        if key in self.contexts:
+            return
+        self.contexts[key] = {
+            "prefix_instructions": [],
+            "messages": list(messages),
+            "temp_context": [],
+            "summary": None,
+            "history_tokens": count_message_tokens(messages),
+        }
+
+    def get_full_context(self, waba_id: str, sender: str) -> list:
+        context = self.contexts[f"{sender}_{waba_id}"]
+        return (
+            context["prefix_instructions"] + context["temp_context"] + context["messages"]
+        )
+
+
+def _rows(conversation: int, messages: int) -> list:
+    # Strings nuevos en cada fila, como los de una respuesta de la base
+    return json.loads(
+        json.dumps(
+            [
+                {
+                    "role": "user" if j % 2 == 0 else "assistant",
+                    "content": f"mensaje {j} de la conversación {conversation} " + "x" * 60,
+                }
+                for j in range(messages)
+            ]
+        )
+    )
+
+
+def _measure(context, conversations: int, messages: int) -> tuple:
+    # Las filas se decodifican dentro de la medición, como en la hidratación:
+    # lo que el contexto no retiene se libera y no cuenta
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(conversations):
+        context.prime("w1", f"549{i:08d}", _rows(i, messages))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    sample = range(0, conversations, 10)
+    start = time.perf_counter()
+    for i in sample:
+        context.get_full_context("w1", f"549{i:08d}")
+    per_call = (time.perf_counter() - start) / len(sample) * 1e6
+    return retained / 2**20, per_call
+
+
+def main(conversation_counts, messages: int) -> None:
+    print(f"{messages} messages per conversation")
+    print(f"{'conversations':>14} {'dicts MiB':>10} {'slots MiB':>10} {'saved':>6} {'full ctx us':>14}")
+    for conversations in conversation_counts:
+        old, old_us = _measure(_DictContext(conversations), conversations, messages)
+        new, new_us = _measure(
+            ConversationContext(max_contexts=conversations), conversations, messages
+        )
+        print(
+            f"{conversations:>14} {old:>10.1f} {new:>10.1f} {(1 - new / old) * 100:>5.0f}% "
+            f"{old_us:>6.1f} ->{new_us:>5.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--conversations", type=int, nargs="+", default=[10000, 50000, 100000]
+    )
+    parser.add_argument("--messages", type=int, default=10)
+    args = parser.parse_args()
+    main(args.conversations, args.messages)
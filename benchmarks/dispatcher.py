@@ -0,0 +1,86 @@
+# benchmarks/dispatcher.py
+"""
+Throughput of SenderAffinityDispatcher with 1, 2 and 4 worker processes.
+Each payload is one message from one of `senders` chats; the workers run
+a stub handler instead of process_meta_webhook, either CPU-bound (context
+building, parsing) or I/O-bound (a DB/LLM call in the loop).
+
+    python -m benchmarks.dispatcher [--payloads 3000] [--senders 500]
+        [--workers 1 2 4] [--handler cpu io]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from core.models.webhook import decode_webhook
+from core.services.dispatcher import SenderAffinityDispatcher
+from core.testing import payloads
+
+
+async def cpu_handler(payload) -> None:
+    digest = b"x"
+    for _ in range(2000):
+        digest = hashlib.sha256(digest).digest()
+
+
+async def io_handler(payload) -> None:
+    await asyncio.sleep(0.005)
+
+
+HANDLERS = {"cpu": "benchmarks.dispatcher.cpu_handler", "io": "benchmarks.dispatcher.io_handler"}
+
+
+def _raws(count: int, senders: int) -> list:
+    return [
+        json.dumps(
+            payloads.envelope(
+                payloads.entry(
+                    payloads.change(
+                        messages=[
+                            payloads.text_message(f"549{i % senders:08d}", f"wamid.{i}")
+                        ]
+                    )
+                )
+            )
+        ).encode()
+        for i in range(count)
+    ]
+
+
+async def _run(raws: list, workers: int, handler: str) -> float:
+    dispatcher = SenderAffinityDispatcher(workers, handler_path=HANDLERS[handler])
+    dispatcher.start()
+    # El worker atiende el canal de control cuando ya arrancó: sirve de barrera
+    await dispatcher.call("metrics", timeout=60)
+
+    start = time.perf_counter()
+    for raw in raws:
+        await dispatcher.dispatch(raw, decode_webhook(raw))
+    # stop() espera a que los workers vacíen sus colas
+    await dispatcher.stop(timeout=300)
+    return time.perf_counter() - start
+
+
+def main(count: int, senders: int, worker_counts, handlers) -> None:
+    raws = _raws(count, senders)
+    print(f"{count} payloads, {senders} senders, {os.cpu_count()} CPUs")
+    print(f"{'handler':>8} {'workers':>8} {'msg/s':>8} {'speedup':>8}")
+    for handler in handlers:
+        base = None
+        for workers in worker_counts:
+            rate = count / asyncio.run(_run(raws, workers, handler))
+            base = base or rate
+            print(f"{handler:>8} {workers:>8} {rate:>8.0f} {rate / base:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--payloads", type=int, default=3000)
+    parser.add_argument("--senders", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--handler", nargs="+", choices=list(HANDLERS), default=["cpu", "io"])
+    args = parser.parse_args()
+    main(args.payloads, args.senders, args.workers, args.handler)
@@ -0,0 +1,84 @@
+# benchmarks/fanout.py
+"""
+Throughput of process_meta_webhook on batched payloads (several entries,
+senders and messages per POST) for a few WEBHOOK_FANOUT_CONCURRENCY
+values. Tenant resolution and the message handler are stubbed; the
+handler takes `latency` seconds, like a buffered add plus a DB write.
+
+    python -m benchmarks.fanout [--payloads 4] [--entries 2] [--senders 25]
+        [--messages 2] [--latency 0.01] [--concurrency 1 8 32]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from core.models.webhook import decode_webhook
+from core.routers import webhook_processor
+from core.testing import payloads
+from core.testing.fakes import RoutingStub
+
+
+def _payloads(count: int, entries: int, senders: int, messages: int) -> list:
+    raws = []
+    for p in range(count):
+        raws.append(
+            json.dumps(
+                payloads.envelope(
+                    *(
+                        payloads.entry(
+                            payloads.change(
+                                messages=[
+                                    payloads.text_message(
+                                        f"549{p}{e}{s:03d}", f"wamid.{p}.{e}.{s}.{i}"
+                                    )
+                                    for s in range(senders)
+                                    for i in range(messages)
+                                ]
+                            ),
+                            waba_id=f"waba{e}",
+                        )
+                        for e in range(entries)
+                    )
+                )
+            ).encode()
+        )
+    return raws
+
+
+async def _run(raws: list, latency: float, concurrency: int) -> tuple:
+    stub = RoutingStub(latency=latency)
+    stub.install(setattr)
+    webhook_processor._fanout_semaphore = asyncio.Semaphore(concurrency)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(webhook_processor.process_meta_webhook(decode_webhook(raw)) for raw in raws)
+    )
+    elapsed = time.perf_counter() - start
+    await webhook_processor.conversation_scheduler.stop()
+    return len(stub.handled), elapsed
+
+
+def main(args) -> None:
+    raws = _payloads(args.payloads, args.entries, args.senders, args.messages)
+    total = args.payloads * args.entries * args.senders * args.messages
+    print(
+        f"{args.payloads} payloads x {args.entries} entries x {args.senders} senders "
+        f"x {args.messages} messages = {total} messages, handler {args.latency * 1000:.0f} ms"
+    )
+    print(f"{'concurrency':>12} {'handled':>8} {'seconds':>8} {'msg/s':>8}")
+    for concurrency in args.concurrency:
+        handled, elapsed = asyncio.run(_run(raws, args.latency, concurrency))
+        print(f"{concurrency:>12} {handled:>8} {elapsed:>8.2f} {handled / elapsed:>8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--payloads", type=int, default=4)
+    parser.add_argument("--entries", type=int, default=2)
+    parser.add_argument("--senders", type=int, default=25)
+    parser.add_argument("--messages", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+# benchmarks/loop_lag.py
+"""
+Event-loop lag of concurrent message turns: the blocking PostgREST client
+(what the removed sync DBStorage did) against AsyncDBStorage on the pooled
+async client. Each turn is get_or_create_conversation plus save_message,
+4 round trips to a local fake PostgREST with a fixed latency.
+
+    python -m benchmarks.loop_lag [--turns 10 50 200] [--latency 0.03]
+"""
+import argparse
+import asyncio
+import time
+
+from postgrest import SyncPostgrestClient
+
+from benchmarks.common import LoopLag, fake_rest_server, summary
+from core.storage.db import AsyncDBStorage
+from core.utils.supabase_client import create_async_postgrest
+
+
+def _message(i: int) -> dict:
+    return {
+        "message": {"id": f"wamid.{i}", "text": {"body": "hola"}},
+        "type": "text",
+        "sender": f"549{i}",
+        "waba_id": "w1",
+    }
+
+
+async def _sync_turn(client: SyncPostgrestClient, i: int) -> None:
+    # Las mismas 4 consultas, bloqueando el loop en cada una
+    client.table("conversations").select("id, last_activity_at").eq(
+        "phone_number", f"549{i}"
+    ).execute()
+    client.table("conversations").select("id").eq("id", "c1").execute()
+    client.table("messages").insert({"conversation_id": "c1"}).execute()
+    client.table("conversations").update({"status": "active"}).eq("id", "c1").execute()
+
+
+async def _async_turn(db: AsyncDBStorage, i: int) -> None:
+    conversation_id = await db.get_or_create_conversation("w1", f"549{i}")
+    await db.save_message(conversation_id, _message(i))
+
+
+async def _measure(turns: int, run_turn) -> tuple:
+    async with LoopLag() as lag:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_turn(i) for i in range(turns)))
+        wall = time.perf_counter() - start
+    return wall, summary(lag.lags_ms)
+
+
+async def main(turn_counts, latency: float) -> None:
+    with fake_rest_server(latency) as url:
+        headers = {"apikey": "k", "Authorization": "Bearer k"}
+        sync_client = SyncPostgrestClient(f"{url}/rest/v1", headers=headers)
+        async_client = create_async_postgrest(url, "k")
+        db = AsyncDBStorage(async_client)
+
+        print(f"{'turns':>6} {'mode':>6} {'wall s':>8} {'lag p50':>9} {'lag p99':>9} {'lag max':>9}")
+        for turns in turn_counts:
+            for mode, run_turn in (
+                ("sync", lambda i: _sync_turn(sync_client, i)),
+                ("async", lambda i: _async_turn(db, i)),
+            ):
+                wall, lag = await _measure(turns, run_turn)
+                print(
+                    f"{turns:>6} {mode:>6} {wall:>8.2f} {lag['p50']:>7.1f}ms "
+                    f"{lag['p99']:>7.1f}ms {lag['max']:>7.1f}ms"
+                )
+
+        sync_client.aclose()
+        await async_client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--latency", type=float, default=0.03)
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.latency))
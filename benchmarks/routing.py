@@ -0,0 +1,65 @@
+# benchmarks/routing.py
+"""
+Tenant resolution per webhook: ConfigManager.resolve_client (indexed)
+against the linear scan over the registered clients it replaced, with few
+and many tenants. The looked-up tenant is the last one registered, the
+worst case of the scan.
+
+    python -m benchmarks.routing [--tenants 2 500] [--calls 100000]
+"""
+import argparse
+import timeit
+from types import SimpleNamespace
+
+from core.config.manager import ConfigManager
+
+
+def _manager(tenants: int) -> ConfigManager:
+    manager = ConfigManager()
+    for i in range(tenants):
+        manager.register_client(
+            f"client{i}",
+            SimpleNamespace(
+                waba_config=SimpleNamespace(waba_id=f"waba{i}", phone_number_id=f"phone{i}")
+            ),
+        )
+    return manager
+
+
+def _scan(manager: ConfigManager, waba_id: str, phone_id: str):
+    # Ruteo anterior: recorrer todos los clientes
+    for client_id, config in manager._clients.items():
+        if (
+            config.waba_config.waba_id == waba_id
+            or config.waba_config.phone_number_id == phone_id
+        ):
+            return client_id, config
+    return None, None
+
+
+def main(tenant_counts, calls: int) -> None:
+    print(f"{'tenants':>8} {'indexed us':>11} {'scan us':>9} {'miss indexed':>13} {'miss scan':>10}")
+    for tenants in tenant_counts:
+        manager = _manager(tenants)
+        last = tenants - 1
+        hit = (f"waba{last}", f"phone{last}")
+        miss = ("unknown", "unknown")
+        assert manager.resolve_client(*hit)[0] == _scan(manager, *hit)[0]
+
+        results = [
+            timeit.timeit(lambda args=args, f=f: f(*args), number=calls) / calls * 1e6
+            for args in (hit, miss)
+            for f in (manager.resolve_client, lambda *a: _scan(manager, *a))
+        ]
+        print(
+            f"{tenants:>8} {results[0]:>11.3f} {results[1]:>9.3f} "
+            f"{results[2]:>13.3f} {results[3]:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tenants", type=int, nargs="+", default=[2, 500])
+    parser.add_argument("--calls", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.tenants, args.calls)
@@ -0,0 +1,91 @@
+# benchmarks/snapshot.py
+"""
+Warm-restart cost of StateSnapshotter: snapshot size, write time and
+restore time (decode plus rebuilding the contexts) with N conversations
+of `messages` messages each, with the generational GC paused during the
+synchronous restore sections and without the pause. A client keeps at
+most 10,000 contexts in memory (ConversationContext max_contexts).
+
+    python -m benchmarks.snapshot [--conversations 1000 10000] [--messages 10]
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import os
+import tempfile
+import time
+
+from clients import register_all_clients
+from core.models.enums import MessageRole
+from core.routers import webhook_processor
+from core.services import snapshot
+
+
+def _fill(conversations: int, messages: int) -> None:
+    context = webhook_processor.get_or_create_container("demo").context
+    for c in range(conversations):
+        for i in range(messages):
+            role = MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT
+            content = f"mensaje {i} de la conversación {c} " + "x" * 40
+            context.add_message("w1", f"549{c:08d}", role, content)
+
+
+async def _restore(path: str, pause_gc: bool) -> float:
+    webhook_processor._client_containers.clear()
+    gc.collect()
+    original = snapshot._gc_paused
+    if not pause_gc:
+        snapshot._gc_paused = contextlib.nullcontext
+    try:
+        start = time.perf_counter()
+        counts = await snapshot.StateSnapshotter(path, interval=0).restore()
+        elapsed = time.perf_counter() - start
+    finally:
+        snapshot._gc_paused = original
+    assert counts["contexts"] > 0
+    return elapsed
+
+
+async def _run(conversations: int, messages: int, path: str) -> tuple:
+    webhook_processor._client_containers.clear()
+    _fill(conversations, messages)
+    snapshotter = snapshot.StateSnapshotter(path, interval=0)
+    start = time.perf_counter()
+    await snapshotter.write()
+    write = time.perf_counter() - start
+
+    # El GC tiene que estar prendido para que la comparación tenga sentido
+    assert gc.isenabled()
+    without = await _restore(path, pause_gc=False)
+    paused = await _restore(path, pause_gc=True)
+    return os.path.getsize(path) / 2**20, write, without, paused
+
+
+def main(conversation_counts, messages: int) -> None:
+    register_all_clients()
+    print(f"{messages} messages per conversation")
+    print(
+        f"{'conversations':>14} {'MiB':>7} {'write ms':>9} "
+        f"{'restore ms':>11} {'gc paused ms':>13}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.snapshot")
+        for conversations in conversation_counts:
+            size, write, without, paused = asyncio.run(
+                _run(conversations, messages, path)
+            )
+            print(
+                f"{conversations:>14} {size:>7.1f} {write * 1000:>9.0f} "
+                f"{without * 1000:>11.0f} {paused * 1000:>13.0f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--conversations", type=int, nargs="+", default=[1000, 10000]
+    )
+    parser.add_argument("--messages", type=int, default=10)
+    args = parser.parse_args()
+    main(args.conversations, args.messages)
@@ -0,0 +1,63 @@
+# benchmarks/webhook_parse.py
+"""
+Parse cost per webhook event: decode_webhook into msgspec structs plus
+the dict handed to the handler (the raw original of a message, to_dict of
+a status), against the previous path (json.loads,
+normalize_webhook_payload and a json.dumps of the whole body for the log).
+
+    python -m benchmarks.webhook_parse [--iterations 50000]
+"""
+import argparse
+import json
+import timeit
+
+from core.models.webhook import decode_webhook
+from core.testing import payloads
+from core.utils.normalization import normalize_webhook_payload
+
+SENDER = "16505551234"
+WAMID = "wamid.HBgLMTY1MDM4Nzk0MzkVAgASGBQzQTRBNjU5OUFFRTAzODEwMTQ0RgA="
+
+CASES = {
+    "text": payloads.change(messages=[payloads.text_message(SENDER, WAMID)]),
+    "interactive": payloads.change(messages=[payloads.interactive_message(SENDER, WAMID)]),
+    "status": payloads.change(statuses=[payloads.status(SENDER, WAMID)]),
+}
+
+
+def _previous(raw: bytes) -> None:
+    body = json.loads(raw)
+    json.dumps(body)
+    value = normalize_webhook_payload(body)["entry"][0]["changes"][0]["value"]
+    value.get("messages", value.get("statuses"))[0]
+
+
+def _current(raw: bytes) -> None:
+    value = decode_webhook(raw).normalized().entry[0].changes[0].value
+    for message in value.messages:
+        message.original()
+    for status in value.statuses:
+        status.to_dict()
+
+
+def main(iterations: int) -> None:
+    print(f"{'event':>12} {'bytes':>6} {'previous us':>12} {'current us':>11} {'speedup':>8}")
+    for name, change in CASES.items():
+        raw = json.dumps(payloads.envelope(payloads.entry(change))).encode()
+        results = [
+            min(timeit.repeat(lambda f=f: f(raw), number=iterations, repeat=3))
+            / iterations
+            * 1e6
+            for f in (_previous, _current)
+        ]
+        print(
+            f"{name:>12} {len(raw):>6} {results[0]:>12.2f} {results[1]:>11.2f} "
+            f"{results[0] / results[1]:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args()
+    main(args.iterations)
@@ -19,6 +19,14 @@ from ..prompts import CATEGORIZE_PROMPT
 
 logger = logging.getLogger(__name__)
 
+# Tools con efectos visibles para el usuario: el turno se compromete antes
+# de ejecutarlas, así una cancelación no las repite
+SIDE_EFFECT_TOOLS = {
+    "send_emprendemy_contact",
+    "send_sign_up_message",
+    "send_conversation_to_supervisor",
+}
+
 
 class OpenAIHandler(BaseOpenAIHandler):
     """
@@ -47,6 +55,10 @@ class OpenAIHandler(BaseOpenAIHandler):
             self._functions_handler_initialized = True
 
     async def handle_openai_process(self) -> None:
+        # El turno se cancela apenas llega un mensaje nuevo al buffer
+        await self.run_superseding_turn(self._run_turn)
+
+    async def _run_turn(self) -> None:
         try:
             # Get conversation context
             context_messages = self.service_container.context.get_messages(
@@ -82,12 +94,11 @@ class OpenAIHandler(BaseOpenAIHandler):
                         for cat, conf in category_info
                     ]
 
-                    for message_id in self.current_processing_ids:
-                        await self.service_container.db.update_message_metadata(
-                            self.conversation_id,
-                            message_id,
-                            {"categories": categories_data},
-                        )
+                    await self.service_container.db.merge_messages_metadata(
+                        self.conversation_id,
+                        self.current_processing_ids,
+                        {"categories": categories_data},
+                    )
 
             # Get instructions based on categories and strategy
             if (
@@ -179,6 +190,9 @@ class OpenAIHandler(BaseOpenAIHandler):
             function_name = tool_call.function.name
             function_args = json.loads(tool_call.function.arguments)
 
+            if function_name in SIDE_EFFECT_TOOLS and not await self.commit_response():
+                return False, []
+
             result = await self.functions_handler.execute_function(
                 function_name,
                 function_args,
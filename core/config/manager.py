@@ -1,7 +1,10 @@
 # core/config/manager.py
-from typing import Dict, Optional
+import logging
+from typing import Dict, Optional, Set, Tuple
 from core.models.config import ProjectConfig, ClientConfig
 
+logger = logging.getLogger(__name__)
+
 
 class ConfigManager:
     """Manages loading and access to all configurations"""
@@ -10,9 +13,80 @@ class ConfigManager:
         self._project_config = ProjectConfig()
         self._clients: Dict[str, ClientConfig] = {}
 
+        # Índices de ruteo para resolver el cliente de un webhook en O(1).
+        # Un phone number pertenece a un solo cliente; una WABA puede tener
+        # números de varios clientes
+        self._clients_by_waba_id: Dict[str, Set[str]] = {}
+        self._clients_by_phone_number_id: Dict[str, str] = {}
+
     def register_client(self, client_id: str, config: ClientConfig):
         """Register a client configuration"""
+        previous = self._clients.get(client_id)
+        if previous is not None:
+            self._unindex_client(client_id, previous)
+
         self._clients[client_id] = config
+        self._index_client(client_id, config)
+
+    def unregister_client(self, client_id: str) -> None:
+        """Remove a client and its routing entries"""
+        config = self._clients.pop(client_id, None)
+        if config is not None:
+            self._unindex_client(client_id, config)
+
+    def _index_client(self, client_id: str, config: ClientConfig) -> None:
+        waba_config = config.waba_config
+        if waba_config.waba_id:
+            owners = self._clients_by_waba_id.setdefault(waba_config.waba_id, set())
+            owners.add(client_id)
+            if len(owners) > 1:
+                logger.warning(
+                    f"WABA {waba_config.waba_id} is shared by clients "
+                    f"{sorted(owners)}: its webhooks are routed by phone number ID only"
+                )
+        if waba_config.phone_number_id:
+            owner = self._clients_by_phone_number_id.get(waba_config.phone_number_id)
+            if owner is not None and owner != client_id:
+                logger.error(
+                    f"Phone number ID {waba_config.phone_number_id} of client "
+                    f"{client_id} was already registered by client {owner}"
+                )
+            self._clients_by_phone_number_id[waba_config.phone_number_id] = client_id
+
+    def _unindex_client(self, client_id: str, config: ClientConfig) -> None:
+        waba_config = config.waba_config
+        owners = self._clients_by_waba_id.get(waba_config.waba_id)
+        if owners is not None:
+            # Otros clientes pueden seguir compartiendo la WABA
+            owners.discard(client_id)
+            if not owners:
+                del self._clients_by_waba_id[waba_config.waba_id]
+        if (
+            self._clients_by_phone_number_id.get(waba_config.phone_number_id)
+            == client_id
+        ):
+            del self._clients_by_phone_number_id[waba_config.phone_number_id]
+
+    def resolve_client(
+        self, waba_id: Optional[str], phone_number_id: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[ClientConfig]]:
+        """
+        Resolve the client that owns a phone number ID or, failing that, a
+        WABA ID. A WABA shared by several clients does not resolve by itself.
+        """
+        client_id = (
+            self._clients_by_phone_number_id.get(phone_number_id)
+            if phone_number_id
+            else None
+        )
+        if client_id is None and waba_id:
+            owners = self._clients_by_waba_id.get(waba_id)
+            if owners and len(owners) == 1:
+                client_id = next(iter(owners))
+
+        if client_id is None:
+            return None, None
+        return client_id, self._clients.get(client_id)
 
     def get_client_config(self, client_id: str) -> Optional[ClientConfig]:
         """Get configuration for a specific client"""
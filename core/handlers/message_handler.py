@@ -5,6 +5,7 @@ from typing import Any, Dict
 
 from core.models.waba import WABAConfig
 from core.services.message import initialize_message, process_buffered_messages
+from core.services.scheduler import conversation_scheduler
 from core.utils.helpers import message_to_text_type
 
 logger = logging.getLogger(__name__)
@@ -30,18 +31,22 @@ async def handle_message_case(
             return
 
         # Initialize message
-        await initialize_message(
+        _, buffer_key = await initialize_message(
             message, sender, waba_config, text_content, service_container
         )
-        # Process buffered messages
-        await process_buffered_messages(
-            waba_config,
-            sender,
-            service_container.message_buffer_manager,
-            service_container,
+        # Process buffered messages: un único drain por conversación; si ya hay
+        # uno en curso, vuelve a recorrer el buffer al terminar
+        conversation_scheduler.request_drain(
+            buffer_key,
+            lambda: process_buffered_messages(
+                waba_config,
+                sender,
+                service_container.message_buffer_manager,
+                service_container,
+            ),
         )
 
-        logger.info(f"Completed message processing for {sender}")
+        logger.info(f"Completed message initialization for {sender}")
 
     except Exception as e:
         logger.error(
@@ -1,5 +1,6 @@
 # core/main.py
 from clients import register_all_clients
+import asyncio
 import logging
 from fastapi import FastAPI, APIRouter, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,12 +9,26 @@ from contextlib import asynccontextmanager
 
 from core.services.container import ServiceContainer
 from core.utils.logging import setup_logging
-from core.utils.supabase_client import supabase
+from core.utils.supabase_client import async_supabase, supabase
 
 from core.services.sync_service import SyncService
 from core.config import config_manager
-from core.routers.meta_webhooks.messages import router as verification_router
-from core.routers.meta_webhooks.verification import router as messages_router
+from core.routers.meta_webhooks.messages import router as messages_router
+from core.routers.meta_webhooks.verification import router as verification_router
+from core.routers.meta_webhooks.dispatch import router as dispatch_router
+from core.routers.history import router as history_router
+from core.routers.metrics import router as metrics_router
+from core.routers.wabas import router as wabas_router
+from core.services.dispatcher import webhook_dispatcher
+from core.services.hydration import prefetch_recent_contexts
+from core.services.ingest import ingest_queue
+from core.services.message_writer import message_writer
+from core.services.scheduler import conversation_scheduler
+from core.services.snapshot import state_snapshotter
+from core.services.statuses import status_tracker
+from core.services.waba import subscribe_waba_reloads
+from core.storage.state import state_backend
+from core.utils.tokens import load_encodings
 
 
 setup_logging()
@@ -38,12 +53,74 @@ async def lifespan(app: FastAPI):
         sync_service = SyncService(service_container)
         await sync_service.sync_development_conversations()
 
+    # Los servicios de fondo (ingesta, writer, snapshot...) arrancan solo en
+    # main_lifespan: esta app se monta y su lifespan no se ejecuta
     yield
 
-    # Limpieza al terminar
     logger.info("Cerrando aplicación...")
 
 
+async def _prefetch_contexts(hours: int) -> None:
+    try:
+        await prefetch_recent_contexts(
+            hours, config_manager.get_project_config().CONTEXT_HYDRATION_MESSAGES
+        )
+    except Exception as e:
+        logger.error(f"Error prefetching contexts: {str(e)}", exc_info=True)
+
+
+@asynccontextmanager
+async def main_lifespan(app: FastAPI):
+    """Ciclo de vida de la aplicación principal (las apps montadas no lo reciben)"""
+    logger.info("Iniciando aplicación principal...")
+
+    # El snapshot se restaura antes de que el journal de ingesta reprocese
+    await state_snapshotter.start()
+    await ingest_queue.start()
+    status_tracker.start()
+    message_writer.start()
+    await subscribe_waba_reloads()
+
+    # Encoders de tiktoken fuera del event loop; hasta que carguen se estima
+    encodings_task = asyncio.create_task(load_encodings())
+
+    # Precarga de contextos en segundo plano, sin demorar el arranque
+    project_config = config_manager.get_project_config()
+    prefetch_task = None
+    if project_config.CONTEXT_PREFETCH_HOURS > 0:
+        prefetch_task = asyncio.create_task(
+            _prefetch_contexts(project_config.CONTEXT_PREFETCH_HOURS)
+        )
+
+    yield
+
+    logger.info("Cerrando aplicación principal...")
+    if prefetch_task and not prefetch_task.done():
+        prefetch_task.cancel()
+    if not encodings_task.done():
+        encodings_task.cancel()
+    await ingest_queue.stop()
+    await conversation_scheduler.stop()
+    await status_tracker.stop()
+    await message_writer.stop()
+    await state_snapshotter.stop()
+    await state_backend.close()
+    await async_supabase.aclose()
+
+
+@asynccontextmanager
+async def dispatcher_lifespan(app: FastAPI):
+    """Ciclo de vida del proceso frontal en modo dispatcher"""
+    logger.info("Iniciando dispatcher de webhooks...")
+
+    webhook_dispatcher.start()
+
+    yield
+
+    logger.info("Cerrando dispatcher de webhooks...")
+    await webhook_dispatcher.stop()
+
+
 # Caché de instancias de aplicaciones
 _app_instances = {}
 
@@ -150,12 +227,26 @@ def create_application(client_id=None, include_webhooks=False):
 
 def create_main_application():
     """Crea la aplicación principal que incluirá el endpoint centralizado de webhooks"""
+    # Con DISPATCH_WORKERS > 0 los webhooks se procesan en procesos worker,
+    # cada uno dueño de un subconjunto de conversaciones
+    dispatch_workers = config_manager.get_project_config().DISPATCH_WORKERS
+
     # Configuración básica
-    app = FastAPI(title="IAssistance Main Application")
+    app = FastAPI(
+        title="IAssistance Main Application",
+        lifespan=dispatcher_lifespan if dispatch_workers > 0 else main_lifespan,
+    )
 
-    # Incluir el router de webhooks centralizado
-    app.include_router(messages_router, prefix="/api/v1")
+    # Incluir el router de webhooks centralizado. La verificación (GET) se
+    # atiende siempre aquí; solo el POST cambia en modo dispatcher
     app.include_router(verification_router, prefix="/api/v1")
+    if dispatch_workers > 0:
+        app.include_router(dispatch_router, prefix="/api/v1")
+    else:
+        app.include_router(messages_router, prefix="/api/v1")
+    app.include_router(metrics_router, prefix="/api/v1")
+    app.include_router(history_router, prefix="/api/v1")
+    app.include_router(wabas_router, prefix="/api/v1")
 
     # Montar las aplicaciones de cliente en sus prefijos específicos
     for client_id, client_config in config_manager._clients.items():
@@ -25,6 +25,8 @@ class ProjectConfig(BaseSettings):
     # Common settings all clients need
     SUPABASE_URL: str
     SUPABASE_SERVICE_ROLE_KEY: str
+    # Conexiones HTTP/2 del cliente async de PostgREST
+    DB_POOL_SIZE: int = 20
 
     # Sync Settings
     SYNC_DEV_CONVERSATIONS: bool = False
@@ -43,6 +45,62 @@ class ProjectConfig(BaseSettings):
 
     FB_VERIFY_TOKEN: str = "prasath"
 
+    # Webhook ingest settings
+    INGEST_QUEUE_MAXSIZE: int = 1000
+    INGEST_WORKERS: int = 4
+    INGEST_JOURNAL_PATH: str = ""  # Vacío desactiva el journal local
+
+    # Fracción de payloads de webhook que se loguean completos en INFO
+    WEBHOOK_LOG_SAMPLE_RATE: float = 0.01
+
+    # Senders de un mismo webhook procesados en paralelo
+    WEBHOOK_FANOUT_CONCURRENCY: int = 8
+
+    # Statuses de entrega: se escriben en lote cada intervalo o al llenar el lote
+    STATUS_FLUSH_INTERVAL: float = 2.0
+    STATUS_FLUSH_BATCH_SIZE: int = 500
+
+    # Mensajes: write-behind con inserts en lote cada intervalo o al llenar el lote
+    MESSAGE_FLUSH_INTERVAL: float = 0.5
+    MESSAGE_FLUSH_BATCH_SIZE: int = 200
+    # Metadata compacta: el payload crudo de Meta va a message_payloads y no a
+    # messages.metadata. Activar después de aplicar sql/compact_messages.sql
+    MESSAGE_COMPACT_STORAGE: bool = False
+
+    # Configs de WABA: frescas durante este TTL; vencidas se sirven mientras se
+    # recargan en segundo plano
+    WABA_CONFIG_TTL: float = 300.0
+
+    # Caché en proceso de la conversación activa por (waba, teléfono); 0 la
+    # desactiva (siempre desactivada con STATE_BACKEND=redis)
+    CONVERSATION_CACHE_SIZE: int = 50000
+
+    # De-duplicación de reintentos de Meta por wamid
+    DEDUPE_MAXSIZE: int = 100000
+    DEDUPE_WINDOW_SECONDS: int = 86400
+
+    # Hidratación del contexto desde la tabla messages: últimos N mensajes al
+    # no encontrarlo en memoria, y precarga al arrancar de las conversaciones
+    # con actividad en las últimas horas (0 desactiva la precarga)
+    CONTEXT_HYDRATION_MESSAGES: int = 30
+    CONTEXT_PREFETCH_HOURS: int = 0
+
+    # Número de carriles del scheduler de conversaciones
+    SCHEDULER_LANES: int = 16
+
+    # Modo dispatcher: un proceso frontal reparte los webhooks entre N procesos
+    # worker según la conversación (0 lo desactiva)
+    DISPATCH_WORKERS: int = 0
+
+    # Estado compartido entre workers: "memory" (un solo worker) o "redis"
+    STATE_BACKEND: str = "memory"
+    REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Snapshot local del estado en memoria (contextos, buffers y configs de
+    # WABA) para arrancar en caliente; vacío lo desactiva
+    SNAPSHOT_PATH: str = ""
+    SNAPSHOT_INTERVAL: float = 300.0
+
     # Estas propiedades y métodos existen en la clase Settings porque son operaciones relacionadas directamente con la configuración, no con la lógica general de la aplicación
 
     # ==================== Properties ====================
@@ -129,6 +187,16 @@ class ClientConfig(BaseModel):
         None  # Para almacenar la instancia de aplicación (cache)
     )
 
+    # Debounce de ráfagas: se espera este silencio (segundos) tras el último
+    # mensaje antes de llamar al modelo, sin superar el tope de espera
+    message_debounce_seconds: float = 1.5
+    message_debounce_max_wait: float = 6.0
+
+    # Presupuesto de tokens del historial: al superarlo, los turnos más viejos
+    # se resumen en segundo plano (0 lo desactiva)
+    context_token_budget: int = 6000
+    context_keep_recent: int = 6
+
     def get_full_config(self) -> BaseSettings:
         """Get client-specific configuration instance"""
         if self.config_class:
@@ -247,19 +247,22 @@ class WABAConfig:
         # Construimos las instrucciones en secciones
         instructions_sections = []
 
-        # Procesamos cada categoría solicitada en el orden que fueron pasadas
-        for category in categories:
-            if category in self.custom_instructions:
-                # Para la categoría base no incluimos el prefijo "Instructions for"
-                if category == "base":
-                    instructions_sections.append(
-                        f"{self.custom_instructions[category]}"
-                    )
-                else:
-                    instructions_sections.append(
-                        f"Instructions for {category}:\n"
-                        f"{self.custom_instructions[category]}"
-                    )
+        # Orden canónico (base primero, luego el de custom_instructions), no el
+        # de la clasificación: así el prefijo del prompt se repite entre turnos
+        # y aprovecha el caché de prompts de OpenAI
+        requested = set(categories)
+        for category in sorted(
+            (c for c in self.custom_instructions if c in requested),
+            key=lambda c: c != "base",
+        ):
+            # Para la categoría base no incluimos el prefijo "Instructions for"
+            if category == "base":
+                instructions_sections.append(f"{self.custom_instructions[category]}")
+            else:
+                instructions_sections.append(
+                    f"Instructions for {category}:\n"
+                    f"{self.custom_instructions[category]}"
+                )
 
         # Si no hay instrucciones, retornamos lista vacía
         if not instructions_sections:
@@ -0,0 +1,229 @@
+# core/models/webhook.py
+import random
+from typing import Any, ClassVar, Dict, List, Optional
+
+import msgspec
+
+# Structs tipados del webhook de WhatsApp Cloud API. Los campos que no se usan
+# en el ruteo quedan como dicts; los campos desconocidos se ignoran al decodificar.
+
+
+class _WebhookStruct(msgspec.Struct, omit_defaults=True):
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict with Meta's field names, for the dict-based handlers"""
+        return msgspec.to_builtins(self)
+
+
+class WebhookText(_WebhookStruct):
+    body: str = ""
+
+
+class WebhookMessage(_WebhookStruct, dict=True):
+    # Bytes del mensaje tal como los mandó Meta, con los campos que el struct
+    # no declara. Lo pone decode_webhook; no es un campo: no se codifica
+    raw: ClassVar[Optional[msgspec.Raw]] = None
+
+    id: str = ""
+    from_: str = msgspec.field(default="", name="from")
+    timestamp: str = ""
+    type: str = ""
+    text: Optional[WebhookText] = None
+    context: Optional[Dict[str, Any]] = None
+    interactive: Optional[Dict[str, Any]] = None
+    button: Optional[Dict[str, Any]] = None
+    image: Optional[Dict[str, Any]] = None
+    audio: Optional[Dict[str, Any]] = None
+    video: Optional[Dict[str, Any]] = None
+    document: Optional[Dict[str, Any]] = None
+    sticker: Optional[Dict[str, Any]] = None
+    location: Optional[Dict[str, Any]] = None
+    contacts: Optional[List[Dict[str, Any]]] = None
+    reaction: Optional[Dict[str, Any]] = None
+    referral: Optional[Dict[str, Any]] = None
+    order: Optional[Dict[str, Any]] = None
+    system: Optional[Dict[str, Any]] = None
+    errors: Optional[List[Dict[str, Any]]] = None
+
+    def original(self) -> Dict[str, Any]:
+        """The message exactly as Meta sent it, unknown fields included"""
+        if self.raw is None:
+            return self.to_dict()
+        return msgspec.json.decode(self.raw)
+
+
+class WebhookStatus(_WebhookStruct):
+    id: str = ""
+    status: str = ""
+    timestamp: str = ""
+    recipient_id: str = ""
+    conversation: Optional[Dict[str, Any]] = None
+    pricing: Optional[Dict[str, Any]] = None
+    errors: Optional[List[Dict[str, Any]]] = None
+    message: Optional[Dict[str, Any]] = None
+    biz_opaque_callback_data: Optional[str] = None
+
+
+class WebhookMetadata(_WebhookStruct):
+    display_phone_number: str = ""
+    phone_number_id: str = ""
+
+
+class WebhookValue(_WebhookStruct):
+    messaging_product: str = ""
+    metadata: WebhookMetadata = msgspec.field(default_factory=WebhookMetadata)
+    contacts: List[Dict[str, Any]] = []
+    messages: List[WebhookMessage] = []
+    statuses: List[WebhookStatus] = []
+    errors: List[Dict[str, Any]] = []
+
+    # message_template_quality_update y otros eventos de cuenta
+    event: Optional[str] = None
+    message_template_id: Any = None
+    message_template_name: Optional[str] = None
+    message_template_language: Optional[str] = None
+    previous_quality_score: Optional[str] = None
+    new_quality_score: Optional[str] = None
+
+
+class WebhookChange(_WebhookStruct):
+    field: str = ""
+    value: WebhookValue = msgspec.field(default_factory=WebhookValue)
+
+
+class WebhookEntry(_WebhookStruct):
+    id: str = ""
+    changes: List[WebhookChange] = []
+
+
+class WebhookPayload(_WebhookStruct):
+    object: str = ""
+    entry: List[WebhookEntry] = []
+
+    # Formato de prueba del dashboard de Meta: {"field": ..., "value": ...}
+    field: Optional[str] = None
+    value: Optional[WebhookValue] = None
+
+    def normalized(self) -> "WebhookPayload":
+        """Standard entry/changes shape, wrapping dashboard test payloads"""
+        if self.object and self.entry:
+            return self
+
+        if self.field is not None and self.value is not None:
+            return WebhookPayload(
+                object="whatsapp_business_account",
+                entry=[
+                    WebhookEntry(
+                        id=self.value.metadata.phone_number_id or "test_id",
+                        changes=[WebhookChange(field=self.field, value=self.value)],
+                    )
+                ],
+            )
+
+        raise ValueError("Invalid webhook payload structure")
+
+
+# Misma forma que WebhookPayload, pero cada mensaje queda como bytes crudos
+class _RawValue(msgspec.Struct):
+    messages: List[msgspec.Raw] = []
+
+
+class _RawChange(msgspec.Struct):
+    value: _RawValue = msgspec.field(default_factory=_RawValue)
+
+
+class _RawEntry(msgspec.Struct):
+    changes: List[_RawChange] = []
+
+
+class _RawPayload(msgspec.Struct):
+    entry: List[_RawEntry] = []
+    value: Optional[_RawValue] = None
+
+
+_decoder = msgspec.json.Decoder(WebhookPayload)
+_raw_decoder = msgspec.json.Decoder(_RawPayload)
+_encoder = msgspec.json.Encoder()
+
+
+def _message_lists(payload: Any) -> List[list]:
+    lists = [
+        change.value.messages for entry in payload.entry for change in entry.changes
+    ]
+    if payload.value is not None:
+        lists.append(payload.value.messages)
+    return lists
+
+
+def decode_webhook(raw: bytes) -> WebhookPayload:
+    """
+    Decode a webhook body straight from the request bytes. Messages keep
+    their raw bytes too (see WebhookMessage.original).
+
+    Raises:
+        ValueError: if the body is not valid JSON or does not match the shape
+    """
+    try:
+        payload = _decoder.decode(raw)
+    except msgspec.DecodeError as e:
+        raise ValueError(f"Invalid webhook payload: {e}") from e
+
+    message_lists = _message_lists(payload)
+    # Segunda pasada solo con mensajes (los statuses no se archivan)
+    if any(message_lists):
+        raw_lists = _message_lists(_raw_decoder.decode(raw))
+        for messages, raw_messages in zip(message_lists, raw_lists):
+            for message, raw_message in zip(messages, raw_messages):
+                message.raw = raw_message
+    return payload
+
+
+def _with_raw_messages(value: WebhookValue) -> WebhookValue:
+    if not any(message.raw is not None for message in value.messages):
+        return value
+    return msgspec.structs.replace(
+        value,
+        messages=[
+            message.raw if message.raw is not None else message
+            for message in value.messages
+        ],
+    )
+
+
+def encode_webhook(payload: Any) -> bytes:
+    """Encode a payload; decoded messages are written back as Meta sent them"""
+    if isinstance(payload, WebhookPayload):
+        payload = msgspec.structs.replace(
+            payload,
+            entry=[
+                msgspec.structs.replace(
+                    entry,
+                    changes=[
+                        msgspec.structs.replace(
+                            change, value=_with_raw_messages(change.value)
+                        )
+                        for change in entry.changes
+                    ],
+                )
+                for entry in payload.entry
+            ],
+            value=_with_raw_messages(payload.value)
+            if payload.value is not None
+            else None,
+        )
+    return _encoder.encode(payload)
+
+
+class LazyPayload:
+    """Serializes the payload only if the log record is actually emitted"""
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: Any):
+        self.payload = payload
+
+    def __str__(self) -> str:
+        return encode_webhook(self.payload).decode()
+
+
+def should_sample(rate: float) -> bool:
+    return rate > 0 and random.random() < rate
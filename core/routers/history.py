@@ -0,0 +1,72 @@
+# core/routers/history.py
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from core.services.message_writer import message_writer
+from core.storage.db import AsyncDBStorage
+from core.utils.supabase_client import async_supabase
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Con el writer, una conversación con filas en cola se escribe antes de leerla
+db = AsyncDBStorage(async_supabase, writer=message_writer)
+
+
+@router.get("/history/{waba_id}/conversations")
+async def list_conversations(
+    waba_id: str,
+    status: Optional[str] = None,
+    active_since: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+):
+    """Conversations of a WABA, most recently active first"""
+    try:
+        return await db.get_conversations_page(
+            waba_id,
+            status=status,
+            active_since=active_since,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error listing conversations: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error listing conversations: {str(e)}"
+        )
+
+
+@router.get("/history/conversations/{conversation_id}/messages")
+async def list_messages(
+    conversation_id: str,
+    columns: Optional[str] = Query(
+        None, description="Comma-separated, e.g. role,content,type"
+    ),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+):
+    """One page of a conversation's messages, newest first by default"""
+    try:
+        return await db.get_messages_page(
+            conversation_id,
+            columns=[c.strip() for c in columns.split(",") if c.strip()]
+            if columns
+            else None,
+            limit=limit,
+            cursor=cursor,
+            descending=order == "desc",
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error listing messages: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error listing messages: {str(e)}"
+        )
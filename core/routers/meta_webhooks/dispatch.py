@@ -0,0 +1,29 @@
+# core/routers/meta_webhooks/dispatch.py
+import logging
+from fastapi import APIRouter, Request, Response
+from core.models.webhook import decode_webhook
+from core.services.dispatcher import webhook_dispatcher
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.post("/webhook")
+async def dispatch_meta_webhook(request: Request):
+    """
+    Receives WhatsApp webhook messages in the dispatcher run mode and forwards
+    them to the worker process that owns the conversation.
+    """
+    try:
+        raw = await request.body()
+        payload = decode_webhook(raw)
+        if not payload.object and payload.field is None:
+            return Response(content="No object found in request", status_code=200)
+
+        await webhook_dispatcher.dispatch(raw, payload)
+        return Response(status_code=200)
+
+    except Exception as e:
+        logger.error(f"Error dispatching webhook: {str(e)}")
+        return Response(content="Error processing webhook", status_code=500)
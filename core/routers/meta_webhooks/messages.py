@@ -1,7 +1,8 @@
 # core/routers/meta_webhooks/messages.py
 import logging
-from fastapi import APIRouter, Request, Response, BackgroundTasks
-from core.routers.webhook_processor import process_meta_webhook
+from fastapi import APIRouter, Request, Response
+from core.models.webhook import decode_webhook
+from core.services.ingest import ingest_queue
 
 logger = logging.getLogger(__name__)
 
@@ -9,17 +10,21 @@ router = APIRouter()
 
 
 @router.post("/webhook")
-async def handle_meta_webhook(request: Request, background_tasks: BackgroundTasks):
+async def handle_meta_webhook(request: Request):
     """
     Receives and validates incoming WhatsApp webhook messages.
-    Delegates actual processing to background task.
+    Hands the payload to the ingest queue and acks Meta immediately.
     """
     try:
-        body = await request.json()
-        if not body.get("object"):
+        raw = await request.body()
+        payload = decode_webhook(raw)
+        if not payload.object and payload.field is None:
             return Response(content="No object found in request", status_code=200)
 
-        background_tasks.add_task(process_meta_webhook, body)
+        if not ingest_queue.enqueue(payload, raw):
+            # Cola llena: devolvemos 503 para que Meta reintente más tarde
+            logger.warning("Webhook ingest queue full, asking Meta to retry")
+            return Response(status_code=503)
 
         return Response(status_code=200)
 
@@ -0,0 +1,60 @@
+# core/routers/metrics.py
+import logging
+from typing import Dict
+
+from fastapi import APIRouter
+from core.routers.webhook_processor import get_client_containers
+from core.services.dispatcher import webhook_dispatcher
+from core.services.ingest import ingest_queue
+from core.services.message_writer import message_writer
+from core.services.scheduler import conversation_scheduler
+from core.services.snapshot import state_snapshotter
+from core.services.statuses import status_tracker
+from core.storage.conversations import conversation_ids
+from core.utils.dedupe import webhook_deduplicator
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def local_metrics() -> Dict:
+    """Runtime metrics of this process's pipeline"""
+    metrics = {
+        "ingest": ingest_queue.get_stats(),
+        "scheduler": conversation_scheduler.get_stats(),
+        "dedupe": webhook_deduplicator.get_stats(),
+        "statuses": status_tracker.get_stats(),
+        "message_writer": message_writer.get_stats(),
+        "conversation_ids": conversation_ids.get_stats(),
+        "clients": {
+            client_id: {
+                "locks": container.message_buffer_manager.get_lock_stats(),
+                "coalescing": container.message_buffer_manager.get_coalescing_stats(),
+                "context": container.context.get_token_stats(),
+                "hydration": container.context.get_hydration_stats(),
+                "waba_configs": container.wabas_config_cache.get_stats(),
+            }
+            for client_id, container in get_client_containers().items()
+        },
+    }
+    if state_snapshotter.enabled:
+        metrics["snapshot"] = state_snapshotter.get_stats()
+    return metrics
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Runtime metrics of the pipeline, per worker in dispatcher mode"""
+    metrics = local_metrics()
+    if webhook_dispatcher.started:
+        metrics["dispatcher"] = webhook_dispatcher.get_stats()
+        # El front no tiene containers: las conversaciones viven en los
+        # workers, cada uno reporta las suyas por el canal de control
+        try:
+            metrics["workers"] = await webhook_dispatcher.call("metrics")
+        except Exception as e:
+            logger.error(f"Error collecting worker metrics: {str(e)}")
+            metrics["workers"] = None
+            metrics["workers_error"] = str(e)
+    return metrics
@@ -3,6 +3,7 @@ from core.utils.supabase_client import supabase
 import logging
 from fastapi import APIRouter, HTTPException
 from core.services.waba import get_waba_config
+from core.storage.conversations import conversation_ids
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,8 @@ async def delete_conversation(waba_id: str, conversation_id: str):
         ).execute()
         # Then delete conversation
         supabase.table("conversations").delete().eq("id", conversation_id).execute()
+        # El próximo mensaje del chat no debe reutilizar el id borrado
+        conversation_ids.invalidate_conversation(conversation_id)
         return {"message": "Conversation deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting conversation: {str(e)}")
@@ -31,6 +34,8 @@ async def force_new_conversation(waba_id: str, phone_number: str):
     """Force start a new conversation and clear history"""
     """TODO: DO WE WANT TO ALLOW NEW EMPTY CONVERSATIONS? OTHERWISE THIS PROCESS SHOULD ALSO AUTOMATICALLY DELETE THE EMPTY ARCHIVED CONVERSATION"""
     try:
+        # La conversación activa cacheada deja de valer
+        conversation_ids.invalidate(waba_id, phone_number)
         buffer_key = f"{phone_number}_{waba_id}"
         waba_conf = get_waba_config(waba_id)
 
@@ -3,6 +3,9 @@
 import logging
 from fastapi import APIRouter, HTTPException
 
+from core.services.dispatcher import webhook_dispatcher
+from core.services.waba import broadcast_waba_reload, reload_local_waba_config
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -12,18 +15,37 @@ router = APIRouter()
 async def reload_waba_config(waba_id: str):
     logger.info(f"Received reload config request for WABA {waba_id}")
     try:
-        logger.debug(f"Invalidating cache for WABA {waba_id}")
-        # await wabas_config_cache.invalidate(waba_id)
-
-        logger.debug(f"Loading new config from DB for WABA {waba_id}")
-        # config = await wabas_config_cache.get_config(waba_id)
-
-        # logger.info(f"Successfully reloaded config for WABA {config.name}")
+        broadcast = False
+        if webhook_dispatcher.started:
+            # En modo dispatcher los configs viven en los workers, no en el front
+            reloaded = sorted(
+                {
+                    client_id
+                    for clients in await webhook_dispatcher.call("reload_waba", waba_id)
+                    for client_id in clients
+                }
+            )
+        else:
+            # La WABA puede estar cargada en el container de uno o más clientes;
+            # los demás procesos (otros workers de gunicorn) recargan por el aviso
+            reloaded = await reload_local_waba_config(waba_id)
+            broadcast = await broadcast_waba_reload(waba_id)
+
+        if not reloaded and not broadcast:
+            raise HTTPException(
+                status_code=404, detail=f"WABA {waba_id} config is not loaded"
+            )
+
+        logger.info(f"Reloaded config for WABA {waba_id} ({reloaded})")
         return {
             "success": True,
-            # "message": f"WABA {config.name} configuration reloaded",
+            "message": f"WABA {waba_id} configuration reloaded",
+            "clients": reloaded,
+            "broadcast": broadcast,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(
             f"Failed to reload config for WABA {waba_id}: {str(e)}", exc_info=True
@@ -1,135 +1,264 @@
 # core/routers/webhook_processor.py
+import asyncio
 import logging
-from typing import Dict, Any
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
 from core.config import config_manager
 from core.handlers.message_handler import handle_message_case
 from core.handlers.status_handler import handle_status_update_case
 from core.handlers.template_handler import handle_template_quality_case
 from core.services.container import ServiceContainer
+from core.services.scheduler import conversation_scheduler
+from core.services.statuses import status_tracker
 from core.utils.blocked_numbers import is_number_blocked
-from core.utils.normalization import normalize_webhook_payload
+from core.utils.dedupe import webhook_deduplicator
 from core.utils.supabase_client import supabase
 from core.services.waba import get_waba_config
-import json
+from core.models.webhook import (
+    LazyPayload,
+    WebhookChange,
+    WebhookMessage,
+    WebhookPayload,
+    should_sample,
+)
 
 logger = logging.getLogger(__name__)
 
+_project_config = config_manager.get_project_config()
+
+EventWork = Callable[[], Awaitable[None]]
+
+
+class _Tenant(NamedTuple):
+    client_id: str
+    client_config: Any
+    service_container: ServiceContainer
+    waba_config: Any
+
+
 # Mantener un diccionario global de containers por cliente
 _client_containers = {}
 
 
-async def process_meta_webhook(body: Dict[str, Any]) -> None:
+def get_client_containers() -> Dict[str, ServiceContainer]:
+    """Service containers created so far, keyed by client_id"""
+    return dict(_client_containers)
+
+
+def get_or_create_container(client_id: str) -> ServiceContainer:
+    if client_id not in _client_containers:
+        _client_containers[client_id] = ServiceContainer(supabase, client_id)
+    return _client_containers[client_id]
+
+
+async def process_meta_webhook(payload: WebhookPayload) -> None:
     """
     Processes incoming Meta webhooks and routes to appropriate handlers.
+
+    Meta may batch several entries, changes, messages and statuses in one POST:
+    every message is routed to its client and sender, messages of the same
+    sender run in order and independent senders run concurrently. Statuses
+    take the fast path of the status tracker.
     """
-    # Logging original payload para depuración
-    logger.info(f"Webhook raw payload: {json.dumps(body)}")
+    # El payload se serializa solo si el log se emite (muestreado en INFO)
+    if should_sample(_project_config.WEBHOOK_LOG_SAMPLE_RATE):
+        logger.info("Webhook payload (sampled): %s", LazyPayload(payload))
+    else:
+        logger.debug("Webhook payload: %s", LazyPayload(payload))
 
     try:
         # 1. Normalizar el payload primero
         try:
-            normalized_body = normalize_webhook_payload(body)
+            normalized = payload.normalized()
         except ValueError as e:
             logger.error(f"Invalid webhook structure: {str(e)}")
             return
 
-        # 2. Extraer componentes principales
-        entry = normalized_body.get("entry", [{}])[0]
-        changes = entry.get("changes", [{}])[0]
-        value = changes.get("value", {})
-        field = changes.get("field")
-
-        # Log detallado del tipo de webhook
-        logger.info(f"Webhook field type: {field}")
-
-        # Si hay statuses, log especial
-        if field == "messages" and "statuses" in value:
-            statuses = value.get("statuses", [])
-            if statuses:
-                status_info = statuses[0]
-                logger.info(
-                    f"Status update received: {status_info.get('status')} for message {status_info.get('id')}"
-                )
-
-        # 3. Extraer identificadores
-        waba_id = entry.get("id")
-        phone_id = value.get("metadata", {}).get("phone_number_id")
-
-        if not waba_id:
-            logger.error("Missing WABA ID in webhook")
-            return
+        # 2. Agrupar los eventos por conversación, en orden de llegada
+        groups: Dict[str, List[EventWork]] = {}
+        tenants: Dict[Tuple[str, str], Optional[_Tenant]] = {}
+        for entry in normalized.entry:
+            for change in entry.changes:
+                await _route_change(entry.id, change, groups, tenants)
 
-        # 4. Identificar cliente (antes de obtener waba_config)
-        client_id = None
-        client_config = None
-        for cid, config in config_manager._clients.items():
-            if (
-                config.waba_config.waba_id == waba_id
-                or config.waba_config.phone_number_id == phone_id
-            ):
-                client_id = cid
-                client_config = config
-                break
-
-        if not client_id:
-            logger.warning(
-                f"No client found for WABA ID: {waba_id} or Phone ID: {phone_id}"
-            )
+        if not groups:
             return
 
-        # 5. Obtener o crear service_container para este cliente
-        if client_id not in _client_containers:
-            _client_containers[client_id] = ServiceContainer(supabase, client_id)
+        # 3. Un grupo por sender: secuencial dentro del grupo, concurrente entre grupos
+        await asyncio.gather(
+            *(_run_group(key, works) for key, works in groups.items())
+        )
 
-        service_container = _client_containers[client_id]
+    except Exception as e:
+        logger.error(f"Error processing Meta webhook: {str(e)}", exc_info=True)
 
-        # 6. Obtener configuración WABA del service_container
-        try:
-            waba_config = await get_waba_config(service_container, client_id, waba_id)
 
-        except Exception as e:
-            logger.error(f"Invalid WABA configuration for {waba_id}: {str(e)}")
-            return
+_fanout_semaphore: Optional[asyncio.Semaphore] = None
 
-        logger.info(f"Processing webhook for client: {client_id}")
 
-        # 7. Enrutar según tipo de evento
-        if field == "message_template_quality_update":
-            await handle_template_quality_case(
-                normalized_body, value, client_config, service_container
-            )
-        elif field == "messages":
-            messages = value.get("messages", [])
-            if messages:
-                message = messages[0]
-
-                # Extraer y validar sender
-                sender = message.get("from")
-                if not sender:
-                    logger.error("Missing sender phone number in message")
-                    return
-
-                # Verificar si el número está bloqueado
-                if is_number_blocked(sender):
-                    logger.info(f"Blocked message from {sender}")
-                    return
-
-                await handle_message_case(
-                    message,
-                    waba_id,
-                    sender,
-                    waba_config,
-                    client_config,
-                    service_container,
-                )
-        elif field == "statuses":
-            statuses = value.get("statuses", [])
-            if statuses:
-                await handle_status_update_case(
-                    statuses, client_config, service_container
-                )
-        else:
-            logger.warning(f"Unhandled webhook field type: {field}")
+def _get_fanout_semaphore() -> asyncio.Semaphore:
+    # Se crea dentro del event loop (en 3.9 el semáforo queda atado al loop)
+    global _fanout_semaphore
+    if _fanout_semaphore is None:
+        _fanout_semaphore = asyncio.Semaphore(
+            max(1, _project_config.WEBHOOK_FANOUT_CONCURRENCY)
+        )
+    return _fanout_semaphore
+
+
+async def _run_group(key: str, works: List[EventWork]) -> None:
+    async with _get_fanout_semaphore():
+        for work in works:
+            try:
+                await work()
+            except Exception as e:
+                logger.error(f"Error processing event for {key}: {str(e)}", exc_info=True)
+
+
+async def _resolve_tenant(
+    waba_id: str,
+    phone_id: str,
+    tenants: Dict[Tuple[str, str], Optional[_Tenant]],
+) -> Optional[_Tenant]:
+    """Client, service container and WABA config of an entry, cached per payload"""
+    cache_key = (waba_id, phone_id)
+    if cache_key in tenants:
+        return tenants[cache_key]
+    tenants[cache_key] = None
+
+    if not waba_id:
+        logger.error("Missing WABA ID in webhook")
+        return None
 
+    # Identificar cliente (antes de obtener waba_config)
+    client_id, client_config = config_manager.resolve_client(waba_id, phone_id)
+    if not client_id:
+        logger.warning(f"No client found for WABA ID: {waba_id} or Phone ID: {phone_id}")
+        return None
+
+    # Obtener o crear service_container para este cliente
+    service_container = get_or_create_container(client_id)
+
+    # Obtener configuración WABA del service_container
+    try:
+        waba_config = await get_waba_config(service_container, client_id, waba_id)
     except Exception as e:
-        logger.error(f"Error processing Meta webhook: {str(e)}", exc_info=True)
+        logger.error(f"Invalid WABA configuration for {waba_id}: {str(e)}")
+        return None
+
+    logger.info(f"Processing webhook for client: {client_id}")
+    tenants[cache_key] = _Tenant(client_id, client_config, service_container, waba_config)
+    return tenants[cache_key]
+
+
+async def _route_change(
+    waba_id: str,
+    change: WebhookChange,
+    groups: Dict[str, List[EventWork]],
+    tenants: Dict[Tuple[str, str], Optional[_Tenant]],
+) -> None:
+    """Split one change into per-sender units of work"""
+    field = change.field
+    value = change.value
+    logger.info(f"Webhook field type: {field}")
+
+    # Meta reintenta entregas: un evento ya visto no se vuelve a procesar.
+    # Los estados se identifican por wamid + estado (sent/delivered/read
+    # comparten el wamid del mensaje)
+    messages = [
+        message
+        for message in value.messages
+        if not (message.id and await webhook_deduplicator.is_duplicate(message.id))
+    ]
+    statuses = [
+        status
+        for status in value.statuses
+        if not await webhook_deduplicator.is_duplicate(
+            f"{status.id}:{status.status}", "statuses"
+        )
+    ]
+
+    if field == "message_template_quality_update":
+        groups.setdefault(f"template_{waba_id}", []).append(
+            partial(
+                handle_template_quality_case,
+                {"entry": [{"id": waba_id, "changes": [change.to_dict()]}]},
+                value.to_dict(),
+            )
+        )
+        return
+
+    if field not in ("messages", "statuses"):
+        logger.warning(f"Unhandled webhook field type: {field}")
+        return
+
+    # Fast path de statuses (llegan con field "messages" en la Cloud API): no
+    # necesitan cliente, container ni config WABA, se acumulan y se escriben
+    # en lote
+    for status in statuses:
+        status_tracker.record(waba_id, status)
+        if status.status == "failed":
+            # Diagnóstico detallado (errores de plantillas) solo de los fallidos
+            groups.setdefault(f"{status.recipient_id}_{waba_id}", []).append(
+                partial(handle_status_update_case, [status.to_dict()], None, None)
+            )
+
+    if not messages:
+        return
+
+    tenant = await _resolve_tenant(waba_id, value.metadata.phone_number_id, tenants)
+    if tenant is None:
+        # No se procesaron: el reintento de Meta tiene que poder pasar
+        for message in messages:
+            if message.id:
+                await webhook_deduplicator.forget(message.id)
+        return
+
+    for message in messages:
+        # Extraer y validar sender
+        sender = message.from_
+        if not sender:
+            logger.error("Missing sender phone number in message")
+            continue
+
+        # Verificar si el número está bloqueado
+        if is_number_blocked(sender):
+            logger.info(f"Blocked message from {sender}")
+            continue
+
+        buffer_key = tenant.service_container.message_buffer_manager._get_key(
+            tenant.waba_config, sender
+        )
+        groups.setdefault(buffer_key, []).append(
+            partial(_handle_message, buffer_key, message, waba_id, sender, tenant)
+        )
+
+
+async def _handle_message(
+    buffer_key: str,
+    message: WebhookMessage,
+    waba_id: str,
+    sender: str,
+    tenant: _Tenant,
+) -> None:
+    # Los mensajes de una misma conversación se procesan en orden
+    # en el carril del scheduler que le corresponde
+    try:
+        await conversation_scheduler.run(
+            buffer_key,
+            lambda: handle_message_case(
+                # Tal como llegó: es el original_message que se archiva
+                message.original(),
+                waba_id,
+                sender,
+                tenant.waba_config,
+                tenant.client_config,
+                tenant.service_container,
+            ),
+        )
+    except Exception:
+        # El wamid se registró al rutear: si no se encoló, el reintento
+        # de Meta no debe quedar suprimido
+        if message.id:
+            await webhook_deduplicator.forget(message.id)
+        raise
@@ -1,35 +1,208 @@
 # core/services/cache.py
+import asyncio
 import logging
+import time
+from typing import Any, Dict
 from core.data.tools_definition import TOOLS_DEFINITION
 from core.models.waba import WABAConfig, InstructionsStrategy
 
 from core.config import config_manager
+from core.utils.metrics import Histogram
 
 logger = logging.getLogger(__name__)
 
 
 class WABAConfigCache:
-    def __init__(self, supabase_client):
+    """
+    WABA configs per client_id:waba_id. A config is fresh for `ttl`
+    seconds; after that it is still served (stale-while-revalidate) while
+    one background task reloads it. Loads are single-flight: concurrent
+    misses of the same key share one query.
+    """
+
+    def __init__(self, supabase_client, ttl: float = 300.0):
         self._cache = {}
+        # Filas de `wabas` de las configs cargadas de la base, para el snapshot
+        self._rows: Dict[str, Dict[str, Any]] = {}
         self.supabase_client = supabase_client
         self.project_config = config_manager.get_project_config()
+        self.ttl = ttl
+
+        self._loaded_at: Dict[str, float] = {}
+        # Carga en curso por clave, compartida por todos los que esperan
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Sube al invalidar: una carga vieja no pisa a la recarga
+        self._generation: Dict[str, int] = {}
+
+        # Métricas
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.load_ms = Histogram()
 
     async def get_config(self, client_id: str, waba_id: str) -> WABAConfig:
         """Obtiene configuración con soporte para múltiples clientes"""
         cache_key = f"{client_id}:{waba_id}"
 
         if cache_key in self._cache:
+            age = time.monotonic() - self._loaded_at.get(cache_key, float("-inf"))
+            if age < self.ttl:
+                self.hits += 1
+            else:
+                # Se sirve la vieja y se recarga en segundo plano
+                self.stale_hits += 1
+                self._load(client_id, waba_id, refresh=True)
             return self._cache[cache_key]
 
-        # Cargar de base de datos con identificación de cliente
-        config = await self._load_from_db(client_id, waba_id)
-        self._cache[cache_key] = config
+        self.misses += 1
+        if cache_key in self._inflight:
+            self.coalesced += 1
+        # shield: si un llamador se cancela, la carga compartida sigue
+        return await asyncio.shield(self._load(client_id, waba_id))
+
+    def _load(self, client_id: str, waba_id: str, refresh: bool = False):
+        """Single-flight load of one key. Returns the (shared) task"""
+        cache_key = f"{client_id}:{waba_id}"
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._run_load(client_id, waba_id, refresh))
+            self._inflight[cache_key] = task
+
+            def done(finished, key=cache_key):
+                if self._inflight.get(key) is finished:
+                    del self._inflight[key]
+                # Se consulta siempre: la excepción queda como recuperada
+                error = None if finished.cancelled() else finished.exception()
+                if error and refresh:
+                    logger.error(f"Error refreshing WABA config {key}: {str(error)}")
+
+            task.add_done_callback(done)
+        return task
+
+    async def _run_load(
+        self, client_id: str, waba_id: str, refresh: bool
+    ) -> WABAConfig:
+        cache_key = f"{client_id}:{waba_id}"
+        generation = self._generation.get(cache_key, 0)
+        start = time.monotonic()
+        try:
+            if refresh:
+                # En un refresh un error de la base conserva la config vieja
+                # en vez de caer al fallback del cliente
+                self.refreshes += 1
+                config = await self._load_fresh(client_id, waba_id)
+            else:
+                config = await self._load_from_db(client_id, waba_id)
+        except Exception:
+            if refresh:
+                self.refresh_errors += 1
+                # Reintenta recién pasado otro TTL
+                self._loaded_at[cache_key] = time.monotonic()
+            raise
+        finally:
+            self.load_ms.observe((time.monotonic() - start) * 1000)
+
+        if self._generation.get(cache_key, 0) == generation:
+            self._cache[cache_key] = config
+            self._loaded_at[cache_key] = time.monotonic()
         return config
 
     async def invalidate(self, client_id: str, waba_id: str):
         cache_key = f"{client_id}:{waba_id}"
         if cache_key in self._cache:
             del self._cache[cache_key]
+        self._rows.pop(cache_key, None)
+        self._loaded_at.pop(cache_key, None)
+        self._generation[cache_key] = self._generation.get(cache_key, 0) + 1
+        # La carga en curso (anterior a la invalidación) ya no se comparte
+        self._inflight.pop(cache_key, None)
+
+    async def reload(self, client_id: str, waba_id: str) -> WABAConfig:
+        """
+        Load the config again from the DB and replace the cached one. If the
+        DB read fails the cached config is kept and the error propagates:
+        a failed reload never swaps a tenant config for the fallback.
+        """
+        cache_key = f"{client_id}:{waba_id}"
+        # Una carga anterior todavía en curso ya no puede pisar la recarga
+        self._generation[cache_key] = self._generation.get(cache_key, 0) + 1
+        self._inflight.pop(cache_key, None)
+
+        start = time.monotonic()
+        try:
+            config = await self._load_fresh(client_id, waba_id)
+        finally:
+            self.load_ms.observe((time.monotonic() - start) * 1000)
+        self._cache[cache_key] = config
+        self._loaded_at[cache_key] = time.monotonic()
+        return config
+
+    def is_cached(self, client_id: str, waba_id: str) -> bool:
+        return f"{client_id}:{waba_id}" in self._cache
+
+    def export_rows(self) -> Dict[str, Dict[str, Any]]:
+        """DB rows of the cached configs, keyed by client_id:waba_id"""
+        return dict(self._rows)
+
+    def restore_rows(self, rows: Dict[str, Dict[str, Any]]) -> int:
+        """Rebuild cached configs from snapshot rows without querying the DB"""
+        restored = 0
+        for cache_key, row in rows.items():
+            if cache_key in self._cache:
+                continue
+            client_id, _, waba_id = cache_key.partition(":")
+            try:
+                self._cache[cache_key] = self._build_config(client_id, waba_id, row)
+                self._rows[cache_key] = row
+                # Sin _loaded_at: quedan vencidas y se revalidan al primer uso
+                restored += 1
+            except Exception as e:
+                logger.warning(f"Could not restore WABA config {cache_key}: {str(e)}")
+        return restored
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "inflight": len(self._inflight),
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4)
+            if lookups
+            else 0.0,
+            "load_ms": self.load_ms.snapshot(),
+        }
+
+    async def _query_row(self, waba_id: str):
+        """Row of `wabas` for the WABA, or None. Raises on DB errors"""
+        query_result = (
+            await self.supabase_client.from_("wabas")
+            .select("*")
+            .eq("external_waba_id", waba_id)
+            .execute()
+        )
+        return query_result.data[0] if query_result.data else None
+
+    def _fallback_config(self, client_id: str) -> WABAConfig:
+        client_config = config_manager.get_client_config(client_id)
+        if not client_config:
+            raise ValueError(f"No configuration found for client {client_id}")
+        return client_config.waba_config
+
+    async def _load_fresh(self, client_id: str, waba_id: str) -> WABAConfig:
+        """Reload for a refresh: DB errors propagate instead of falling back"""
+        db_waba_data = await self._query_row(waba_id)
+        if db_waba_data is None:
+            return self._fallback_config(client_id)
+        self._rows[f"{client_id}:{waba_id}"] = db_waba_data
+        return self._build_config(client_id, waba_id, db_waba_data)
 
     async def _load_from_db(self, client_id: str, waba_id: str) -> WABAConfig:
         try:
@@ -38,77 +211,63 @@ class WABAConfigCache:
 
             # Try to get data from database
             try:
-                query_result = (
-                    self.supabase_client.from_("wabas")
-                    .select("*")
-                    .eq("external_waba_id", waba_id)
-                    .execute()
-                )
+                db_waba_data = await self._query_row(waba_id)
 
-                if not query_result.data or len(query_result.data) == 0:
+                if db_waba_data is None:
                     logger.warning(
                         f"No WABA found with external_waba_id={waba_id}, using fallback configuration"
                     )
-
-                    # Get client configuration for fallback values
-                    client_config = config_manager.get_client_config(client_id)
-                    if not client_config:
-                        raise ValueError(
-                            f"No configuration found for client {client_id}"
-                        )
-
-                    # Get default values from project config
-                    project_config = self.project_config
-
                     # Use fallback config directly from client_config
-                    return client_config.waba_config
+                    return self._fallback_config(client_id)
 
-                # Use the first result if multiple were returned
-                db_waba_data = query_result.data[0]
+                self._rows[f"{client_id}:{waba_id}"] = db_waba_data
 
             except Exception as db_error:
                 logger.warning(
                     f"Database query failed: {str(db_error)}, using fallback configuration"
                 )
-                client_config = config_manager.get_client_config(client_id)
-                if not client_config:
-                    raise ValueError(f"No configuration found for client {client_id}")
-                return client_config.waba_config
-
-            # Get client configuration
-            client_config = config_manager.get_client_config(client_id)
-            if not client_config:
-                raise ValueError(f"No configuration found for client {client_id}")
-
-            # Get default values from project config for email settings
-            project_config = self.project_config
-
-            # Construir configuración con datos de cliente específicos
-            config = WABAConfig(
-                name=db_waba_data.get("name", f"Default WABA for {client_id}"),
-                phone_number=db_waba_data.get("phone_number", ""),
-                phone_number_id=db_waba_data.get("phone_number_id", ""),
-                permanent_token=db_waba_data.get("permanent_token", ""),
-                # Get values from client config or use project defaults
-                assistant_id=client_config.waba_config.openai_assist_id,
-                openai_key=client_config.waba_config.openai_api_key,
-                model=project_config.OPENAI_MODEL_DEFAULT,
-                tools=TOOLS_DEFINITION,
-                instructions_strategy=client_config.waba_config.instructions_strategy,
-                pinecone_key=project_config.PINECONE_KEY_DEFAULT,
-                temperature=0.3,
-                vector_store="",
-                waba_id=waba_id,
-                smtp_server=project_config.SMTP_SERVER,
-                smtp_port=project_config.SMTP_PORT,
-                sender_email=project_config.SENDER_EMAIL,
-                admin_email=project_config.ADMIN_EMAIL,
-                email_password=project_config.EMAIL_PASSWORD,
-                client_id=client_id,
-            )
-
-            return config
+                return self._fallback_config(client_id)
+
+            return self._build_config(client_id, waba_id, db_waba_data)
 
         except Exception as e:
             logger.error(f"Failed to load WABA config: {str(e)}")
             raise
+
+    def _build_config(
+        self, client_id: str, waba_id: str, db_waba_data: Dict[str, Any]
+    ) -> WABAConfig:
+        """WABAConfig from a row of the `wabas` table and the client settings"""
+        # Get client configuration
+        client_config = config_manager.get_client_config(client_id)
+        if not client_config:
+            raise ValueError(f"No configuration found for client {client_id}")
+
+        # Get default values from project config for email settings
+        project_config = self.project_config
+
+        # Construir configuración con datos de cliente específicos
+        config = WABAConfig(
+            name=db_waba_data.get("name", f"Default WABA for {client_id}"),
+            phone_number=db_waba_data.get("phone_number", ""),
+            phone_number_id=db_waba_data.get("phone_number_id", ""),
+            permanent_token=db_waba_data.get("permanent_token", ""),
+            # Get values from client config or use project defaults
+            assistant_id=client_config.waba_config.openai_assist_id,
+            openai_key=client_config.waba_config.openai_api_key,
+            model=project_config.OPENAI_MODEL_DEFAULT,
+            tools=TOOLS_DEFINITION,
+            instructions_strategy=client_config.waba_config.instructions_strategy,
+            pinecone_key=project_config.PINECONE_KEY_DEFAULT,
+            temperature=0.3,
+            vector_store="",
+            waba_id=waba_id,
+            smtp_server=project_config.SMTP_SERVER,
+            smtp_port=project_config.SMTP_PORT,
+            sender_email=project_config.SENDER_EMAIL,
+            admin_email=project_config.ADMIN_EMAIL,
+            email_password=project_config.EMAIL_PASSWORD,
+            client_id=client_id,
+        )
+
+        return config
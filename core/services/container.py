@@ -4,9 +4,13 @@ from core.storage.cache import (
     ConversationContext,
     MessageBufferManager,
 )
-from core.storage.db import DBStorage
+from core.storage.conversations import conversation_ids
+from core.storage.db import AsyncDBStorage
+from core.storage.state import state_backend
 from core.services.cache import WABAConfigCache
+from core.services.message_writer import message_writer
 from core.config import config_manager
+from core.utils.supabase_client import async_supabase
 
 logger = logging.getLogger(__name__)
 
@@ -22,10 +26,24 @@ class ServiceContainer:
         self.client_id = client_id
 
         self.supabase_client = supabase_client
-        self.db = DBStorage(supabase_client)
-        self.message_buffer_manager = MessageBufferManager()
-        self.context = ConversationContext()
-        self.wabas_config_cache = WABAConfigCache(supabase_client)
+        # Persistencia async: las consultas no bloquean el event loop y los
+        # mensajes se escriben en lote (write-behind)
+        self.db = (
+            AsyncDBStorage(
+                async_supabase,
+                writer=message_writer,
+                conversation_ids=conversation_ids if conversation_ids.enabled else None,
+                compact=config_manager.get_project_config().MESSAGE_COMPACT_STORAGE,
+            )
+            if supabase_client
+            else AsyncDBStorage(None)
+        )
+        self.message_buffer_manager = MessageBufferManager(state_backend=state_backend)
+        self.context = ConversationContext(state_backend=state_backend)
+        self.wabas_config_cache = WABAConfigCache(
+            async_supabase if supabase_client else None,
+            ttl=config_manager.get_project_config().WABA_CONFIG_TTL,
+        )
         # self.courses_cache = CoursesCache()
         # self.instructions_cache = InstructionsCache()
 
@@ -0,0 +1,330 @@
+# core/services/dispatcher.py
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import msgspec
+
+from core.config import config_manager
+from core.models.webhook import (
+    WebhookChange,
+    WebhookEntry,
+    WebhookPayload,
+    decode_webhook,
+    encode_webhook,
+)
+
+logger = logging.getLogger(__name__)
+
+# Los mensajes de control (front -> worker) empiezan con este byte; un
+# webhook es JSON y nunca lo hace. Pedido: [id, op, args]; respuesta:
+# [id, ok, resultado]
+_CONTROL = b"\x00"
+
+
+def partition_by_conversation(
+    payload: WebhookPayload, route: Callable[[str], int]
+) -> Dict[int, WebhookPayload]:
+    """
+    Split a (possibly batched) payload by destination. Each message and
+    status goes to `route(sender_wabaid)` (the buffer key), so every event of
+    a conversation lands on the same worker; other changes follow the WABA.
+    """
+    parts: Dict[int, List[WebhookEntry]] = {}
+    for entry in payload.normalized().entry:
+        for change in entry.changes:
+            value = change.value
+            if not value.messages and not value.statuses:
+                parts.setdefault(route(entry.id), []).append(
+                    WebhookEntry(id=entry.id, changes=[change])
+                )
+                continue
+
+            buckets: Dict[int, Tuple[list, list]] = {}
+            for message in value.messages:
+                index = route(f"{message.from_}_{entry.id}")
+                buckets.setdefault(index, ([], []))[0].append(message)
+            for status in value.statuses:
+                index = route(f"{status.recipient_id}_{entry.id}")
+                buckets.setdefault(index, ([], []))[1].append(status)
+
+            for index, (messages, statuses) in buckets.items():
+                part_value = msgspec.structs.replace(
+                    value, messages=messages, statuses=statuses
+                )
+                parts.setdefault(index, []).append(
+                    WebhookEntry(
+                        id=entry.id,
+                        changes=[WebhookChange(field=change.field, value=part_value)],
+                    )
+                )
+
+    object_type = payload.object or "whatsapp_business_account"
+    return {
+        index: WebhookPayload(object=object_type, entry=entries)
+        for index, entries in parts.items()
+    }
+
+
+def _load_handler(handler_path: str):
+    module_name, _, attr = handler_path.rpartition(".")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+async def _handle_control(data: bytes) -> bytes:
+    request_id, op, args = msgspec.msgpack.decode(data[len(_CONTROL) :])
+    try:
+        if op == "reload_waba":
+            from core.services.waba import reload_local_waba_config
+
+            result = await reload_local_waba_config(*args)
+        elif op == "metrics":
+            from core.routers.metrics import local_metrics
+
+            result = local_metrics()
+        else:
+            raise ValueError(f"Unknown control op {op}")
+        reply = [request_id, True, result]
+    except Exception as e:
+        logger.error(f"Control op {op} failed: {str(e)}")
+        reply = [request_id, False, str(e)]
+    return msgspec.msgpack.encode(reply)
+
+
+def _worker_main(index: int, conn, handler_path: Optional[str]) -> None:
+    """Entry point of a dispatcher worker process"""
+    from core.utils.logging import setup_logging
+
+    setup_logging()
+    asyncio.run(_worker_loop(index, conn, handler_path))
+
+
+async def _worker_loop(index: int, conn, handler_path: Optional[str]) -> None:
+    # Cada worker tiene su propia cola de ingesta, scheduler y containers:
+    # el estado de sus conversaciones queda en memoria del proceso
+    from clients import register_all_clients
+    from core.services.ingest import ingest_queue
+    from core.services.message_writer import message_writer
+    from core.services.scheduler import conversation_scheduler
+    from core.services.snapshot import state_snapshotter
+    from core.services.statuses import status_tracker
+    from core.storage.state import state_backend
+    from core.utils.supabase_client import async_supabase
+    from core.utils.tokens import load_encodings
+
+    register_all_clients()
+
+    if handler_path:
+        ingest_queue._handler = _load_handler(handler_path)
+    if ingest_queue.journal_path:
+        ingest_queue.journal_path = f"{ingest_queue.journal_path}.{index}"
+    if state_snapshotter.path:
+        state_snapshotter.path = f"{state_snapshotter.path}.{index}"
+
+    await state_snapshotter.start()
+    await ingest_queue.start()
+    status_tracker.start()
+    message_writer.start()
+    encodings_task = asyncio.create_task(load_encodings())
+    logger.info(f"Dispatcher worker {index} started")
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                raw = await loop.run_in_executor(None, conn.recv_bytes)
+            except (EOFError, OSError):
+                break
+
+            if raw.startswith(_CONTROL):
+                reply = await _handle_control(raw)
+                await loop.run_in_executor(None, conn.send_bytes, reply)
+                continue
+
+            try:
+                payload = decode_webhook(raw)
+            except ValueError:
+                logger.error(f"Dispatcher worker {index} got an unreadable payload")
+                continue
+
+            await ingest_queue.put(payload, raw)
+    finally:
+        if not encodings_task.done():
+            encodings_task.cancel()
+        await ingest_queue.stop()
+        await conversation_scheduler.stop()
+        await status_tracker.stop()
+        await message_writer.stop()
+        await state_snapshotter.stop()
+        await state_backend.close()
+        await async_supabase.aclose()
+        logger.info(f"Dispatcher worker {index} stopped")
+
+
+class SenderAffinityDispatcher:
+    """
+    Front-process side of the multi-process run mode. Each webhook payload is
+    forwarded over a pipe to one of N worker processes chosen by its
+    conversation key, so a conversation always lives in the same process and
+    its buffers and context stay in memory without any shared store.
+    """
+
+    def __init__(self, workers: int = 2, handler_path: Optional[str] = None):
+        self.workers = max(1, workers)
+        self.handler_path = handler_path
+
+        self._processes: List[Optional[multiprocessing.Process]] = []
+        self._conns: List[Any] = []
+        self._send_locks: List[asyncio.Lock] = []
+        self._control_locks: List[asyncio.Lock] = []
+        self._request_id = 0
+        self._mp = multiprocessing.get_context("spawn")
+
+        # Métricas
+        self.dispatched = [0] * self.workers
+        self.restarts = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._processes)
+
+    def worker_for(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % self.workers
+
+    def _spawn(self, index: int) -> None:
+        # Duplex: los webhooks van al worker, las respuestas de control vuelven
+        conn, worker_conn = self._mp.Pipe(duplex=True)
+        process = self._mp.Process(
+            target=_worker_main,
+            args=(index, worker_conn, self.handler_path),
+            name=f"dispatch-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        worker_conn.close()
+        self._processes[index] = process
+        self._conns[index] = conn
+
+    def start(self) -> None:
+        if self.started:
+            return
+        self._processes = [None] * self.workers
+        self._conns = [None] * self.workers
+        self._send_locks = [asyncio.Lock() for _ in range(self.workers)]
+        self._control_locks = [asyncio.Lock() for _ in range(self.workers)]
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info(f"Webhook dispatcher started with {self.workers} workers")
+
+    async def stop(self, timeout: float = 15.0) -> None:
+        """Close the pipes and wait for the workers to drain their queues"""
+        if not self.started:
+            return
+
+        for conn in self._conns:
+            conn.close()
+
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"Terminating {process.name} after {timeout}s")
+                process.terminate()
+
+        self._processes = []
+        self._conns = []
+        self._send_locks = []
+        self._control_locks = []
+
+    async def dispatch(self, raw: bytes, payload: WebhookPayload) -> List[int]:
+        """
+        Forward a payload to the workers owning its conversations. A batch
+        spanning several workers is split; otherwise the raw bytes are sent.
+        Returns the worker indexes used.
+        """
+        if not self.started:
+            self.start()
+
+        parts = partition_by_conversation(payload, self.worker_for)
+        if len(parts) == 1:
+            index = next(iter(parts))
+            await self._send(index, raw)
+            return [index]
+
+        for index, part in parts.items():
+            await self._send(index, encode_webhook(part))
+        return list(parts)
+
+    async def call(self, op: str, *args, timeout: float = 10.0) -> List[Any]:
+        """
+        Run a control op (see _handle_control) on every worker and return
+        their results in worker order. Raises if a worker fails or does
+        not answer within `timeout`.
+        """
+        if not self.started:
+            return []
+        return list(
+            await asyncio.gather(
+                *(self._call(index, op, args, timeout) for index in range(self.workers))
+            )
+        )
+
+    async def _call(self, index: int, op: str, args, timeout: float) -> Any:
+        loop = asyncio.get_running_loop()
+        async with self._control_locks[index]:
+            self._request_id += 1
+            request_id = self._request_id
+            await self._write(
+                index, _CONTROL + msgspec.msgpack.encode([request_id, op, list(args)])
+            )
+
+            conn = self._conns[index]
+            deadline = loop.time() + timeout
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0 or not await loop.run_in_executor(
+                    None, conn.poll, remaining
+                ):
+                    raise TimeoutError(f"Dispatcher worker {index} did not answer {op}")
+                reply_id, ok, result = msgspec.msgpack.decode(
+                    await loop.run_in_executor(None, conn.recv_bytes)
+                )
+                if reply_id != request_id:
+                    # Respuesta tardía de un pedido que ya expiró
+                    continue
+                if not ok:
+                    raise RuntimeError(f"Dispatcher worker {index} failed {op}: {result}")
+                return result
+
+    async def _send(self, index: int, data: bytes) -> None:
+        await self._write(index, data)
+        self.dispatched[index] += 1
+
+    async def _write(self, index: int, data: bytes) -> None:
+        async with self._send_locks[index]:
+            if not self._processes[index].is_alive():
+                logger.error(f"Dispatcher worker {index} died, restarting it")
+                self._conns[index].close()
+                self._spawn(index)
+                self.restarts += 1
+
+            # send_bytes puede bloquear si el pipe está lleno
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._conns[index].send_bytes, data
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "alive": [bool(p and p.is_alive()) for p in self._processes],
+            "dispatched": list(self.dispatched),
+            "restarts": self.restarts,
+        }
+
+
+webhook_dispatcher = SenderAffinityDispatcher(
+    workers=config_manager.get_project_config().DISPATCH_WORKERS
+)
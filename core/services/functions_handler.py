@@ -64,7 +64,7 @@ class FunctionsHandler:
 
             if self.service_container and hasattr(self.service_container, "db"):
                 db = self.service_container.db
-                db.save_message(
+                await db.save_message(
                     conversation_id=self.conversation_id,
                     message_data={
                         "message": {
@@ -0,0 +1,57 @@
+# core/services/hydration.py
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from core.config import config_manager
+from core.storage.db import AsyncDBStorage, to_context_messages
+from core.utils.supabase_client import async_supabase
+
+logger = logging.getLogger(__name__)
+
+
+async def prefetch_recent_contexts(
+    hours: int, per_conversation: int = 30, page_size: int = 200
+) -> int:
+    """
+    Bulk-load into memory the contexts of the conversations active in the
+    last `hours`, one page of conversations (with their messages embedded)
+    per query. Returns the number of contexts primed.
+    """
+    from core.routers.webhook_processor import get_or_create_container
+
+    db = AsyncDBStorage(async_supabase)
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+    start = time.monotonic()
+    primed = 0
+    cursor = None
+
+    # Keyset sobre (last_activity_at, id): la actividad que llega durante
+    # el prefetch no corre las páginas como lo haría un OFFSET
+    while True:
+        page = await db.get_recent_conversations(
+            since, per_conversation, page_size, cursor
+        )
+        for conversation in page["items"]:
+            client_id, _ = config_manager.resolve_client(conversation["waba_id"])
+            if not client_id:
+                continue
+            messages = sorted(
+                conversation.get("messages") or [], key=lambda m: m["created_at"]
+            )
+            get_or_create_container(client_id).context.prime(
+                conversation["waba_id"],
+                conversation["phone_number"],
+                to_context_messages(messages),
+            )
+            primed += 1
+
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    logger.info(
+        f"Prefetched {primed} contexts active in the last {hours}h "
+        f"in {(time.monotonic() - start):.2f}s"
+    )
+    return primed
@@ -0,0 +1,232 @@
+# core/services/ingest.py
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core.config import config_manager
+from core.models.webhook import decode_webhook, encode_webhook
+from core.utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+WebhookHandler = Callable[[Any], Awaitable[None]]
+
+
+class WebhookJournal:
+    """Append-only SQLite journal of webhooks that have not been processed yet"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS webhook_journal ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "payload BLOB NOT NULL, "
+            "received_at REAL NOT NULL)"
+        )
+
+    def append(self, payload: bytes) -> int:
+        cursor = self._conn.execute(
+            "INSERT INTO webhook_journal (payload, received_at) VALUES (?, ?)",
+            (payload, time.time()),
+        )
+        return cursor.lastrowid
+
+    def ack(self, entry_id: int) -> None:
+        self._conn.execute("DELETE FROM webhook_journal WHERE id = ?", (entry_id,))
+
+    def pending(self) -> List[Tuple[int, bytes]]:
+        return self._conn.execute(
+            "SELECT id, payload FROM webhook_journal ORDER BY id"
+        ).fetchall()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class WebhookIngestQueue:
+    """
+    Bounded in-process queue that decouples the webhook HTTP ack from processing.
+    A fixed pool of workers drains the queue; when a journal path is configured,
+    payloads are journaled on enqueue and replayed on startup if unfinished.
+    """
+
+    def __init__(
+        self,
+        handler: Optional[WebhookHandler] = None,
+        maxsize: int = 1000,
+        workers: int = 4,
+        journal_path: Optional[str] = None,
+    ):
+        self._handler = handler
+        self.maxsize = maxsize
+        self.workers = workers
+        self.journal_path = journal_path
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._journal: Optional[WebhookJournal] = None
+
+        # Métricas
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.replayed = 0
+        self.wait_ms = Histogram()
+
+    @property
+    def started(self) -> bool:
+        return bool(self._worker_tasks)
+
+    def _get_handler(self) -> WebhookHandler:
+        if self._handler is None:
+            # Import diferido para evitar dependencias circulares con los routers
+            from core.routers.webhook_processor import process_meta_webhook
+
+            self._handler = process_meta_webhook
+        return self._handler
+
+    async def start(self) -> None:
+        """Start the worker pool and replay journaled work"""
+        if self.started:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        if self.journal_path:
+            self._journal = WebhookJournal(self.journal_path)
+
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        logger.info(
+            f"Webhook ingest started: {self.workers} workers, queue size {self.maxsize}"
+        )
+
+        if self._journal:
+            await self._replay()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Drain the queue for up to `timeout` seconds and stop the workers"""
+        if not self.started:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Webhook ingest stopped with {self._queue.qsize()} payloads pending"
+            )
+
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+    async def _replay(self) -> None:
+        pending = self._journal.pending()
+        if not pending:
+            return
+
+        logger.info(f"Replaying {len(pending)} journaled webhooks")
+        for entry_id, payload in pending:
+            try:
+                body = decode_webhook(payload)
+            except ValueError:
+                logger.error(f"Discarding unreadable journal entry {entry_id}")
+                self._journal.ack(entry_id)
+                continue
+            await self._queue.put((entry_id, body, time.monotonic()))
+            self.replayed += 1
+
+    def enqueue(self, body: Any, raw: Optional[bytes] = None) -> bool:
+        """
+        Enqueue a webhook payload without waiting for processing.
+
+        Returns:
+            bool: False if the queue is full and the payload was dropped
+        """
+        if not self.started or self._queue.full():
+            self.dropped += 1
+            return False
+
+        entry_id = None
+        if self._journal:
+            entry_id = self._journal.append(
+                raw if raw is not None else encode_webhook(body)
+            )
+
+        self._queue.put_nowait((entry_id, body, time.monotonic()))
+        self.enqueued += 1
+        return True
+
+    async def put(self, body: Any, raw: Optional[bytes] = None) -> None:
+        """Enqueue a webhook payload, waiting for room when the queue is full"""
+        if not self.started:
+            await self.start()
+
+        entry_id = None
+        if self._journal:
+            entry_id = self._journal.append(
+                raw if raw is not None else encode_webhook(body)
+            )
+
+        await self._queue.put((entry_id, body, time.monotonic()))
+        self.enqueued += 1
+
+    async def _worker(self, worker_id: int) -> None:
+        handler = self._get_handler()
+        while True:
+            entry_id, body, enqueued_at = await self._queue.get()
+            self.wait_ms.observe((time.monotonic() - enqueued_at) * 1000)
+            try:
+                try:
+                    await handler(body)
+                    self.processed += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(
+                        f"Ingest worker {worker_id} failed processing webhook: "
+                        f"{str(e)}",
+                        exc_info=True,
+                    )
+                # Cancelado a mitad de proceso (stop con timeout) no se confirma:
+                # la entrada queda en el journal y se reprocesa al arrancar
+                if entry_id is not None and self._journal:
+                    self._journal.ack(entry_id)
+            finally:
+                self._queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "replayed": self.replayed,
+            "enqueue_to_start_ms": self.wait_ms.snapshot(),
+        }
+
+
+_project_config = config_manager.get_project_config()
+
+ingest_queue = WebhookIngestQueue(
+    maxsize=_project_config.INGEST_QUEUE_MAXSIZE,
+    workers=_project_config.INGEST_WORKERS,
+    journal_path=_project_config.INGEST_JOURNAL_PATH or None,
+)
@@ -1,12 +1,18 @@
 # core/services/message_service.py
 import logging
+import time
+from functools import partial
 from typing import Any, Dict
 
+from core.config import config_manager
 from core.models.enums import MessageRole
 from core.services.openai_handler import OpenAIHandler
+from core.services.summarizer import summarize_messages
 
 logger = logging.getLogger(__name__)
 
+_project_config = config_manager.get_project_config()
+
 
 async def initialize_message(
     message: Dict[str, Any],
@@ -23,7 +29,16 @@ async def initialize_message(
         context = service_container.context
 
         # Inicializar conversación en DB
-        conversation_id = db.get_or_create_conversation(waba_config.waba_id, sender)
+        conversation_id = await db.get_or_create_conversation(waba_config.waba_id, sender)
+
+        # Si el contexto expiró o el proceso reinició, se rehidrata desde la base
+        await context.hydrate(
+            waba_config.waba_id,
+            sender,
+            lambda: db.get_recent_messages(
+                conversation_id, _project_config.CONTEXT_HYDRATION_MESSAGES
+            ),
+        )
 
         # Crear o obtener buffer para esta conversación
         buffer_key = message_buffer_manager.get_or_create_buffer(
@@ -44,7 +59,7 @@ async def initialize_message(
         }
 
         # Guardar en base de datos
-        db.save_message(
+        await db.save_message(
             conversation_id,
             {**message_data, "original_message": message},
             metadata=metadata,
@@ -53,6 +68,7 @@ async def initialize_message(
         # Añadir a buffer y contexto
         await message_buffer_manager.add_message(buffer_key, message_data)
         context.add_message(waba_config.waba_id, sender, MessageRole.USER, text_content)
+        await context.sync(waba_config.waba_id, sender)
 
         return conversation_id, buffer_key
 
@@ -72,11 +88,23 @@ async def process_buffered_messages(
             logger.debug(f"No buffer found for sender {sender}")
             return
 
+        # Esperar a que termine la ráfaga para responder todo en un solo turno
+        client_config = service_container.client_config
+        if client_config:
+            await message_buffer_manager.wait_for_quiet_period(
+                buffer_key,
+                client_config.message_debounce_seconds,
+                client_config.message_debounce_max_wait,
+            )
+
         async with message_buffer_manager.with_lock(buffer_key):
-            buffer_data = message_buffer_manager.buffer[buffer_key]
+            buffer_data = message_buffer_manager.get_buffer(buffer_key)
+            if buffer_data is None:
+                logger.debug(f"Buffer {buffer_key} cleared while waiting")
+                return
 
             # Get metadata
-            metadata = buffer_data["metadata"]
+            metadata = buffer_data.metadata
             conversation_id = metadata["conversation_id"]
 
             # Extract data from metadata
@@ -85,12 +113,14 @@ async def process_buffered_messages(
             conversation_id = metadata["conversation_id"]
             # client_id = service_container.client_id
 
+            # Con backend compartido: traer lo recibido por otros workers
+            await message_buffer_manager.sync_pending(buffer_key)
+            await service_container.context.load(waba_conf.waba_id, sender)
+
             # Get unprocessed messages
-            unprocessed_messages = [
-                msg
-                for msg in buffer_data["messages"]
-                if not msg.get("processed", False)
-            ]
+            unprocessed_messages = message_buffer_manager.get_unprocessed_messages(
+                buffer_key
+            )
 
             if not unprocessed_messages:
                 logger.debug(f"No unprocessed messages for buffer: {buffer_key}")
@@ -104,10 +134,35 @@ async def process_buffered_messages(
                 waba_conf, sender, conversation_id, current_processing_ids
             )
 
-            await openai_handler.handle_openai_process()
+            turn_started_at = time.monotonic()
+            try:
+                await openai_handler.handle_openai_process()
+            finally:
+                await service_container.context.sync(waba_conf.waba_id, sender)
+
+            if getattr(openai_handler, "superseded", False):
+                # Llegaron mensajes nuevos: quedan pendientes y el drain
+                # repite el turno con todos juntos
+                logger.info(f"Turn superseded for {buffer_key}, restarting")
+                return
+
+            message_buffer_manager.record_turn(
+                len(current_processing_ids),
+                (time.monotonic() - turn_started_at) * 1000,
+            )
+
+            # Si el historial supera el presupuesto, se resume fuera del turno
+            if client_config:
+                service_container.context.schedule_summary(
+                    waba_conf.waba_id,
+                    sender,
+                    client_config.context_token_budget,
+                    partial(summarize_messages, waba_conf),
+                    keep_recent=client_config.context_keep_recent,
+                )
 
             # Mark messages as processed
-            message_buffer_manager.mark_messages_processed(
+            await message_buffer_manager.ack_messages(
                 buffer_key, current_processing_ids
             )
 
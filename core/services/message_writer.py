@@ -0,0 +1,444 @@
+# core/services/message_writer.py
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+
+from core.config import config_manager
+from core.utils.metrics import Histogram
+from core.utils.supabase_client import async_supabase
+
+logger = logging.getLogger(__name__)
+
+# Errores de Postgres que vale la pena reintentar: conexión, rollback por
+# concurrencia, recursos, intervención del operador y errores de sistema
+_TRANSIENT_PG_CLASSES = ("08", "40", "53", "57", "58")
+# PostgREST sin conexión a la base, o con el pool agotado
+_TRANSIENT_PGRST_CODES = ("PGRST000", "PGRST001", "PGRST002", "PGRST003")
+
+
+def _is_transient(error: Exception) -> bool:
+    """
+    True for errors a retry can fix (network, timeouts, 5xx, DB
+    unavailable). Data errors (constraint violation, unknown column...)
+    fail again with the same rows.
+    """
+    if not isinstance(error, APIError):
+        return True
+    code = error.code
+    if isinstance(code, int):
+        # Respuesta sin JSON (proxy/gateway): el código es el HTTP status
+        return code >= 500 or code in (408, 429)
+    code = str(code or "")
+    return code in _TRANSIENT_PGRST_CODES or code[:2] in _TRANSIENT_PG_CLASSES
+
+
+class MessageWriter:
+    """
+    Write-behind queue for the messages table. Rows are bulk-inserted in
+    batches when the batch fills up or on a timer, and `last_activity_at`
+    is updated once per conversation per flush instead of once per message.
+
+    Order is preserved: rows are inserted in arrival order by a single
+    flush at a time, and each one carries a strictly increasing
+    `created_at` stamped on enqueue, so a bulk insert (where now() is the
+    same for the whole statement) never reorders a conversation.
+
+    Metadata merges for rows already written are queued too and applied
+    after the inserts of the next flush, one RPC per merge. Raw payloads
+    for the message_payloads archive are batched the same way.
+
+    Failures never block the queue: transient errors are retried with
+    backoff up to `max_retries` times, and a batch rejected by the DB is
+    bisected so only the bad rows are dead-lettered (logged and kept in
+    `dead_letters`). Memory is capped at `max_pending` per queue; past it
+    the oldest entries are dropped, as StatusTracker does.
+    """
+
+    def __init__(
+        self,
+        supabase_client,
+        flush_interval: float = 0.5,
+        batch_size: int = 200,
+        max_pending: int = 10000,
+        max_retries: int = 5,
+    ):
+        self.supabase = supabase_client
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+
+        self._pending: List[Dict[str, Any]] = []
+        self._activity: Dict[str, str] = {}
+        # Conversaciones del flush en curso
+        self._flushing: Dict[str, str] = {}
+        # (conversation_id, message_ids, metadata) para filas ya enviadas
+        self._merges: List[Tuple[str, List[str], Dict]] = []
+        # Payloads crudos para message_payloads
+        self._archive: List[Dict[str, Any]] = []
+        self._last_stamp = datetime.min.replace(tzinfo=timezone.utc)
+        self._flush_task: Optional[asyncio.Task] = None
+        self._timer_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # Reintentos del lote en la cabeza de la cola y backoff hasta el próximo
+        self._attempts = 0
+        self._retry_at = 0.0
+
+        # Métricas
+        self.enqueued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.activity_updates = 0
+        self.metadata_merged = 0
+        self.metadata_rpcs = 0
+        self.archived = 0
+        self.retries = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+        self.dead_letters: Deque[Tuple[str, Any, str]] = deque(maxlen=100)
+        self.flush_ms = Histogram()
+
+    @property
+    def started(self) -> bool:
+        return self._timer_task is not None
+
+    def start(self) -> None:
+        if self.started:
+            return
+        self._flush_lock = asyncio.Lock()
+        self._timer_task = asyncio.create_task(self._timer())
+
+    async def stop(self) -> None:
+        """Stop the timer and write everything still queued, or log what is lost"""
+        if self._timer_task:
+            self._timer_task.cancel()
+            await asyncio.gather(self._timer_task, return_exceptions=True)
+            self._timer_task = None
+
+        # Último flush: se reintenta sin esperar el backoff, hasta agotar
+        # los reintentos
+        for _ in range(self.max_retries + 1):
+            await self.flush(force=True)
+            if not self._queued():
+                return
+
+        unwritten = self._queued()
+        self.dropped += unwritten
+        logger.error(
+            f"Message writer stopped with {unwritten} unwritten entries "
+            f"({len(self._pending)} messages, {len(self._merges)} metadata merges, "
+            f"{len(self._archive)} payloads)"
+        )
+        self._pending.clear()
+        self._merges.clear()
+        self._archive.clear()
+        self._activity.clear()
+
+    def _queued(self) -> int:
+        return len(self._pending) + len(self._merges) + len(self._archive)
+
+    def _stamp(self) -> str:
+        now = datetime.now(timezone.utc)
+        if now <= self._last_stamp:
+            now = self._last_stamp + timedelta(microseconds=1)
+        self._last_stamp = now
+        return now.isoformat()
+
+    def _cap(self, queue: List, kind: str) -> None:
+        if len(queue) > self.max_pending:
+            # El DB no da abasto: se descartan los más viejos
+            overflow = len(queue) - self.max_pending
+            del queue[:overflow]
+            self.dropped += overflow
+            logger.error(f"Message writer full: dropped {overflow} queued {kind}")
+
+    async def put(self, row: Dict[str, Any]) -> None:
+        """Queue a messages row. Never waits on the DB once started"""
+        row["created_at"] = self._stamp()
+        self._pending.append(row)
+        self._activity[row["conversation_id"]] = row["created_at"]
+        self.enqueued += 1
+        self._cap(self._pending, "messages")
+
+        if not self.started:
+            # Sin timer (scripts): se escribe antes de seguir
+            await self.flush()
+        elif len(self._pending) >= self.batch_size:
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self.flush())
+
+    async def archive(self, row: Dict[str, Any]) -> None:
+        """Queue a message_payloads row, written after the messages"""
+        self._archive.append(row)
+        self._cap(self._archive, "payloads")
+        if not self.started:
+            await self.flush()
+
+    def has_pending(self, conversation_id: str) -> bool:
+        """True if the conversation has rows queued or being written"""
+        return (
+            conversation_id in self._activity
+            or conversation_id in self._flushing
+            or any(merge[0] == conversation_id for merge in self._merges)
+        )
+
+    async def wait_written(self, conversation_id: str) -> None:
+        """
+        Read-your-writes: before reading a conversation with queued rows,
+        wait until they are written or dead-lettered, backoffs included
+        """
+        while self.has_pending(conversation_id):
+            delay = self._retry_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.flush()
+
+    def merge_metadata(
+        self, conversation_id: str, message_id: str, metadata_update: Dict
+    ) -> bool:
+        """Merge metadata into a row that is still queued. False if not queued"""
+        for row in reversed(self._pending):
+            if (
+                row["conversation_id"] == conversation_id
+                and row.get("message_id") == message_id
+            ):
+                row["metadata"] = {**(row.get("metadata") or {}), **metadata_update}
+                self.metadata_merged += 1
+                return True
+        return False
+
+    async def merge_metadata_many(
+        self, conversation_id: str, message_ids: List[str], metadata_update: Dict
+    ) -> None:
+        """
+        Merge metadata into several messages without waiting: queued rows
+        are updated in place, the rest in one RPC on the next flush.
+        """
+        remaining = set(message_ids)
+        for row in self._pending:
+            if (
+                row["conversation_id"] == conversation_id
+                and row.get("message_id") in remaining
+            ):
+                row["metadata"] = {**(row.get("metadata") or {}), **metadata_update}
+                remaining.discard(row["message_id"])
+                self.metadata_merged += 1
+
+        if remaining:
+            self._merges.append(
+                (
+                    conversation_id,
+                    [m for m in message_ids if m in remaining],
+                    metadata_update,
+                )
+            )
+            self._cap(self._merges, "metadata merges")
+            if not self.started:
+                await self.flush()
+
+    async def _timer(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing messages: {str(e)}", exc_info=True)
+
+    async def flush(self, force: bool = False) -> None:
+        """Write everything queued. Skipped during a retry backoff unless `force`"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        # El chequeo va dentro del lock: así también espera al flush en curso
+        async with self._flush_lock:
+            if not self._queued() and not self._activity:
+                return
+            if not force and time.monotonic() < self._retry_at:
+                return
+            start = time.monotonic()
+            activity, self._activity = self._activity, {}
+            self._flushing = activity
+            try:
+                await self._write(activity)
+            finally:
+                self._flushing = {}
+            self.flush_ms.observe((time.monotonic() - start) * 1000)
+
+    async def _write(self, activity: Dict[str, str]) -> None:
+        if not self.supabase:
+            self._pending.clear()
+            self._merges.clear()
+            self._archive.clear()
+            return
+
+        if not await self._drain(self._pending, self._insert_messages, "messages"):
+            # Se reintentan en el próximo flush, delante de los nuevos
+            self._activity = {**activity, **self._activity}
+            return
+        await self._update_activity(activity)
+        # Después de los inserts: las filas a fusionar ya existen
+        if not await self._apply_merges():
+            return
+        if not await self._drain(self._archive, self._insert_payloads, "payloads"):
+            return
+        self.flushes += 1
+
+    async def _drain(
+        self,
+        queue: List[Dict[str, Any]],
+        insert: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        kind: str,
+    ) -> bool:
+        """Insert `queue` in batches. False if it must be retried later"""
+        while queue:
+            rows = queue[: self.batch_size]
+            del queue[: len(rows)]
+            try:
+                await insert(rows)
+            except Exception as e:
+                self.flush_errors += 1
+                if _is_transient(e):
+                    if self._backoff(f"{len(rows)} {kind}", e):
+                        queue[:0] = rows
+                        return False
+                    self._dead_letter(kind, rows, e)
+                else:
+                    # El DB rechaza el lote: se aíslan las filas malas
+                    await self._bisect(rows, insert, kind, e)
+            self._attempts = 0
+        return True
+
+    def _backoff(self, what: str, error: Exception) -> bool:
+        """Schedule a retry with exponential backoff. False once retries run out"""
+        if self._attempts >= self.max_retries:
+            self._attempts = 0
+            return False
+        self._attempts += 1
+        self.retries += 1
+        delay = min(self.flush_interval * 2**self._attempts, 30.0)
+        self._retry_at = time.monotonic() + delay
+        logger.warning(
+            f"Error writing {what} (attempt {self._attempts}/{self.max_retries}), "
+            f"retrying in {delay:.1f}s: {str(error)}"
+        )
+        return True
+
+    async def _bisect(
+        self,
+        rows: List[Dict[str, Any]],
+        insert: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        kind: str,
+        error: Exception,
+    ) -> None:
+        if len(rows) == 1:
+            self._dead_letter(kind, rows, error)
+            return
+        # Mitades en orden: el orden de inserción se conserva
+        middle = len(rows) // 2
+        for half in (rows[:middle], rows[middle:]):
+            try:
+                await insert(half)
+            except Exception as e:
+                await self._bisect(half, insert, kind, e)
+
+    def _dead_letter(self, kind: str, entries: List[Any], error: Exception) -> None:
+        self.dead_lettered += len(entries)
+        for entry in entries:
+            self.dead_letters.append((kind, entry, str(error)))
+        logger.error(
+            f"Dropped {len(entries)} {kind} the DB did not accept: {str(error)}"
+        )
+
+    async def _insert_messages(self, rows: List[Dict[str, Any]]) -> None:
+        # Filas con columnas distintas: las que faltan toman su default
+        await self.supabase.table("messages").insert(
+            rows, returning=ReturnMethod.minimal, default_to_null=False
+        ).execute()
+        self.flushed += len(rows)
+
+    async def _insert_payloads(self, rows: List[Dict[str, Any]]) -> None:
+        # Meta reintenta: un wamid ya archivado se ignora
+        await self.supabase.table("message_payloads").upsert(
+            rows,
+            on_conflict="wamid",
+            ignore_duplicates=True,
+            returning=ReturnMethod.minimal,
+        ).execute()
+        self.archived += len(rows)
+
+    async def _apply_merges(self) -> bool:
+        """Run the queued merges in order. False if they must be retried later"""
+        while self._merges:
+            merge = self._merges[0]
+            conversation_id, message_ids, metadata_update = merge
+            try:
+                await self.supabase.rpc(
+                    "merge_message_metadata",
+                    {
+                        "p_conversation_id": conversation_id,
+                        "p_message_ids": message_ids,
+                        "p_metadata": metadata_update,
+                    },
+                ).execute()
+                self.metadata_rpcs += 1
+            except Exception as e:
+                self.flush_errors += 1
+                if _is_transient(e) and self._backoff("metadata merge", e):
+                    return False
+                self._dead_letter("metadata merges", [merge], e)
+            # _cap pudo recortar la cola mientras se esperaba la RPC
+            if self._merges and self._merges[0] is merge:
+                del self._merges[0]
+            self._attempts = 0
+        return True
+
+    async def _update_activity(self, activity: Dict[str, str]) -> None:
+        async def update(conversation_id: str, last_activity_at: str) -> None:
+            try:
+                await self.supabase.table("conversations").update(
+                    {"last_activity_at": last_activity_at}
+                ).eq("id", conversation_id).execute()
+            except Exception as e:
+                logger.error(
+                    f"Error updating activity of conversation {conversation_id}: {str(e)}"
+                )
+
+        await asyncio.gather(
+            *(update(conv_id, stamp) for conv_id, stamp in activity.items())
+        )
+        self.activity_updates += len(activity)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self._pending),
+            "archive_depth": len(self._archive),
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "activity_updates": self.activity_updates,
+            "metadata_merged": self.metadata_merged,
+            "metadata_rpcs": self.metadata_rpcs,
+            "pending_merges": len(self._merges),
+            "archived": self.archived,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "dead_lettered": self.dead_lettered,
+            "flush_ms": self.flush_ms.snapshot(),
+        }
+
+
+_project_config = config_manager.get_project_config()
+
+message_writer = MessageWriter(
+    async_supabase,
+    flush_interval=_project_config.MESSAGE_FLUSH_INTERVAL,
+    batch_size=_project_config.MESSAGE_FLUSH_BATCH_SIZE,
+)
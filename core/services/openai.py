@@ -49,9 +49,9 @@ async def create_openai_file(
 ) -> str:
     filename = f"{name}.json"
     try:
-        save_log_to_db(data, waba)
+        await save_log_to_db(data, waba)
         json_string = json.dumps(data)
-        save_log_to_db(json_string, waba)
+        await save_log_to_db(json_string, waba)
 
         with open(filename, "w", encoding="utf-8") as f:
             json.dump(data, f)
@@ -233,7 +233,7 @@ async def get_assistant_openai_res(
             openai_client, thread_id
         )
 
-        save_message_to_db(thread_id, response_msg, "outbound", "text")
+        await save_message_to_db(thread_id, response_msg, "outbound", "text")
 
         return response_msg
     except Exception as error:
@@ -270,7 +270,7 @@ async def creates_thread_if_not_exist(
     local_thread_key = f"{assistant_id}_{from_}_{waba}"
 
     try:
-        db_thread = find_thread_in_database(local_thread_key)
+        db_thread = await find_thread_in_database(local_thread_key)
 
         # logger.info(f"Thread found in DB: {db_thread}")
 
@@ -319,7 +319,7 @@ async def handle_new_thread(
         f"Inserting/updating thread into database with OpenAI thread ID: {new_openai_thread_id}"
     )
 
-    thread_data = upsert_thread(
+    thread_data = await upsert_thread(
         waba,
         from_,
         new_openai_thread_id,
@@ -351,7 +351,7 @@ async def delete_thread_manually(waba: str, phone_number: str) -> dict:
     local_thread_key = f"{assistant_id}_{phone_number}_{waba}"
 
     try:
-        thread = find_thread_in_database(local_thread_key)
+        thread = await find_thread_in_database(local_thread_key)
         if not thread or not thread.get("openai_thread_id"):
             return {
                 "message": f"No thread found in DB for the given key: {local_thread_key}"
@@ -417,7 +417,7 @@ async def handle_new_user_message(
                 content=message_content,
             )
 
-            save_message_to_db(thread_id, message_content, "inbound", type_)
+            await save_message_to_db(thread_id, message_content, "inbound", type_)
             return
         except Exception as error:
             logger.info(
@@ -1,12 +1,15 @@
 # core/services/openai_handler.py
+import asyncio
 import logging
+import time
 import uuid
-from typing import Dict, Any, List, Optional, Union, Tuple
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Union, Tuple
 
 from core.models.enums import MessageRole, ToolChoice
 from core.models.tool import ToolChoiceType
-from core.services.whatsapp import send_text_response_to_wa
+from core.services.whatsapp import extract_wamid, send_text_response_to_wa
 from core.utils.logging import log_messages
+from core.utils.tokens import count_message_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +42,11 @@ class OpenAIHandler:
         # Default empty functions handler - should be overridden by subclasses
         self.functions_handler = None
 
+        # Estado de cancelación temprana del turno
+        self.superseded = False
+        self._response_committed = False
+        self._inflight_tokens = 0
+
     async def handle_openai_process(self) -> None:
         """
         Base method for processing messages with OpenAI
@@ -46,6 +54,83 @@ class OpenAIHandler:
         """
         raise NotImplementedError("Subclasses must implement handle_openai_process")
 
+    async def run_superseding_turn(self, turn: Callable[[], Awaitable[None]]) -> None:
+        """
+        Run a turn, cancelling it as soon as a newer message lands in the buffer.
+
+        Once the turn is committed (commit_response, before the first side
+        effect) it is allowed to finish. A cancelled turn leaves `superseded`
+        set so the caller keeps the messages pending and restarts the turn
+        with the merged input. If the watcher fails the turn just finishes.
+        """
+        message_buffer_manager = self.service_container.message_buffer_manager
+        started_at = time.monotonic()
+
+        turn_task = asyncio.ensure_future(turn())
+        watcher = asyncio.ensure_future(
+            message_buffer_manager.wait_for_new_message(
+                self.buffer_key, self.current_processing_ids
+            )
+        )
+        try:
+            await asyncio.wait(
+                {turn_task, watcher}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if turn_task.done() or self._response_committed:
+                await turn_task
+                return
+
+            error = watcher.exception()
+            if error is not None:
+                # Sin watcher no hay cancelación temprana, pero el turno sigue
+                logger.warning(
+                    f"New-message watcher failed for {self.sender_phone}: {str(error)}"
+                )
+                await turn_task
+                return
+
+            tokens_saved = self._inflight_tokens
+            turn_task.cancel()
+            await asyncio.gather(turn_task, return_exceptions=True)
+
+            elapsed = time.monotonic() - started_at
+            self.superseded = True
+            message_buffer_manager.record_cancelled_turn(elapsed, tokens_saved)
+            logger.info(
+                f"Turn for {self.sender_phone} cancelled after {elapsed:.2f}s: "
+                f"new message arrived (~{tokens_saved} prompt tokens not sent again)"
+            )
+        finally:
+            watcher.cancel()
+            if not turn_task.done():
+                turn_task.cancel()
+
+    async def commit_response(self) -> bool:
+        """
+        Commit the turn before its first side effect (a WhatsApp message, a
+        template, an email): from here on a newer message no longer cancels
+        it. Returns False, with `superseded` set, if newer messages already
+        arrived and the turn must stop instead.
+        """
+        if self._response_committed:
+            return True
+
+        # Check if new messages arrived while processing this one
+        message_buffer_manager = self.service_container.message_buffer_manager
+        if hasattr(message_buffer_manager, "has_new_pending_messages"):
+            if await message_buffer_manager.has_new_pending_messages(
+                self.buffer_key, self.current_processing_ids
+            ):
+                logger.info(
+                    f"Canceling response processing due to new pending messages for {self.sender_phone}"
+                )
+                self.superseded = True
+                return False
+
+        # A partir de aquí la respuesta ya no se cancela
+        self._response_committed = True
+        return True
+
     async def get_completion(
         self,
         messages: List[Dict[str, str]],
@@ -80,9 +165,20 @@ class OpenAIHandler:
                 create_params["tools"] = tools or self.waba_conf.tools
                 create_params["tool_choice"] = tool_choice.value
 
+            # Tokens en vuelo, usados al cancelar el turno
+            self._inflight_tokens = count_message_tokens(
+                messages, create_params["model"]
+            )
             api_response = await self.waba_conf.openai_client.chat.completions.create(
                 **create_params
             )
+            usage = getattr(api_response, "usage", None)
+            details = getattr(usage, "prompt_tokens_details", None)
+            self.service_container.context.record_prompt_tokens(
+                usage.prompt_tokens if usage else self._inflight_tokens,
+                getattr(details, "cached_tokens", None) or 0,
+            )
+            self._inflight_tokens = 0
 
             choice = api_response.choices[0]
             assistant_msg = choice.message
@@ -126,32 +222,27 @@ class OpenAIHandler:
         Process and send a response to the user
         """
         try:
-            # Check if new messages arrived while processing this one
-            message_buffer_manager = self.service_container.message_buffer_manager
-            if hasattr(message_buffer_manager, "has_new_pending_messages"):
-                if await message_buffer_manager.has_new_pending_messages(
-                    self.buffer_key, self.current_processing_ids
-                ):
-                    logger.info(
-                        f"Canceling response processing due to new pending messages for {self.sender_phone}"
-                    )
-                    return
+            if not await self.commit_response():
+                return
 
             # Send message to WhatsApp if provided
+            outbound_wamid = None
             if to_send_message is not None:
                 wa_sending = await send_text_response_to_wa(
                     to_send_message, self.sender_phone, self.waba_conf
                 )
                 logger.info(f"wa_sending:{wa_sending}")
+                # Con el wamid como message_id los statuses se correlacionan
+                outbound_wamid = extract_wamid(wa_sending)
 
             # Save to DB if there's a message (either specific DB message or fallback to send message)
             db_message = to_db_message if to_db_message is not None else to_send_message
             if db_message is not None:
-                self.service_container.db.save_message(
+                await self.service_container.db.save_message(
                     conversation_id=self.conversation_id,
                     message_data={
                         "message": {
-                            "id": str(uuid.uuid4()),
+                            "id": outbound_wamid or str(uuid.uuid4()),
                             "text": {"body": db_message},
                         },
                         "type": "text",
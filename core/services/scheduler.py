@@ -0,0 +1,133 @@
+# core/services/scheduler.py
+import asyncio
+import logging
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Set
+
+from core.config import config_manager
+
+logger = logging.getLogger(__name__)
+
+WorkFactory = Callable[[], Awaitable[Any]]
+
+
+class ConversationScheduler:
+    """
+    Shards conversations (keyed by sender_waba) across N async worker lanes.
+
+    Work submitted with `run` for the same key executes strictly in arrival
+    order on a single lane, while different conversations run in parallel on
+    other lanes. The LLM turn of a conversation is not executed on the lane:
+    `request_drain` keeps a single drain task per key, so a slow completion
+    never blocks message ingestion for the conversations sharing its lane.
+    """
+
+    def __init__(self, lanes: int = 16):
+        self.lanes = max(1, lanes)
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._drains: Dict[str, asyncio.Task] = {}
+        self._drain_requested: Set[str] = set()
+
+        # Métricas
+        self.completed = [0] * self.lanes
+        self.drains_started = 0
+        self.drains_coalesced = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    def lane_for(self, key: str) -> int:
+        """Stable lane index for a conversation key (independent of PYTHONHASHSEED)"""
+        return zlib.crc32(key.encode()) % self.lanes
+
+    def start(self) -> None:
+        if self.started:
+            return
+        self._queues = [asyncio.Queue() for _ in range(self.lanes)]
+        self._workers = [
+            asyncio.create_task(self._lane_worker(i)) for i in range(self.lanes)
+        ]
+        logger.info(f"Conversation scheduler started with {self.lanes} lanes")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Let pending drains finish for up to `timeout` seconds and stop the lanes"""
+        if self._drains:
+            await asyncio.wait(list(self._drains.values()), timeout=timeout)
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues = []
+
+    async def run(self, key: str, factory: WorkFactory) -> Any:
+        """Execute `factory()` on the lane owning `key` and wait for its result"""
+        if not self.started:
+            self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues[self.lane_for(key)].put_nowait((factory, future))
+        return await future
+
+    def request_drain(self, key: str, factory: WorkFactory) -> None:
+        """
+        Ensure the buffer of `key` gets drained. If a drain is already running,
+        it runs `factory` once more when it finishes instead of starting another.
+        """
+        if key in self._drains:
+            self._drain_requested.add(key)
+            self.drains_coalesced += 1
+            return
+
+        self.drains_started += 1
+        self._drains[key] = asyncio.create_task(self._drain(key, factory))
+
+    async def _drain(self, key: str, factory: WorkFactory) -> None:
+        try:
+            while True:
+                self._drain_requested.discard(key)
+                try:
+                    await factory()
+                except Exception as e:
+                    logger.error(f"Error draining {key}: {str(e)}", exc_info=True)
+                if key not in self._drain_requested:
+                    break
+        finally:
+            self._drains.pop(key, None)
+            self._drain_requested.discard(key)
+
+    async def _lane_worker(self, lane: int) -> None:
+        queue = self._queues[lane]
+        while True:
+            factory, future = await queue.get()
+            try:
+                result = await factory()
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.completed[lane] += 1
+                queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        active_drains = [0] * self.lanes
+        for key in self._drains:
+            active_drains[self.lane_for(key)] += 1
+
+        return {
+            "lanes": self.lanes,
+            "backlog": [q.qsize() for q in self._queues] or [0] * self.lanes,
+            "active_drains": active_drains,
+            "completed": list(self.completed),
+            "drains_started": self.drains_started,
+            "drains_coalesced": self.drains_coalesced,
+        }
+
+
+conversation_scheduler = ConversationScheduler(
+    lanes=config_manager.get_project_config().SCHEDULER_LANES
+)
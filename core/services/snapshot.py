@@ -0,0 +1,294 @@
+# core/services/snapshot.py
+import asyncio
+import gc
+import logging
+import mmap
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import msgspec
+
+from core.config import config_manager
+from core.storage.state import state_backend
+from core.utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# Formato msgpack con structs como arrays: sin nombres de campo repetidos
+
+
+class _ContextEntry(msgspec.Struct, array_like=True):
+    key: str
+    messages: List[Tuple[str, Any, int]]
+    summary: Optional[str] = None
+
+
+class _BufferEntry(msgspec.Struct, array_like=True):
+    sender: str
+    waba_id: str
+    conversation_id: Any
+    messages: List[Dict[str, Any]]
+
+
+class _ClientState(msgspec.Struct, array_like=True):
+    client_id: str
+    contexts: List[_ContextEntry]
+    buffers: List[_BufferEntry]
+    waba_rows: Dict[str, Dict[str, Any]]
+
+
+class _Snapshot(msgspec.Struct, array_like=True):
+    version: int
+    created_at: float
+    clients: List[_ClientState]
+
+
+_encoder = msgspec.msgpack.Encoder()
+_decoder = msgspec.msgpack.Decoder(_Snapshot)
+
+
+def _collect() -> _Snapshot:
+    from core.routers.webhook_processor import get_client_containers
+
+    clients = []
+    for client_id, container in get_client_containers().items():
+        buffers = []
+        manager = container.message_buffer_manager
+        for buffer in manager.get_active_buffers().values():
+            if not buffer.pending:
+                continue
+            metadata = buffer.metadata
+            buffers.append(
+                _BufferEntry(
+                    sender=metadata["sender"],
+                    waba_id=metadata["waba_id"],
+                    conversation_id=metadata["conversation_id"],
+                    messages=list(buffer.pending.values()),
+                )
+            )
+
+        clients.append(
+            _ClientState(
+                client_id=client_id,
+                contexts=[
+                    _ContextEntry(key, messages, summary)
+                    for key, messages, summary in container.context.export_contexts()
+                ],
+                buffers=buffers,
+                waba_rows=container.wabas_config_cache.export_rows(),
+            )
+        )
+
+    return _Snapshot(version=SNAPSHOT_VERSION, created_at=time.time(), clients=clients)
+
+
+def _drain(container, waba_conf, sender: str):
+    from core.services.message import process_buffered_messages
+
+    return lambda: process_buffered_messages(
+        waba_conf, sender, container.message_buffer_manager, container
+    )
+
+
+def _write_file(path: str, data: bytes) -> None:
+    # Se escribe a un temporal y se renombra: nunca queda un snapshot a medias.
+    # Contiene tokens de WABA, así que solo lo lee el usuario del proceso
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Generational GC off while a synchronous section (no awaits inside)
+    creates hundreds of thousands of objects at once: the GC would walk
+    them several times and the restore is ~2x slower (benchmarks.snapshot)
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _read_file(path: str) -> Optional[_Snapshot]:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with _gc_paused():
+                return _decoder.decode(mapped)
+
+
+class StateSnapshotter:
+    """
+    Warm restart of the in-memory conversation state. Active contexts,
+    unprocessed buffers and the WABA configs loaded from the DB are written
+    to a local msgpack file on shutdown and periodically, and restored on
+    startup, so the first turn after a restart keeps its context without
+    going to the DB. Unprocessed buffers are drained again after restore.
+
+    With a shared state backend the state already survives restarts and
+    the snapshot is not used.
+    """
+
+    def __init__(self, path: Optional[str], interval: float = 300.0):
+        self.path = path
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+
+        # Métricas
+        self.writes = 0
+        self.write_errors = 0
+        self.last_bytes = 0
+        self.write_ms = Histogram()
+        self.restore_ms: Optional[float] = None
+        self.restored: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and not state_backend.shared
+
+    async def start(self) -> None:
+        """Restore the last snapshot and start the periodic checkpoint"""
+        if not self.enabled or self._task:
+            return
+        try:
+            await self.restore()
+        except Exception as e:
+            logger.error(
+                f"Error restoring snapshot {self.path}: {str(e)}", exc_info=True
+            )
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._checkpoint_loop())
+
+    async def stop(self) -> None:
+        """Stop the checkpoint and write a final snapshot"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.enabled:
+            await self.write()
+
+    async def _checkpoint_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.write()
+
+    async def write(self) -> None:
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+
+        async with self._write_lock:
+            start = time.monotonic()
+            try:
+                # La captura se hace en el loop (estado consistente); la
+                # escritura a disco, fuera
+                data = _encoder.encode(_collect())
+                await asyncio.get_running_loop().run_in_executor(
+                    None, _write_file, self.path, data
+                )
+            except Exception as e:
+                self.write_errors += 1
+                logger.error(f"Error writing snapshot {self.path}: {str(e)}")
+                return
+
+            self.writes += 1
+            self.last_bytes = len(data)
+            self.write_ms.observe((time.monotonic() - start) * 1000)
+
+    async def restore(self) -> Dict[str, int]:
+        """Load the snapshot into the client containers. Returns what was restored"""
+        from core.routers.webhook_processor import get_or_create_container
+        from core.services.scheduler import conversation_scheduler
+
+        if not os.path.exists(self.path):
+            return {}
+
+        start = time.monotonic()
+        try:
+            # En el loop y no en un thread: el GC se apaga durante el decode y
+            # ninguna otra corrutina corre mientras tanto. Es al arrancar,
+            # antes de atender tráfico
+            snapshot = _read_file(self.path)
+        except (msgspec.DecodeError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable snapshot {self.path}: {str(e)}")
+            return {}
+        if snapshot is None or snapshot.version != SNAPSHOT_VERSION:
+            logger.warning(f"Ignoring snapshot {self.path} (empty or old version)")
+            return {}
+
+        counts = {"contexts": 0, "buffers": 0, "waba_configs": 0}
+        for client in snapshot.clients:
+            if not config_manager.get_client_config(client.client_id):
+                continue
+            container = get_or_create_container(client.client_id)
+
+            counts["waba_configs"] += container.wabas_config_cache.restore_rows(
+                client.waba_rows
+            )
+            # Sin awaits: el GC se reactiva antes de ceder el loop
+            with _gc_paused():
+                for entry in client.contexts:
+                    if container.context.restore_context(
+                        entry.key, entry.messages, entry.summary
+                    ):
+                        counts["contexts"] += 1
+
+            manager = container.message_buffer_manager
+            for entry in client.buffers:
+                try:
+                    waba_conf = await container.wabas_config_cache.get_config(
+                        client.client_id, entry.waba_id
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"Dropping snapshot buffer of {entry.sender}: {str(e)}"
+                    )
+                    continue
+                buffer_key = manager.restore_buffer(
+                    waba_conf, entry.sender, entry.conversation_id, entry.messages
+                )
+                counts["buffers"] += 1
+                # Mensajes que quedaron sin respuesta al apagarse
+                conversation_scheduler.request_drain(
+                    buffer_key, _drain(container, waba_conf, entry.sender)
+                )
+
+        self.restore_ms = round((time.monotonic() - start) * 1000, 2)
+        self.restored = counts
+        age = time.time() - snapshot.created_at
+        logger.info(
+            f"Restored snapshot from {age:.0f}s ago in {self.restore_ms}ms: {counts}"
+        )
+        return counts
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "writes": self.writes,
+            "write_errors": self.write_errors,
+            "last_bytes": self.last_bytes,
+            "write_ms": self.write_ms.snapshot(),
+            "restore_ms": self.restore_ms,
+            "restored": self.restored,
+        }
+
+
+_project_config = config_manager.get_project_config()
+
+state_snapshotter = StateSnapshotter(
+    _project_config.SNAPSHOT_PATH or None,
+    interval=_project_config.SNAPSHOT_INTERVAL,
+)
@@ -0,0 +1,173 @@
+# core/services/statuses.py
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from core.config import config_manager
+from core.models.webhook import WebhookStatus
+from core.utils.metrics import Histogram
+from core.utils.supabase_client import async_supabase
+
+logger = logging.getLogger(__name__)
+
+
+def status_row(waba_id: str, status: WebhookStatus) -> Dict[str, Any]:
+    """Row of the message_statuses table for one status event"""
+    error = status.errors[0] if status.errors else {}
+    status_at = None
+    if status.timestamp:
+        try:
+            status_at = datetime.fromtimestamp(
+                int(status.timestamp), tz=timezone.utc
+            ).isoformat()
+        except ValueError:
+            pass
+
+    return {
+        "wamid": status.id,
+        "waba_id": waba_id,
+        "recipient_id": status.recipient_id,
+        "status": status.status,
+        "status_at": status_at,
+        "pricing_category": (status.pricing or {}).get("category"),
+        "error_code": str(error["code"]) if error.get("code") is not None else None,
+        "error_title": error.get("title"),
+    }
+
+
+class StatusTracker:
+    """
+    Fast path for delivery status webhooks. Statuses are counted per WABA and
+    buffered in memory, then written in bulk to `message_statuses` when the
+    batch fills up or on a timer. The outbound messages store their wamid as
+    `message_id`, so both tables correlate on it.
+    """
+
+    def __init__(
+        self,
+        supabase_client,
+        flush_interval: float = 2.0,
+        batch_size: int = 500,
+        max_pending: int = 50000,
+    ):
+        self.supabase = supabase_client
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._timer_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        # Métricas
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.flushed = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.dropped = 0
+        self.flush_ms = Histogram()
+
+    @property
+    def started(self) -> bool:
+        return self._timer_task is not None
+
+    def start(self) -> None:
+        if self.started:
+            return
+        self._flush_lock = asyncio.Lock()
+        self._timer_task = asyncio.create_task(self._timer())
+
+    async def stop(self) -> None:
+        """Stop the timer and flush whatever is still buffered"""
+        if self._timer_task:
+            self._timer_task.cancel()
+            await asyncio.gather(self._timer_task, return_exceptions=True)
+            self._timer_task = None
+        await self.flush()
+
+    def record(self, waba_id: str, status: WebhookStatus) -> None:
+        """Count and buffer a status. Never touches the DB on the caller's path"""
+        counters = self.counters.setdefault(waba_id, {})
+        counters[status.status] = counters.get(status.status, 0) + 1
+
+        self._pending.append(status_row(waba_id, status))
+        if len(self._pending) > self.max_pending:
+            # El DB no da abasto: se descartan los más viejos
+            overflow = len(self._pending) - self.max_pending
+            del self._pending[:overflow]
+            self.dropped += overflow
+
+        if len(self._pending) >= self.batch_size and self.started:
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self.flush())
+
+    async def _timer(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing statuses: {str(e)}", exc_info=True)
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            while self._pending:
+                rows = self._pending[: self.batch_size]
+                del self._pending[: len(rows)]
+
+                start = time.monotonic()
+                try:
+                    await self._write(rows)
+                except Exception as e:
+                    self.flush_errors += 1
+                    logger.error(f"Error writing {len(rows)} statuses: {str(e)}")
+                    # Se reintentan en el próximo flush
+                    self._pending[:0] = rows
+                    return
+
+                self.flushes += 1
+                self.flushed += len(rows)
+                self.flush_ms.observe((time.monotonic() - start) * 1000)
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> None:
+        if not self.supabase:
+            return
+        await self.supabase.table("message_statuses").upsert(
+            rows, on_conflict="wamid,status", ignore_duplicates=True
+        ).execute()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "by_waba": {
+                waba_id: {
+                    "delivered": counters.get("delivered", 0),
+                    "read": counters.get("read", 0),
+                    "failed": counters.get("failed", 0),
+                    "sent": counters.get("sent", 0),
+                }
+                for waba_id, counters in self.counters.items()
+            },
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "dropped": self.dropped,
+            "flush_ms": self.flush_ms.snapshot(),
+        }
+
+
+_project_config = config_manager.get_project_config()
+
+status_tracker = StatusTracker(
+    async_supabase,
+    flush_interval=_project_config.STATUS_FLUSH_INTERVAL,
+    batch_size=_project_config.STATUS_FLUSH_BATCH_SIZE,
+)
@@ -0,0 +1,37 @@
+# core/services/summarizer.py
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "Resumí la conversación entre un asistente y un usuario de WhatsApp para "
+    "que el asistente pueda continuarla. Conservá datos concretos: nombre, "
+    "intereses, cursos o productos mencionados, precios, medios de pago, "
+    "compromisos y preguntas pendientes. Respondé solo con el resumen, en "
+    "menos de 200 palabras."
+)
+
+
+async def summarize_messages(
+    waba_conf,
+    previous_summary: Optional[str],
+    messages: List[Dict[str, str]],
+) -> str:
+    """Fold `messages` into the rolling summary of the conversation"""
+    transcript = "\n".join(
+        f"{message['role']}: {message.get('content') or ''}" for message in messages
+    )
+    if previous_summary:
+        transcript = f"Resumen anterior:\n{previous_summary}\n\nContinuación:\n{transcript}"
+
+    response = await waba_conf.openai_client.chat.completions.create(
+        model=waba_conf.model,
+        temperature=0,
+        max_tokens=400,
+        messages=[
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": transcript},
+        ],
+    )
+    return (response.choices[0].message.content or "").strip()
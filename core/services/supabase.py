@@ -1,8 +1,10 @@
+import asyncio
 import json
 from datetime import datetime, timezone
+from functools import partial
 from typing import Dict, Any, List, Optional
 import httpx
-from core.utils.supabase_client import supabase
+from core.utils.supabase_client import async_supabase, supabase
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,17 +22,25 @@ async def upload_to_supabase_audio_bucket(
             response.raise_for_status()
             file_buffer = response.content
 
-        file_name = f"{datetime.now(datetime.timezone.utc).timestamp()}.ogg"
+        file_name = f"{datetime.now(timezone.utc).timestamp()}.ogg"
         file_path = f"audio/{file_name}"
 
-        result = supabase.storage.from_("audios_bucket").upload(
-            file_path, file_buffer, file_options={"content-type": "audio/ogg"}
+        # Storage va por el cliente síncrono: la subida se hace fuera del loop
+        bucket = supabase.storage.from_("audios_bucket")
+        result = await asyncio.get_running_loop().run_in_executor(
+            None,
+            partial(
+                bucket.upload,
+                file_path,
+                file_buffer,
+                file_options={"content-type": "audio/ogg"},
+            ),
         )
 
         if isinstance(result, Dict) and "error" in result:
             raise Exception(result["error"])
 
-        public_url = supabase.storage.from_("audios_bucket").get_public_url(file_path)
+        public_url = bucket.get_public_url(file_path)
 
         logger.info(f"Audio file uploaded to {public_url}")
         return public_url
@@ -42,28 +52,10 @@ async def upload_to_supabase_audio_bucket(
 
 async def delete_all_records():
     try:
-        logger.info("Deleting all records from messages table")
-        result = supabase.table("messages").delete().neq("id", 0).execute()
-        if result.get("error"):
-            logger.info(
-                f"Error deleting records from messages table: {result['error']}"
-            )
-        else:
-            logger.info("All records deleted from messages table")
-
-        logger.info("Deleting all records from threads table")
-        result = supabase.table("threads").delete().neq("id", 0).execute()
-        if result.get("error"):
-            logger.info(f"Error deleting records from threads table: {result['error']}")
-        else:
-            logger.info("All records deleted from threads table")
-
-        logger.info("Deleting all records from wabas table")
-        result = supabase.table("wabas").delete().neq("id", 0).execute()
-        if result.get("error"):
-            logger.info(f"Error deleting records from wabas table: {result['error']}")
-        else:
-            logger.info("All records deleted from wabas table")
+        for table in ("messages", "threads", "wabas"):
+            logger.info(f"Deleting all records from {table} table")
+            await async_supabase.table(table).delete().neq("id", 0).execute()
+            logger.info(f"All records deleted from {table} table")
 
     except Exception as error:
         logger.info(f"Unexpected error: {error}")
@@ -72,29 +64,26 @@ async def delete_all_records():
 async def upsert_waba(id: str, name: str, phone_number_id: str) -> Dict[str, Any]:
     try:
         result = (
-            supabase.table("wabas")
+            await async_supabase.table("wabas")
             .upsert(
                 {
                     "id": id,
                     "name": name,
                     "phone_number_id": phone_number_id,
-                    "updated_at": datetime.now(datetime.timezone.utc).isoformat(),
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
                 },
-                on_conflict=["id"],
+                on_conflict="id",
             )
             .execute()
         )
 
-        if result.get("error"):
-            raise Exception(f"Failed to upsert WABA: {result['error']}")
-
-        return result.get("data", [{}])[0]
+        return result.data[0] if result.data else {}
     except Exception as error:
         logger.info(f"Failed to upsert WABA: {error}")
         raise
 
 
-def upsert_thread(
+async def upsert_thread(
     waba_id: int,
     user_phone_number: str,
     openai_thread_id: str,
@@ -102,60 +91,54 @@ def upsert_thread(
 ) -> Dict[str, Any]:
     try:
         result = (
-            supabase.table("threads")
+            await async_supabase.table("threads")
             .upsert(
                 {
                     "waba_id": waba_id,
                     "user_phone_number": user_phone_number,
                     "openai_thread_id": openai_thread_id,
                     "local_thread_id": local_thread_id,
-                    "updated_at": datetime.now(datetime.timezone.utc).isoformat(),
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
                 },
-                on_conflict=["openai_thread_id"],
+                on_conflict="openai_thread_id",
             )
             .execute()
         )
 
-        if isinstance(result, dict) and result.get("error"):
-            raise Exception(result["error"])
-
-        return result.data[0] if hasattr(result, "data") and result.data else {}
+        return result.data[0] if result.data else {}
     except Exception as error:
         logger.error(f"Failed to upsert thread: {error}")
         raise
 
 
-def save_message_to_db(
+async def save_message_to_db(
     thread_id: str, message_content: str, message_direction: str, content_type: str
 ) -> str:
     try:
         result = (
-            supabase.table("messages")
+            await async_supabase.table("messages")
             .insert(
                 {
                     "thread_id": thread_id,
                     "message_content": message_content,
                     "message_direction": message_direction,
                     "content_type": content_type,
-                    "created_at": datetime.now(datetime.timezone.utc).isoformat(),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
                 }
             )
             .execute()
         )
 
-        if hasattr(result, "error") and result.error:
-            raise Exception(result.error)
-
         return result.data[0]["message_content"] if result.data else ""
     except Exception as error:
         logger.info(f"Failed to insert message: {error}")
         raise
 
 
-def find_thread_in_database(local_thread_key: str) -> Optional[Dict]:
+async def find_thread_in_database(local_thread_key: str) -> Optional[Dict]:
     try:
         response = (
-            supabase.table("threads")
+            await async_supabase.table("threads")
             .select("*")
             .eq("local_thread_id", local_thread_key)
             .order("created_at", desc=True)
@@ -175,47 +158,51 @@ def find_thread_in_database(local_thread_key: str) -> Optional[Dict]:
 
 
 async def get_wabas_list() -> List[Dict[str, Any]]:
-    result = supabase.table("wabas").select("id,name,phone_number_id").execute()
-
-    if result.get("error"):
-        logger.info(f"Error fetching WABAs: {result['error']}")
+    try:
+        result = (
+            await async_supabase.table("wabas")
+            .select("id,name,phone_number_id")
+            .execute()
+        )
+    except Exception as error:
+        logger.info(f"Error fetching WABAs: {error}")
         return []
 
-    return result.get("data", [])
+    return result.data or []
 
 
 async def get_threads_by_waba(waba_id: str) -> List[Dict[str, Any]]:
-    result = (
-        supabase.table("threads")
-        .select(
-            "waba_id,user_phone_number,created_at,updated_at,local_thread_id,openai_thread_id"
+    try:
+        result = (
+            await async_supabase.table("threads")
+            .select(
+                "waba_id,user_phone_number,created_at,updated_at,local_thread_id,openai_thread_id"
+            )
+            .eq("waba_id", waba_id)
+            .execute()
         )
-        .eq("waba_id", waba_id)
-        .execute()
-    )
-
-    if result.get("error"):
-        logger.info(f"Error fetching threads for WABA: {result['error']}")
+    except Exception as error:
+        logger.info(f"Error fetching threads for WABA: {error}")
         return []
 
-    return result.get("data", [])
+    return result.data or []
 
 
 async def get_messages_by_thread(thread_id: str) -> List[Dict[str, Any]]:
-    result = (
-        supabase.table("messages")
-        .select(
-            "id,thread_id,message_content,message_direction,content_type,created_at"
+    try:
+        result = (
+            await async_supabase.table("messages")
+            .select(
+                "id,thread_id,message_content,message_direction,content_type,created_at"
+            )
+            .eq("thread_id", thread_id)
+            .execute()
         )
-        .eq("thread_id", thread_id)
-        .execute()
-    )
-
-    if result.get("error"):
-        logger.info(f"Error fetching messages for thread: {result['error']}")
+    except Exception as error:
+        logger.info(f"Error fetching messages for thread: {error}")
         return []
 
-    return result.get("data", [])
+    return result.data or []
 
 
 async def save_log_to_db(message: Any, waba: Optional[str] = None) -> Optional[str]:
@@ -241,64 +228,66 @@ async def save_log_to_db(message: Any, waba: Optional[str] = None) -> Optional[s
     if len(message_string) > max_length:
         message_string = message_string[:max_length]
 
-    result = (
-        supabase.table("logs")
-        .insert(
-            {
-                "message": message_string,
-                "created_at": datetime.now(datetime.timezone.utc).isoformat(),
-                "waba": waba or "undefined",
-            }
+    try:
+        result = (
+            await async_supabase.table("logs")
+            .insert(
+                {
+                    "message": message_string,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "waba": waba or "undefined",
+                }
+            )
+            .execute()
         )
-        .execute()
-    )
-
-    if result.get("error"):
-        logger.info(f"Error logging message: {result['error']}")
+    except Exception as error:
+        logger.info(f"Error logging message: {error}")
         return None
 
-    return result.get("data", [{}])[0].get("message")
+    return result.data[0].get("message") if result.data else None
 
 
 async def get_logs() -> List[Dict[str, Any]]:
-    result = supabase.table("logs").select("*").order("created_at", desc=True).execute()
-
-    if result.get("error"):
-        logger.info(f"Error fetching logs: {result['error']}")
+    try:
+        result = (
+            await async_supabase.table("logs")
+            .select("*")
+            .order("created_at", desc=True)
+            .execute()
+        )
+    except Exception as error:
+        logger.info(f"Error fetching logs: {error}")
         return []
 
-    return result.get("data", [])
+    return result.data or []
 
 
 async def get_logs_by_waba(waba: str) -> List[Dict[str, Any]]:
-    result = (
-        supabase.table("logs")
-        .select("*")
-        .eq("waba", waba)
-        .order("created_at", desc=True)
-        .execute()
-    )
-
-    if result.get("error"):
-        logger.info(f"Error fetching logs: {result['error']}")
+    try:
+        result = (
+            await async_supabase.table("logs")
+            .select("*")
+            .eq("waba", waba)
+            .order("created_at", desc=True)
+            .execute()
+        )
+    except Exception as error:
+        logger.info(f"Error fetching logs: {error}")
         return []
 
-    return result.get("data", [])
+    return result.data or []
 
 
 async def get_relevant_files(company: str) -> Dict[str, Any]:
     try:
         result = (
-            supabase.table("jellinek_files")
+            await async_supabase.table("jellinek_files")
             .select("file_name,download_url,file_id")
             .ilike("file_name", f"%{company}%")
             .execute()
         )
 
-        if result.get("error"):
-            raise Exception(result["error"])
-
-        data = result.get("data", [])
+        data = result.data or []
 
         if not data:
             return {
@@ -1,5 +1,9 @@
 # core/services/waba.py
 import logging
+import uuid
+from typing import List
+
+from core.storage.state import state_backend
 
 logger = logging.getLogger(__name__)
 
@@ -15,3 +19,49 @@ async def get_waba_config(service_container, client_id, waba_id):
     except Exception as e:
         logger.error(f"Failed to load WABA config: {str(e)}")
         raise
+
+
+# Canal del state backend para recargar un config en todos los procesos
+WABA_RELOAD_CHANNEL = "waba_config_reload"
+# Identifica los avisos propios: este proceso ya recargó antes de publicar
+_PROCESS_ID = uuid.uuid4().hex
+
+
+async def reload_local_waba_config(waba_id: str) -> List[str]:
+    """
+    Reload the WABA config in every client container of this process that
+    has it loaded. Returns the client ids reloaded
+    """
+    from core.routers.webhook_processor import get_client_containers
+
+    reloaded = []
+    for client_id, container in get_client_containers().items():
+        cache = container.wabas_config_cache
+        if not cache.is_cached(client_id, waba_id):
+            continue
+        await cache.reload(client_id, waba_id)
+        reloaded.append(client_id)
+    return reloaded
+
+
+async def broadcast_waba_reload(waba_id: str) -> bool:
+    """Ask the other processes sharing the state backend to reload. False if none"""
+    if not state_backend.shared:
+        return False
+    await state_backend.publish(WABA_RELOAD_CHANNEL, f"{_PROCESS_ID}:{waba_id}")
+    return True
+
+
+async def _on_waba_reload(message: str) -> None:
+    origin, _, waba_id = message.partition(":")
+    if origin == _PROCESS_ID:
+        return
+    reloaded = await reload_local_waba_config(waba_id)
+    if reloaded:
+        logger.info(f"Reloaded config for WABA {waba_id} on broadcast: {reloaded}")
+
+
+async def subscribe_waba_reloads() -> None:
+    """Reload configs when another process publishes a reload"""
+    if state_backend.shared:
+        await state_backend.subscribe(WABA_RELOAD_CHANNEL, _on_waba_reload)
@@ -1,7 +1,7 @@
 # https://developers.facebook.com/docs/whatsapp/cloud-api/guides/send-message-templates/mpm-template-messages
 
 import httpx
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from core.utils.helpers import WABAConfig
 from core.services.waba import get_waba_config
 import json
@@ -47,6 +47,14 @@ logger = logging.getLogger(__name__)
 #         raise  # Re-raise the exception after logging
 
 
+def extract_wamid(response_body: str) -> Optional[str]:
+    """wamid of the outbound message from a Cloud API send response"""
+    try:
+        return json.loads(response_body)["messages"][0]["id"]
+    except (TypeError, ValueError, KeyError, IndexError):
+        return None
+
+
 async def send_text_response_to_wa(answer: str, to: str, waba_conf: WABAConfig):
     try:
         # Detailed logging
@@ -1,46 +1,207 @@
 # core/storage/cache.py
 import logging
 import asyncio
-from typing import Dict, List
+import inspect
+import sys
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
 from datetime import datetime, timezone
 from cachetools import TTLCache
 from core.models.enums import MessageRole
 from core.models.waba import WABAConfig
+from core.storage.state import StateBackend
+from core.utils.metrics import Histogram
+from core.utils.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens
 # from core.utils.config import WABAConfig
 
 logger = logging.getLogger(__name__)
 
+# Cada cuánto se revisa el backend compartido esperando mensajes de otros workers
+SHARED_POLL_INTERVAL = 1.0
+
+# Buckets de tokens de prompt por turno
+PROMPT_TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+SummarizerFn = Callable[[Optional[str], List[Dict[str, str]]], Awaitable[str]]
+
+# (key, [(role, content, tokens)], summary) de una conversación, para el snapshot
+SnapshotEntry = Tuple[str, List[Tuple[str, Any, int]], Optional[str]]
+
+
+class ContextMessage:
+    """
+    One message of a conversation history. Roles are interned and the content
+    is kept by reference (the user text is the same string held by the buffer
+    entry); the OpenAI dict is only built when the prompt is assembled.
+    """
+
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: Any, tokens: Optional[int] = None):
+        self.role = sys.intern(role)
+        self.content = content
+        if tokens is None:
+            tokens = count_tokens(str(content or "")) + MESSAGE_OVERHEAD_TOKENS
+        self.tokens = tokens
+
+    @classmethod
+    def from_dict(cls, message: Dict[str, Any]) -> "ContextMessage":
+        # Las entradas del backend compartido traen el conteo de tokens
+        return cls(message["role"], message.get("content"), message.get("tokens"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content}
+
+    def to_state(self) -> Dict[str, Any]:
+        """Entry for the shared backend: the token count travels with it"""
+        return {"role": self.role, "content": self.content, "tokens": self.tokens}
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ContextMessage):
+            return NotImplemented
+        return self.role == other.role and self.content == other.content
+
+    def __repr__(self) -> str:
+        return f"ContextMessage({self.role!r}, {self.content!r})"
+
+
+class _ContextState:
+    """History and instructions of one conversation"""
+
+    __slots__ = (
+        "prefix_instructions",
+        "messages",
+        "temp_context",
+        "summary",
+        "history_tokens",
+    )
+
+    def __init__(self):
+        self.prefix_instructions: List[Dict[str, str]] = []
+        self.messages: List[ContextMessage] = []
+        self.temp_context: List[Dict[str, str]] = []
+        self.summary: Optional[str] = None
+        self.history_tokens = 0
+
+    def set_messages(self, messages: List[ContextMessage]) -> None:
+        self.messages = messages
+        self.history_tokens = sum(message.tokens for message in messages)
+
+
+class _LockEntry:
+    """FIFO lock for one buffer key, reference-counted by holders and waiters"""
+
+    __slots__ = ("held", "waiters", "refs")
+
+    def __init__(self):
+        self.held = False
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.refs = 0
+
+
+class MessageBuffer:
+    """
+    Buffer of one conversation. Only unprocessed messages are kept, indexed by
+    message ID in arrival order, so marking them processed is O(1) and
+    processed entries are dropped immediately instead of lingering for the TTL.
+    """
+
+    __slots__ = ("metadata", "pending")
+
+    def __init__(self, metadata: Dict[str, Any]):
+        self.metadata = metadata
+        self.pending: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def add(self, message: Dict) -> str:
+        message_id = message.get("message", {}).get("id") or str(uuid.uuid4())
+        self.pending[message_id] = message
+        return message_id
+
+    def mark_processed(self, message_ids: List[str]) -> None:
+        for message_id in message_ids:
+            self.pending.pop(message_id, None)
+
+    def has_pending_outside(self, message_ids: List[str]) -> bool:
+        known = set(message_ids)
+        return any(message_id not in known for message_id in self.pending)
+
 
 class MessageBufferManager:
-    """Manages message buffering and thread locking for WhatsApp messages"""
+    """
+    Manages message buffering and thread locking for WhatsApp messages.
+
+    With a shared state backend, pending messages are mirrored there and the
+    conversation lock is also taken on the backend, so several worker
+    processes can serve the same conversation. The local buffer keeps the
+    metadata and the arrival events of this process.
+    """
 
-    def __init__(self, buffer_ttl: int = 3600, lock_ttl: int = 300):
+    def __init__(self, buffer_ttl: int = 3600, state_backend: StateBackend = None):
         self.buffer = TTLCache(maxsize=10000, ttl=buffer_ttl)
-        self.thread_locks = TTLCache(maxsize=1000, ttl=lock_ttl)
+        self.state = state_backend
+        self.shared = bool(state_backend and state_backend.shared)
+        # Tabla de locks: una entrada por clave mientras alguien la tenga o espere,
+        # nunca se expulsa por tamaño ni TTL
+        self.thread_locks: Dict[str, _LockEntry] = {}
+        self.lock_wait_ms = Histogram()
+        self.lock_timeouts = 0
+
+        # Eventos de llegada por clave, para despertar a quien espera mensajes nuevos
+        self._arrivals: Dict[str, asyncio.Event] = {}
+
+        # Métricas de coalescencia: mensajes procesados vs turnos de LLM
+        self.turns = 0
+        self.coalesced_messages = 0
+        self.turn_ms = Histogram()
+
+        # Métricas de turnos cancelados por mensajes nuevos
+        self.cancelled_turns = 0
+        self.cancelled_tokens_saved = 0
+        self.cancelled_seconds_saved = 0.0
 
     def _get_key(self, waba_conf: WABAConfig, sender: str) -> str:
         """Genera la clave para el buffer"""
         return f"{sender}_{waba_conf.waba_id}"
 
-    def get_active_buffers(self) -> Dict[str, Dict]:
+    def get_active_buffers(self) -> Dict[str, MessageBuffer]:
         """Obtiene los buffers activos antes de que se limpie la cache"""
         return {key: data for key, data in self.buffer.items()}
 
+    def get_buffer(self, key: str) -> MessageBuffer:
+        """Get the buffer for a key, or None if it does not exist"""
+        return self.buffer.get(key)
+
     def get_or_create_buffer(
         self, waba_conf: WABAConfig, sender: str, conversation_id: str
     ) -> str:
         """Get or create a buffer and return its key"""
         key = self._get_key(waba_conf, sender)
         if key not in self.buffer:
-            self.buffer[key] = {
-                "metadata": {
+            self.buffer[key] = MessageBuffer(
+                {
                     "sender": sender,
                     "waba_id": waba_conf.waba_id,
                     "waba_conf": waba_conf,
                     "conversation_id": conversation_id,
-                },
-                "messages": [],
-            }
+                    "last_message_at": time.monotonic(),
+                }
+            )
+        return key
+
+    def restore_buffer(
+        self,
+        waba_conf: WABAConfig,
+        sender: str,
+        conversation_id: str,
+        messages: List[Dict],
+    ) -> str:
+        """Recreate a buffer with its unprocessed messages (warm restart)"""
+        key = self.get_or_create_buffer(waba_conf, sender, conversation_id)
+        buffer = self.buffer[key]
+        for message in messages:
+            buffer.add(message)
         return key
 
     async def add_message(self, key: str, message_data: Dict) -> None:
@@ -49,52 +210,190 @@ class MessageBufferManager:
             logger.warning(f"Buffer not found for key: {key}")
             return
 
-        self.buffer[key]["messages"].append(
-            {
-                **message_data,
-                "processed": False,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
+        buffer = self.buffer[key]
+        message = {
+            **message_data,
+            "processed": False,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        message_id = buffer.add(message)
+        buffer.metadata["last_message_at"] = time.monotonic()
+
+        if self.shared:
+            await self.state.push_pending(key, message_id, message)
+
+        arrival = self._arrivals.pop(key, None)
+        if arrival:
+            arrival.set()
+
+    async def wait_for_new_message(self, key: str, known_ids: List[str]) -> None:
+        """Return as soon as the buffer holds an unprocessed message not in known_ids"""
+        while not await self.has_new_pending_messages(key, known_ids):
+            arrival = self._arrivals.get(key)
+            if arrival is None:
+                arrival = self._arrivals[key] = asyncio.Event()
+            if not self.shared:
+                await arrival.wait()
+                continue
+            # Los mensajes recibidos por otros workers no disparan el evento local
+            try:
+                await asyncio.wait_for(arrival.wait(), timeout=SHARED_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait_for_quiet_period(
+        self, key: str, quiet_period: float, max_wait: float
+    ) -> None:
+        """
+        Wait until no message has arrived for `quiet_period` seconds, or until
+        `max_wait` seconds have passed, so a burst is handled as a single turn.
+        """
+        if quiet_period <= 0:
+            return
+
+        deadline = time.monotonic() + max_wait
+        while key in self.buffer:
+            now = time.monotonic()
+            last_message_at = self.buffer[key].metadata.get("last_message_at", 0)
+            remaining = min(last_message_at + quiet_period, deadline) - now
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    def record_turn(self, message_count: int, duration_ms: float = None) -> None:
+        """Record an LLM turn that answered `message_count` buffered messages"""
+        self.turns += 1
+        self.coalesced_messages += message_count
+        if duration_ms is not None:
+            self.turn_ms.observe(duration_ms)
+
+    def record_cancelled_turn(self, elapsed_seconds: float, tokens_saved: int) -> None:
+        """
+        Record a turn cancelled because a newer message arrived. The time saved
+        is estimated against the average duration of completed turns.
+        """
+        average_seconds = (
+            self.turn_ms.total / self.turn_ms.count / 1000 if self.turn_ms.count else 0
         )
+        self.cancelled_turns += 1
+        self.cancelled_tokens_saved += tokens_saved
+        self.cancelled_seconds_saved += max(0.0, average_seconds - elapsed_seconds)
+
+    def get_coalescing_stats(self) -> Dict:
+        return {
+            "turns": self.turns,
+            "messages": self.coalesced_messages,
+            "llm_calls_saved": self.coalesced_messages - self.turns,
+            "turn_ms": self.turn_ms.snapshot(),
+            "cancelled_turns": self.cancelled_turns,
+            "cancelled_tokens_saved": self.cancelled_tokens_saved,
+            "cancelled_seconds_saved": round(self.cancelled_seconds_saved, 3),
+        }
 
     def mark_messages_processed(self, key: str, message_ids: List[str]) -> None:
-        if key in self.buffer:
-            for message in self.buffer[key]["messages"]:
-                if message.get("message", {}).get("id") in message_ids:
-                    message["processed"] = True
+        buffer = self.buffer.get(key)
+        if buffer is not None:
+            buffer.mark_processed(message_ids)
+
+    async def sync_pending(self, key: str) -> None:
+        """
+        Replace the local pending messages with the ones in the shared backend,
+        picking up messages received by other workers and dropping those they
+        already answered. Must be called holding the lock.
+        """
+        buffer = self.buffer.get(key)
+        if not self.shared or buffer is None:
+            return
+
+        buffer.pending.clear()
+        for message in await self.state.get_pending(key):
+            buffer.add(message)
+
+    async def ack_messages(self, key: str, message_ids: List[str]) -> None:
+        """Mark messages as processed locally and in the shared backend"""
+        self.mark_messages_processed(key, message_ids)
+        if self.shared:
+            await self.state.ack_pending(key, message_ids)
 
     def get_unprocessed_messages(self, key: str) -> List[Dict]:
         """Get unprocessed messages from buffer"""
-        if key not in self.buffer:
+        buffer = self.buffer.get(key)
+        if buffer is None:
             return []
-        return [
-            msg
-            for msg in self.buffer[key]["messages"]
-            if not msg.get("processed", False)
-        ]
+        return list(buffer.pending.values())
 
     def is_locked(self, buffer_key: str) -> bool:
         """Check if a thread is currently locked"""
-        return buffer_key in self.thread_locks
+        entry = self.thread_locks.get(buffer_key)
+        return bool(entry and entry.held)
 
-    def acquire_lock(self, buffer_key: str) -> bool:
+    async def acquire_lock(self, buffer_key: str, max_wait: float = 30) -> None:
         """
-        Try to acquire a lock for a buffer key
+        Acquire the lock for a buffer key, waiting in FIFO order
 
-        Returns:
-            bool: True if lock was acquired, False if already locked
+        Raises:
+            TimeoutError: if the lock could not be acquired within max_wait seconds
         """
-        if self.is_locked(buffer_key):
-            return False
-        self.thread_locks[buffer_key] = True
-        # logger.info(f"Lock acquired for {buffer_key}")
-        return True
+        entry = self.thread_locks.get(buffer_key)
+        if entry is None:
+            entry = self.thread_locks[buffer_key] = _LockEntry()
+        entry.refs += 1
+
+        if not entry.held and not entry.waiters:
+            entry.held = True
+            self.lock_wait_ms.observe(0)
+            return
+
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        entry.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # El lock nos fue cedido justo al vencer el timeout: lo devolvemos
+                self.release_lock(buffer_key)
+            else:
+                waiter.cancel()
+                entry.waiters.remove(waiter)
+                self._unref(buffer_key, entry)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.lock_timeouts += 1
+            raise TimeoutError(
+                f"Could not acquire lock for {buffer_key} after {max_wait} seconds"
+            )
+
+        self.lock_wait_ms.observe((time.monotonic() - start) * 1000)
 
     def release_lock(self, buffer_key: str) -> None:
-        """Release a lock for a buffer key"""
-        if buffer_key in self.thread_locks:
+        """Release a lock for a buffer key, handing it to the oldest waiter"""
+        entry = self.thread_locks.get(buffer_key)
+        if entry is None or not entry.held:
+            return
+
+        while entry.waiters:
+            waiter = entry.waiters.popleft()
+            if not waiter.done():
+                # Se cede el lock directamente: sigue tomado por el nuevo dueño
+                waiter.set_result(True)
+                break
+        else:
+            entry.held = False
+
+        self._unref(buffer_key, entry)
+
+    def _unref(self, buffer_key: str, entry: _LockEntry) -> None:
+        entry.refs -= 1
+        if entry.refs <= 0 and self.thread_locks.get(buffer_key) is entry:
             del self.thread_locks[buffer_key]
-            # logger.info(f"Thread unlocked for {buffer_key}")
+
+    def get_lock_stats(self) -> Dict:
+        return {
+            "active_locks": len(self.thread_locks),
+            "timeouts": self.lock_timeouts,
+            "wait_ms": self.lock_wait_ms.snapshot(),
+        }
 
     class Lock:
         def __init__(self, manager, buffer_key: str, max_wait: int = 30):
@@ -102,21 +401,36 @@ class MessageBufferManager:
             self.buffer_key = buffer_key
             self.max_wait = max_wait
 
-        async def __aenter__(self):
-            from datetime import datetime, timezone
+            self.token: Optional[str] = None
 
-            start_time = datetime.now(timezone.utc)
-            while self.manager.is_locked(self.buffer_key):
-                if (datetime.now(timezone.utc) - start_time).seconds > self.max_wait:
+        async def __aenter__(self):
+            await self.manager.acquire_lock(self.buffer_key, self.max_wait)
+            if self.manager.shared:
+                # Primero el lock local (FIFO entre tareas de este proceso),
+                # después el del backend, compartido entre workers
+                try:
+                    self.token = await self.manager.state.acquire_lock(
+                        self.buffer_key, self.max_wait
+                    )
+                except BaseException:
+                    self.manager.release_lock(self.buffer_key)
+                    raise
+                if self.token is None:
+                    self.manager.release_lock(self.buffer_key)
+                    self.manager.lock_timeouts += 1
                     raise TimeoutError(
-                        f"Could not acquire lock for {self.buffer_key} after {self.max_wait} seconds"
+                        f"Could not acquire shared lock for {self.buffer_key} "
+                        f"after {self.max_wait} seconds"
                     )
-                await asyncio.sleep(1)
-            self.manager.acquire_lock(self.buffer_key)
             return self
 
         async def __aexit__(self, exc_type, exc_val, exc_tb):
-            self.manager.release_lock(self.buffer_key)
+            try:
+                if self.token is not None:
+                    await self.manager.state.release_lock(self.buffer_key, self.token)
+                    self.token = None
+            finally:
+                self.manager.release_lock(self.buffer_key)
 
     def with_lock(self, buffer_key: str, max_wait: int = 30):
         """
@@ -131,9 +445,9 @@ class MessageBufferManager:
     def clear_conversation(self, buffer_key: str) -> bool:
         try:
             if buffer_key in self.buffer:
+                # El lock no se toca: se libera solo cuando no quedan referencias
                 del self.buffer[buffer_key]
-                if buffer_key in self.thread_locks:
-                    del self.thread_locks[buffer_key]
+                self._arrivals.pop(buffer_key, None)
                 logger.info(f"Cleared conversation for {buffer_key}")
                 return True
             return False
@@ -144,7 +458,6 @@ class MessageBufferManager:
     def clear_all_conversations(self) -> None:
         try:
             self.buffer.clear()
-            self.thread_locks.clear()
             logger.info("Cleared all conversations from buffer")
         except Exception as e:
             logger.error(f"Error clearing all conversations: {str(e)}")
@@ -155,35 +468,68 @@ class MessageBufferManager:
     async def has_new_pending_messages(
         self, buffer_key: str, processing_message_ids: List[str]
     ) -> bool:
-        if buffer_key not in self.buffer:
+        buffer = self.buffer.get(buffer_key)
+        if buffer is None:
             return False
-
-        unprocessed = self.get_unprocessed_messages(buffer_key)
-        # Filtramos los mensajes que ya estamos procesando
-        new_pending = [
-            msg
-            for msg in unprocessed
-            if msg["message"]["id"] not in processing_message_ids
-        ]
-        return len(new_pending) > 0
+        # Mensajes pendientes que no son los que ya estamos procesando
+        if buffer.has_pending_outside(processing_message_ids):
+            return True
+        if self.shared:
+            known = set(processing_message_ids)
+            return any(
+                message.get("message", {}).get("id") not in known
+                for message in await self.state.get_pending(buffer_key)
+            )
+        return False
 
 
 class ConversationContext:
-    def __init__(self, context_ttl: int = 3600):
-        self.contexts = TTLCache(maxsize=10000, ttl=context_ttl)
+    """
+    Per-conversation context. With a shared state backend the message history
+    is also kept there: `sync` pushes the messages added by this process and
+    `load` refreshes the local history with those added by other workers.
+
+    The history is token-counted as it grows; once it exceeds the client's
+    budget, `schedule_summary` folds the oldest turns into a rolling summary
+    in the background.
+    """
+
+    def __init__(
+        self,
+        context_ttl: int = 3600,
+        state_backend: StateBackend = None,
+        max_contexts: int = 10000,
+    ):
+        self.contexts = TTLCache(maxsize=max_contexts, ttl=context_ttl)
+        self.state = state_backend
+        self.shared = bool(state_backend and state_backend.shared)
+        # Mensajes añadidos localmente que aún no se subieron al backend
+        self._unsynced: Dict[str, List[ContextMessage]] = {}
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+
+        # Métricas de hidratación desde la base
+        self.hydration_hits = 0
+        self.hydration_misses = 0
+        self.hydrated_messages = 0
+        self.hydrate_ms = Histogram()
+
+        # Métricas de tokens
+        self.prompt_tokens = Histogram(PROMPT_TOKEN_BUCKETS)
+        self.prompt_tokens_total = 0
+        self.cached_tokens_total = 0
+        self.cached_completions = 0
+        self.summaries = 0
+        self.summarized_messages = 0
+        self.summary_errors = 0
 
     def _get_key(self, waba_id: str, sender: str) -> str:
         return f"{sender}_{waba_id}"
 
-    def _get_or_create_context(self, waba_id: str, sender: str) -> Dict:
+    def _get_or_create_context(self, waba_id: str, sender: str) -> _ContextState:
         """Get or create context structure for a conversation"""
         key = self._get_key(waba_id, sender)
         if key not in self.contexts:
-            self.contexts[key] = {
-                "prefix_instructions": [],
-                "messages": [],
-                "temp_context": [],
-            }
+            self.contexts[key] = _ContextState()
         return self.contexts[key]
 
     def set_prefix_instructions(
@@ -191,7 +537,7 @@ class ConversationContext:
     ) -> None:
         """Set instructions that should appear at the start of the context"""
         context = self._get_or_create_context(waba_id, sender)
-        context["prefix_instructions"] = instructions
+        context.prefix_instructions = instructions
 
     def add_message(
         self, waba_id: str, sender: str, role: MessageRole, content: str
@@ -199,7 +545,216 @@ class ConversationContext:
         """Add a message to the conversation history"""
         context = self._get_or_create_context(waba_id, sender)
         role_str = role.value if hasattr(role, "value") else str(role)
-        context["messages"].append({"role": role_str, "content": content})
+        message = ContextMessage(role_str, content)
+        context.messages.append(message)
+        context.history_tokens += message.tokens
+        if self.shared:
+            self._unsynced.setdefault(self._get_key(waba_id, sender), []).append(
+                message
+            )
+
+    async def sync(self, waba_id: str, sender: str) -> None:
+        """Push the messages added by this process to the shared backend"""
+        if not self.shared:
+            return
+        messages = self._unsynced.pop(self._get_key(waba_id, sender), None)
+        if messages:
+            await self.state.append_context(
+                self._get_key(waba_id, sender), [m.to_state() for m in messages]
+            )
+
+    async def load(self, waba_id: str, sender: str) -> None:
+        """Refresh the local history from the shared backend"""
+        if not self.shared:
+            return
+        await self.sync(waba_id, sender)
+        key = self._get_key(waba_id, sender)
+        context = self._get_or_create_context(waba_id, sender)
+        context.set_messages(
+            [ContextMessage.from_dict(m) for m in await self.state.get_context(key)]
+        )
+        context.summary = await self.state.get_summary(key)
+
+    async def hydrate(
+        self,
+        waba_id: str,
+        sender: str,
+        loader: Callable[[], Any],
+    ) -> bool:
+        """
+        Read-through: make sure the history of a conversation is in memory.
+        On a miss (TTL expired, restart) it is rebuilt from `loader()`, which
+        returns the last messages ({role, content}) oldest first, sync or async.
+
+        Returns True on a cache hit.
+        """
+        key = self._get_key(waba_id, sender)
+        if key in self.contexts or (self.shared and await self.state.has_context(key)):
+            self.hydration_hits += 1
+            return True
+
+        start = time.monotonic()
+        messages = loader()
+        if inspect.isawaitable(messages):
+            messages = await messages
+        self.hydrate_ms.observe((time.monotonic() - start) * 1000)
+        self.hydration_misses += 1
+
+        if key not in self.contexts:
+            self.prime(waba_id, sender, messages or [])
+        return False
+
+    def prime(self, waba_id: str, sender: str, messages: List[Dict[str, str]]) -> None:
+        """Seed the history of a conversation that is not in memory"""
+        key = self._get_key(waba_id, sender)
+        if key in self.contexts:
+            return
+        context = self._get_or_create_context(waba_id, sender)
+        context.set_messages([ContextMessage.from_dict(m) for m in messages])
+        self.hydrated_messages += len(messages)
+        if self.shared and messages:
+            self._unsynced.setdefault(key, []).extend(context.messages)
+
+    def schedule_summary(
+        self,
+        waba_id: str,
+        sender: str,
+        token_budget: int,
+        summarizer: SummarizerFn,
+        keep_recent: int = 6,
+    ) -> bool:
+        """
+        If the history exceeds `token_budget`, fold its oldest messages into
+        the rolling summary in a background task, down to half the budget and
+        keeping at least `keep_recent` messages. Returns True if scheduled.
+        """
+        key = self._get_key(waba_id, sender)
+        context = self.contexts.get(key)
+        if (
+            context is None
+            or token_budget <= 0
+            or context.history_tokens <= token_budget
+            or key in self._summary_tasks
+        ):
+            return False
+
+        messages = context.messages
+        remaining = context.history_tokens
+        count = 0
+        while count < len(messages) - keep_recent and remaining > token_budget // 2:
+            remaining -= messages[count].tokens
+            count += 1
+        if count == 0:
+            return False
+
+        folded = list(messages[:count])
+        self._summary_tasks[key] = asyncio.create_task(
+            self._fold(key, context.summary, folded, summarizer)
+        )
+        return True
+
+    async def _fold(
+        self,
+        key: str,
+        previous_summary: Optional[str],
+        folded: List[ContextMessage],
+        summarizer: SummarizerFn,
+    ) -> None:
+        try:
+            folded_dicts = [message.to_dict() for message in folded]
+            summary = await summarizer(previous_summary, folded_dicts)
+            if not summary:
+                return
+
+            if self.shared:
+                # Solo si otro worker no resumió ya esos mismos mensajes
+                if not await self.state.fold_context(
+                    key, summary, [message.to_state() for message in folded]
+                ):
+                    return
+
+            context = self.contexts.get(key)
+            if context is None or context.messages[: len(folded)] != folded:
+                # Se reseteó o recargó mientras se resumía
+                return
+
+            context.set_messages(context.messages[len(folded) :])
+            context.summary = summary
+            self.summaries += 1
+            self.summarized_messages += len(folded)
+            logger.info(f"Folded {len(folded)} messages of {key} into the summary")
+
+        except Exception as e:
+            self.summary_errors += 1
+            logger.error(f"Error summarizing context for {key}: {str(e)}")
+        finally:
+            self._summary_tasks.pop(key, None)
+
+    def export_contexts(self) -> List[SnapshotEntry]:
+        """History and summary of every cached conversation"""
+        return [
+            (
+                key,
+                [
+                    (message.role, message.content, message.tokens)
+                    for message in context.messages
+                ],
+                context.summary,
+            )
+            for key, context in list(self.contexts.items())
+            if context.messages or context.summary
+        ]
+
+    def restore_context(
+        self, key: str, messages: List[Tuple[str, Any, int]], summary: Optional[str]
+    ) -> bool:
+        """Seed a conversation from a snapshot, unless it is already in memory"""
+        if key in self.contexts:
+            return False
+        context = _ContextState()
+        context.set_messages(
+            [ContextMessage(role, content, tokens) for role, content, tokens in messages]
+        )
+        context.summary = summary
+        self.contexts[key] = context
+        return True
+
+    def record_prompt_tokens(self, tokens: int, cached_tokens: int = 0) -> None:
+        """Record the prompt tokens of one completion and how many hit the cache"""
+        self.prompt_tokens.observe(tokens)
+        self.prompt_tokens_total += tokens
+        self.cached_tokens_total += cached_tokens
+        if cached_tokens:
+            self.cached_completions += 1
+
+    def get_hydration_stats(self) -> Dict:
+        lookups = self.hydration_hits + self.hydration_misses
+        return {
+            "hits": self.hydration_hits,
+            "misses": self.hydration_misses,
+            "hit_rate": round(self.hydration_hits / lookups, 4) if lookups else None,
+            "hydrated_messages": self.hydrated_messages,
+            "load_ms": self.hydrate_ms.snapshot(),
+            "cached_contexts": len(self.contexts),
+        }
+
+    def get_token_stats(self) -> Dict:
+        return {
+            "prompt_tokens": self.prompt_tokens.snapshot(),
+            "prompt_cache": {
+                "cached_tokens": self.cached_tokens_total,
+                "hit_rate": (
+                    round(self.cached_tokens_total / self.prompt_tokens_total, 4)
+                    if self.prompt_tokens_total
+                    else None
+                ),
+                "completions_with_hits": self.cached_completions,
+            },
+            "summaries": self.summaries,
+            "summarized_messages": self.summarized_messages,
+            "summary_errors": self.summary_errors,
+            "summaries_running": len(self._summary_tasks),
+        }
 
     def add_temp_context(
         self,
@@ -211,34 +766,49 @@ class ConversationContext:
         """Add a temporary context item"""
         context = self._get_or_create_context(waba_id, sender)
         role_str = role.value if hasattr(role, "value") else str(role)
-        context["temp_context"].append({"role": role_str, "content": content})
+        context.temp_context.append({"role": sys.intern(role_str), "content": content})
 
     def get_messages(self, waba_id: str, sender: str) -> List[Dict[str, str]]:
-        """Get conversation history messages only"""
+        """Get conversation history messages only, as OpenAI-format dicts"""
         context = self._get_or_create_context(waba_id, sender)
-        return context["messages"]
+        return [message.to_dict() for message in context.messages]
 
     def get_full_context(self, waba_id: str, sender: str) -> List[Dict[str, str]]:
         """Get complete context including all instructions and messages in proper order"""
         context = self._get_or_create_context(waba_id, sender)
+        summary = (
+            [
+                {
+                    "role": MessageRole.SYSTEM.value,
+                    "content": f"Resumen de la conversación previa:\n{context.summary}",
+                }
+            ]
+            if context.summary
+            else []
+        )
+        # De lo más estable a lo más volátil, para que el prefijo coincida con
+        # el del turno anterior (caché de prompts): instrucciones, resumen,
+        # historial y al final el contexto temporal del turno
         return (
-            context["prefix_instructions"]
-            + context["temp_context"]
-            + context["messages"]
+            context.prefix_instructions
+            + summary
+            + [message.to_dict() for message in context.messages]
+            + context.temp_context
         )
 
     def clear_temp_context(self, waba_id: str, sender: str) -> None:
         """Clear temporary context items only"""
         context = self._get_or_create_context(waba_id, sender)
-        context["temp_context"].clear()
+        context.temp_context.clear()
 
     def clear_prefix_instructions(self, waba_id: str, sender: str) -> None:
         """Clear prefix instructions only"""
         context = self._get_or_create_context(waba_id, sender)
-        context["prefix_instructions"].clear()
+        context.prefix_instructions.clear()
 
     def reset_conversation(self, waba_id: str, sender: str) -> None:
         """Clear everything - complete reset"""
         key = self._get_key(waba_id, sender)
+        self._unsynced.pop(key, None)
         if key in self.contexts:
             del self.contexts[key]
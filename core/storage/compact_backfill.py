@@ -0,0 +1,60 @@
+# core/storage/compact_backfill.py
+"""
+Backfill of MESSAGE_COMPACT_STORAGE for existing rows: moves the raw
+payloads out of messages.metadata into message_payloads and fills the
+typed columns, one batch per call of the compact_messages_batch RPC.
+
+    python -m core.storage.compact_backfill [--batch-size 1000] [--pause 0.1]
+
+Safe to interrupt and re-run: each batch commits on its own and only rows
+still carrying `original_message` are picked, through a partial index
+that compacted rows leave.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from core.utils.supabase_client import async_supabase
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill(batch_size: int = 1000, pause: float = 0.1) -> int:
+    """Compact batches until none is left. Returns the rows compacted"""
+    total = 0
+    start = time.monotonic()
+    while True:
+        result = await async_supabase.rpc(
+            "compact_messages_batch", {"p_batch_size": batch_size}
+        ).execute()
+        compacted = result.data or 0
+        if not compacted:
+            break
+        total += compacted
+        logger.info(
+            f"Compacted {total} messages ({total / (time.monotonic() - start):.0f}/s)"
+        )
+        # Respiro entre lotes para no competir con el tráfico en vivo
+        if pause:
+            await asyncio.sleep(pause)
+
+    logger.info(f"Backfill done: {total} messages in {time.monotonic() - start:.1f}s")
+    return total
+
+
+async def _main(batch_size: int, pause: float) -> None:
+    try:
+        await backfill(batch_size, pause)
+    finally:
+        await async_supabase.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    asyncio.run(_main(args.batch_size, args.pause))
@@ -0,0 +1,105 @@
+# core/storage/conversations.py
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+
+from core.config import config_manager
+from core.storage.state import state_backend
+
+logger = logging.getLogger(__name__)
+
+# Una conversación sin actividad durante este tiempo se archiva
+CONVERSATION_EXPIRY_HOURS = 24
+
+
+class ConversationIdCache:
+    """
+    Process-local map (waba_id, phone) -> (conversation_id, last activity),
+    so the active conversation of a chat is resolved without a DB read.
+    The 24-hour archive rule is applied against the cached timestamp:
+    only a miss or a rollover goes to the DB.
+
+    The entries are only valid while this process is the one creating and
+    archiving the conversations of its senders (single worker or dispatcher
+    affinity), so the singleton is disabled with a shared state backend.
+    Admin actions that change a conversation must invalidate it.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 50000,
+        hours: int = CONVERSATION_EXPIRY_HOURS,
+        timer: Callable[[], float] = time.time,
+    ):
+        self.expiry_seconds = hours * 3600
+        self._timer = timer
+        # La entrada sobrevive un plazo más allá del vencimiento para detectar
+        # el rollover sin leer la base; después el TTL solo libera memoria
+        self._entries: TTLCache = TTLCache(
+            maxsize=maxsize, ttl=2 * self.expiry_seconds, timer=timer
+        )
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.rollovers = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._entries.maxsize > 0
+
+    def get(self, waba_id: str, phone_number: str) -> Tuple[Optional[str], bool]:
+        """
+        Cached conversation id and whether it expired. (None, False) on a
+        miss; (id, True) means the conversation must be archived.
+        """
+        entry = self._entries.get((waba_id, phone_number))
+        if entry is None:
+            self.misses += 1
+            return None, False
+
+        conversation_id, last_activity = entry
+        if self._timer() - last_activity > self.expiry_seconds:
+            self.rollovers += 1
+            return conversation_id, True
+
+        self.hits += 1
+        return conversation_id, False
+
+    def set(self, waba_id: str, phone_number: str, conversation_id: str) -> None:
+        """Record the active conversation, with activity now"""
+        self._entries[(waba_id, phone_number)] = (conversation_id, self._timer())
+
+    def invalidate(self, waba_id: str, phone_number: str) -> None:
+        if self._entries.pop((waba_id, phone_number), None):
+            self.invalidations += 1
+
+    def invalidate_conversation(self, conversation_id: str) -> None:
+        """Drop the entry pointing to `conversation_id` (admin path, O(n))"""
+        for key, (cached_id, _) in list(self._entries.items()):
+            if cached_id == conversation_id:
+                self._entries.pop(key, None)
+                self.invalidations += 1
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.rollovers
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rollovers": self.rollovers,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Con un backend compartido otro worker puede archivar o crear la
+# conversación: la caché en proceso quedaría desactualizada
+conversation_ids = ConversationIdCache(
+    maxsize=0
+    if state_backend.shared
+    else config_manager.get_project_config().CONVERSATION_CACHE_SIZE
+)
@@ -1,6 +1,8 @@
+import base64
 import datetime
+import json
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional, Sequence, Tuple
 import uuid
 
 import datetime
@@ -11,21 +13,200 @@ from core.models.waba import WABAConfig
 logger = logging.getLogger(__name__)
 
 
-class DBStorage:
-    def __init__(self, supabase_client):
+# Tipos de mensaje guardados que no forman parte del contexto del modelo
+_NON_CONTEXT_TYPES = ("system", "function_call")
+
+
+def to_context_messages(rows) -> List[Dict]:
+    """Context entries ({role, content}) from projected message rows"""
+    return [
+        {"role": row["role"], "content": row.get("content") or ""}
+        for row in rows
+        if row.get("type") not in _NON_CONTEXT_TYPES
+    ]
+
+
+# Tipos de mensaje de Meta con un objeto de media (id, mime_type)
+_MEDIA_TYPES = ("image", "audio", "video", "document", "sticker")
+
+
+def _message_row(
+    conversation_id: str,
+    message_data: Dict,
+    metadata: Dict = None,
+    compact: bool = False,
+) -> Dict:
+    """
+    Row of the messages table for a buffered/outbound message. `compact`
+    leaves the raw Meta payload out of metadata and fills the typed
+    columns instead (see payload_row for the archive)
+    """
+    row = {
+        "conversation_id": conversation_id,
+        "message_id": message_data.get("message", {}).get("id"),
+        "role": "user" if not message_data.get("is_response") else "assistant",
+        "content": message_data.get("message", {}).get("text", {}).get("body", ""),
+        "metadata": {
+            "type": message_data.get("type"),
+            "original_message": message_data.get("original_message"),
+        },
+    }
+    if metadata:
+        row["metadata"].update(metadata)
+
+    if compact:
+        original = row["metadata"].pop("original_message", None) or {}
+        message_type = original.get("type") or message_data.get("type")
+        media = original.get(message_type) if message_type in _MEDIA_TYPES else None
+        row["message_type"] = message_type
+        row["media_id"] = media.get("id") if media else None
+        row["media_mime_type"] = media.get("mime_type") if media else None
+    return row
+
+
+def payload_row(conversation_id: str, message_data: Dict) -> Optional[Dict]:
+    """Row of the message_payloads archive, or None without a raw payload"""
+    original = message_data.get("original_message")
+    if not original or not original.get("id"):
+        return None
+    return {
+        "wamid": original["id"],
+        "conversation_id": conversation_id,
+        "payload": original,
+    }
+
+
+# Columnas que la API de historial puede devolver: nombre -> proyección.
+# `original_message` (el payload crudo) solo viaja dentro de `metadata`
+HISTORY_MESSAGE_COLUMNS = {
+    "id": "id",
+    "message_id": "message_id",
+    # Columnas de MESSAGE_COMPACT_STORAGE (compact_messages.sql)
+    "message_type": "message_type",
+    "media_id": "media_id",
+    "media_mime_type": "media_mime_type",
+    "role": "role",
+    "content": "content",
+    "created_at": "created_at",
+    "type": "type:metadata->>type",
+    "categories": "categories:metadata->categories",
+    "metadata": "metadata",
+}
+HISTORY_DEFAULT_COLUMNS = ("id", "role", "content", "created_at", "type")
+
+HISTORY_CONVERSATION_COLUMNS = (
+    "id, waba_id, phone_number, status, created_at, last_activity_at"
+)
+
+
+def encode_cursor(sort_value: str, row_id) -> str:
+    """Opaque keyset cursor for (sort_value, id)"""
+    raw = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor. Raises ValueError on a malformed cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return str(sort_value), str(row_id)
+
+
+def _keyset_filter(column: str, cursor: str, descending: bool) -> str:
+    """PostgREST `or` filter for rows after the cursor in (column, id) order"""
+    sort_value, row_id = decode_cursor(cursor)
+    op = "lt" if descending else "gt"
+    # Comillas: los timestamps llevan ':' y '+', reservados en la sintaxis
+    return (
+        f'{column}.{op}."{sort_value}",'
+        f'and({column}.eq."{sort_value}",id.{op}."{row_id}")'
+    )
+
+
+def _page(rows: List[Dict], limit: int, sort_column: str) -> Dict:
+    """Items plus next_cursor, from a query that fetched limit + 1 rows"""
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last[sort_column], last["id"])
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def _is_expired(last_activity_at: str, hours: int = 24) -> bool:
+    last_activity = datetime.datetime.strptime(
+        last_activity_at.split(".")[0], "%Y-%m-%dT%H:%M:%S"
+    ).replace(tzinfo=timezone.utc)
+    return datetime.datetime.now(timezone.utc) - last_activity > datetime.timedelta(
+        hours=hours
+    )
+
+
+class AsyncDBStorage:
+    """
+    Conversation and message persistence on the async PostgREST client: every
+    method is a coroutine and no round trip blocks the event loop.
+
+    With a `writer` (MessageWriter) message inserts are write-behind: they
+    are queued and bulk-inserted, and reads of a conversation with queued
+    rows flush it first.
+
+    With `conversation_ids` (ConversationIdCache) the active conversation of
+    a chat is resolved in memory; the DB is read only on a miss or rollover.
+
+    With `compact` the raw Meta payload goes to the message_payloads archive
+    instead of messages.metadata (compact_messages.sql).
+    """
+
+    def __init__(
+        self, supabase_client, writer=None, conversation_ids=None, compact=False
+    ):
         self.supabase = supabase_client
+        self.writer = writer
+        self.conversation_ids = conversation_ids
+        self.compact = compact
 
-    def save_message(
+    def _row(
+        self, conversation_id: str, message_data: Dict, metadata: Dict = None
+    ) -> Dict:
+        return _message_row(conversation_id, message_data, metadata, self.compact)
+
+    async def _archive_payload(self, conversation_id: str, message_data: Dict) -> None:
+        if not self.compact:
+            return
+        row = payload_row(conversation_id, message_data)
+        if row is None:
+            return
+        if self.writer:
+            await self.writer.archive(row)
+            return
+        await self.supabase.table("message_payloads").upsert(
+            row, on_conflict="wamid", ignore_duplicates=True
+        ).execute()
+
+    async def save_message(
         self, conversation_id: str, message_data: Dict, metadata: Dict = None
     ) -> None:
         """Save message with optional metadata"""
         if not self.supabase:
             return
 
+        if self.writer:
+            # La conversación viene de get_or_create_conversation: no se
+            # vuelve a verificar en el camino caliente
+            message_insert = self._row(conversation_id, message_data, metadata)
+            message_insert["type"] = "text"
+            await self.writer.put(message_insert)
+            await self._archive_payload(conversation_id, message_data)
+            return
+
         try:
             # Verificar si la conversación existe y está activa
             result = (
-                self.supabase.table("conversations")
+                await self.supabase.table("conversations")
                 .select("id")
                 .eq("id", conversation_id)
                 .eq("status", "active")
@@ -33,42 +214,28 @@ class DBStorage:
             )
 
             if not result.data:
-                # Si la conversación no existe o no está activa, crear una nueva
                 logger.warning(
                     f"Conversation {conversation_id} not found or not active, creating new one"
                 )
-                conversation_id = self._create_conversation(
+                conversation_id = await self._create_conversation(
                     message_data.get("waba_id"), message_data.get("sender")
                 )
 
-            message_insert = {
-                "conversation_id": conversation_id,
-                "message_id": message_data.get("message", {}).get("id"),
-                "role": "user" if not message_data.get("is_response") else "assistant",
-                "content": message_data.get("message", {})
-                .get("text", {})
-                .get("body", ""),
-                "type": "text",  # PRUEBA
-                "metadata": {
-                    "type": message_data.get("type"),
-                    "original_message": message_data.get("original_message"),
-                },
-            }
-
-            if metadata:
-                message_insert["metadata"].update(metadata)
+            message_insert = self._row(conversation_id, message_data, metadata)
+            message_insert["type"] = "text"
 
-            self.supabase.table("messages").insert(message_insert).execute()
-            self._update_conversation_activity(conversation_id)
+            await self.supabase.table("messages").insert(message_insert).execute()
+            await self._archive_payload(conversation_id, message_data)
+            await self._update_conversation_activity(conversation_id)
 
         except Exception as e:
             logger.error(f"Error saving message: {str(e)}")
 
-    def _create_conversation(self, waba_id: str, phone_number: str) -> str:
+    async def _create_conversation(self, waba_id: str, phone_number: str) -> str:
         """Create new conversation and return its ID"""
         try:
             result = (
-                self.supabase.table("conversations")
+                await self.supabase.table("conversations")
                 .insert({"waba_id": waba_id, "phone_number": phone_number})
                 .execute()
             )
@@ -78,21 +245,23 @@ class DBStorage:
             logger.error(f"Error creating conversation: {str(e)}")
             raise
 
-    def store_function_call(self, conversation_id: str, function_data: Dict) -> None:
+    async def store_function_call(
+        self, conversation_id: str, function_data: Dict
+    ) -> None:
         """Store function execution details"""
         try:
-            function_message = {
-                "message": {
-                    "id": str(uuid.uuid4()),
-                    "text": {"body": f"Function executed: {function_data['name']}"},
-                },
-                "is_response": True,
-                "type": "function_call",
-            }
-
-            self.store_message(
+            await self.store_message(
                 conversation_id=conversation_id,
-                message_data=function_message,
+                message_data={
+                    "message": {
+                        "id": str(uuid.uuid4()),
+                        "text": {
+                            "body": f"Function executed: {function_data['name']}"
+                        },
+                    },
+                    "is_response": True,
+                    "type": "function_call",
+                },
                 metadata={
                     "function_name": function_data["name"],
                     "arguments": function_data["args"],
@@ -105,26 +274,27 @@ class DBStorage:
             logger.error(f"Error storing function call: {str(e)}", exc_info=True)
             raise
 
-    def get_conversation_id(self, waba_conf: WABAConfig, sender: str) -> str:
+    async def get_conversation_id(self, waba_conf: WABAConfig, sender: str) -> str:
         """Get existing conversation ID for this sender and WABA"""
-        return self.get_or_create_conversation(waba_conf.waba_id, sender)
+        return await self.get_or_create_conversation(waba_conf.waba_id, sender)
 
-    def get_conversation_messages(
+    async def get_conversation_messages(
         self, conversation_id: str, include_metadata: bool = False
     ) -> List[Dict]:
         """Retrieve messages for a conversation"""
         try:
-            query = (
-                self.supabase.table("messages")
+            if self.writer:
+                await self.writer.wait_written(conversation_id)
+            result = (
+                await self.supabase.table("messages")
                 .select(
                     "id, role, content, created_at"
                     + (", metadata" if include_metadata else "")
                 )
                 .eq("conversation_id", conversation_id)
                 .order("created_at")
+                .execute()
             )
-
-            result = query.execute()
             return result.data
 
         except Exception as e:
@@ -133,19 +303,165 @@ class DBStorage:
             )
             return []
 
-    def archive_conversation(self, conversation_id: str) -> None:
+    async def get_recent_messages(
+        self, conversation_id: str, limit: int = 30
+    ) -> List[Dict]:
+        """Last `limit` chat messages of a conversation, oldest first"""
+        try:
+            if self.writer:
+                await self.writer.wait_written(conversation_id)
+            result = (
+                await self.supabase.table("messages")
+                .select("role, content, type:metadata->>type")
+                .eq("conversation_id", conversation_id)
+                .order("created_at", desc=True)
+                .limit(limit)
+                .execute()
+            )
+            return to_context_messages(reversed(result.data or []))
+
+        except Exception as e:
+            logger.error(f"Error retrieving recent messages: {str(e)}", exc_info=True)
+            return []
+
+    async def get_messages_page(
+        self,
+        conversation_id: str,
+        columns: Optional[Sequence[str]] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        descending: bool = True,
+    ) -> Dict:
+        """
+        One page of a conversation's messages, keyset-paginated on
+        (created_at, id). Only `columns` (keys of HISTORY_MESSAGE_COLUMNS)
+        are returned; id and created_at always are, for the cursor.
+        Raises ValueError on unknown columns or a malformed cursor.
+        """
+        columns = list(columns or HISTORY_DEFAULT_COLUMNS)
+        unknown = [c for c in columns if c not in HISTORY_MESSAGE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        for required in ("created_at", "id"):
+            if required not in columns:
+                columns.insert(0, required)
+
+        if self.writer:
+            await self.writer.wait_written(conversation_id)
+
+        query = (
+            self.supabase.table("messages")
+            .select(", ".join(HISTORY_MESSAGE_COLUMNS[c] for c in columns))
+            .eq("conversation_id", conversation_id)
+        )
+        if cursor:
+            query = query.or_(_keyset_filter("created_at", cursor, descending))
+        result = (
+            await query.order("created_at", desc=descending)
+            .order("id", desc=descending)
+            .limit(limit + 1)
+            .execute()
+        )
+        return _page(result.data or [], limit, "created_at")
+
+    async def get_conversations_page(
+        self,
+        waba_id: str,
+        status: Optional[str] = None,
+        active_since: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Dict:
+        """
+        Conversations of a WABA, most recently active first, keyset-paginated
+        on (last_activity_at, id). Raises ValueError on a malformed cursor.
+        """
+        query = (
+            self.supabase.table("conversations")
+            .select(HISTORY_CONVERSATION_COLUMNS)
+            .eq("waba_id", waba_id)
+        )
+        if status:
+            query = query.eq("status", status)
+        if active_since:
+            query = query.gte("last_activity_at", active_since)
+        if cursor:
+            query = query.or_(_keyset_filter("last_activity_at", cursor, True))
+        result = (
+            await query.order("last_activity_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit + 1)
+            .execute()
+        )
+        return _page(result.data or [], limit, "last_activity_at")
+
+    async def get_recent_conversations(
+        self,
+        since: str,
+        per_conversation: int = 30,
+        limit: int = 200,
+        cursor: Optional[str] = None,
+    ) -> Dict:
+        """
+        Page of active conversations since `since` with their last messages,
+        keyset-paginated on (last_activity_at, id) like get_conversations_page
+        """
+        query = (
+            self.supabase.table("conversations")
+            .select(
+                "id, waba_id, phone_number, last_activity_at, "
+                "messages(role, content, created_at, type:metadata->>type)"
+            )
+            .eq("status", "active")
+            .gte("last_activity_at", since)
+        )
+        if cursor:
+            query = query.or_(_keyset_filter("last_activity_at", cursor, True))
+        result = (
+            await query.order("last_activity_at", desc=True)
+            .order("id", desc=True)
+            .order("created_at", desc=True, foreign_table="messages")
+            .limit(per_conversation, foreign_table="messages")
+            .limit(limit + 1)
+            .execute()
+        )
+        return _page(result.data or [], limit, "last_activity_at")
+
+    async def archive_conversation(self, conversation_id: str) -> None:
         """Archive a conversation"""
-        self.supabase.table("conversations").update({"status": "archived"}).eq(
+        await self.supabase.table("conversations").update({"status": "archived"}).eq(
             "id", conversation_id
         ).execute()
 
-    def get_or_create_conversation(self, waba_id: str, phone_number: str) -> str:
+    async def get_or_create_conversation(self, waba_id: str, phone_number: str) -> str:
         if not self.supabase:
             return str(uuid.uuid4())
 
+        cache = self.conversation_ids
+        if cache is None:
+            return await self._get_or_create_conversation(waba_id, phone_number)
+
+        conversation_id, expired = cache.get(waba_id, phone_number)
+        if conversation_id and expired:
+            # Rollover de 24 h detectado localmente: no hace falta leer
+            await self.archive_conversation(conversation_id)
+            conversation_id = await self._create_conversation(waba_id, phone_number)
+            cache.set(waba_id, phone_number, conversation_id)
+            return conversation_id
+        if conversation_id is None:
+            conversation_id = await self._get_or_create_conversation(
+                waba_id, phone_number
+            )
+        # Cada mensaje entrante es actividad de la conversación
+        cache.set(waba_id, phone_number, conversation_id)
+        return conversation_id
+
+    async def _get_or_create_conversation(
+        self, waba_id: str, phone_number: str
+    ) -> str:
         try:
             result = (
-                self.supabase.table("conversations")
+                await self.supabase.table("conversations")
                 .select("id, last_activity_at")
                 .eq("waba_id", waba_id)
                 .eq("phone_number", phone_number)
@@ -154,87 +470,88 @@ class DBStorage:
             )
 
             if not result.data:
-                return self._create_conversation(waba_id, phone_number)
+                return await self._create_conversation(waba_id, phone_number)
 
             conv = result.data[0]
-            last_activity = datetime.datetime.strptime(
-                conv["last_activity_at"].split(".")[0], "%Y-%m-%dT%H:%M:%S"
-            ).replace(tzinfo=timezone.utc)  # Use timezone.utc directly
-
-            if datetime.datetime.now(timezone.utc) - last_activity > datetime.timedelta(
-                hours=24
-            ):
-                self.archive_conversation(conv["id"])
-                return self._create_conversation(waba_id, phone_number)
+            if _is_expired(conv["last_activity_at"]):
+                await self.archive_conversation(conv["id"])
+                return await self._create_conversation(waba_id, phone_number)
 
             return conv["id"]
 
         except Exception as e:
             logger.error(f"Error in get_or_create_conversation: {str(e)}")
-            return self._create_conversation(waba_id, phone_number)
+            return await self._create_conversation(waba_id, phone_number)
 
-    def store_message(
+    async def store_message(
         self, conversation_id: str, message_data: Dict, metadata: Dict = None
     ) -> None:
         if not self.supabase:
             return
 
         try:
-            message_insert = {
-                "conversation_id": conversation_id,
-                "message_id": message_data.get("message", {}).get("id"),
-                "role": "user" if not message_data.get("is_response") else "assistant",
-                "content": message_data.get("message", {})
-                .get("text", {})
-                .get("body", ""),
-                "metadata": {
-                    "type": message_data.get("type"),
-                    "original_message": message_data.get("original_message"),
-                },
-            }
-
-            if metadata:
-                message_insert["metadata"].update(metadata)
+            if self.writer:
+                await self.writer.put(
+                    self._row(conversation_id, message_data, metadata)
+                )
+                await self._archive_payload(conversation_id, message_data)
+                return
 
-            self.supabase.table("messages").insert(message_insert).execute()
-            self._update_conversation_activity(conversation_id)
+            await self.supabase.table("messages").insert(
+                self._row(conversation_id, message_data, metadata)
+            ).execute()
+            await self._archive_payload(conversation_id, message_data)
+            await self._update_conversation_activity(conversation_id)
 
         except Exception as e:
             logger.error(f"Error storing message: {str(e)}", exc_info=True)
 
-    def _message_exists(self, conversation_id: str, message: Dict) -> bool:
-        """Check if message already exists in conversation"""
-        result = (
-            self.supabase.table("messages")
-            .select("id")
-            .eq("conversation_id", conversation_id)
-            .eq("message_id", message.get("id"))
-            .execute()
-        )
-        return bool(result.data)
-
-    def _format_message_data(self, message: Dict) -> Dict:
-        """Format message for storage"""
-        return {
-            "message": {
-                "id": message.get("id", str(uuid.uuid4())),
-                "text": {"body": message.get("content", "")},
-            },
-            "is_response": message.get("role") == "assistant",
-            "type": message.get("type", "text"),
-        }
-
-    def _update_conversation_activity(self, conversation_id: str) -> None:
-        self.supabase.table("conversations").update(
+    async def _update_conversation_activity(self, conversation_id: str) -> None:
+        await self.supabase.table("conversations").update(
             {"last_activity_at": datetime.datetime.now(timezone.utc).isoformat()}
         ).eq("id", conversation_id).execute()
 
+    async def merge_messages_metadata(
+        self, conversation_id: str, message_ids: List[str], metadata_update: Dict
+    ) -> None:
+        """Merge `metadata_update` into several messages in one statement"""
+        if not self.supabase or not message_ids:
+            return
+
+        try:
+            if self.writer:
+                # Fuera del camino de la respuesta: se aplica en el próximo flush
+                await self.writer.merge_metadata_many(
+                    conversation_id, message_ids, metadata_update
+                )
+                return
+
+            await self.supabase.rpc(
+                "merge_message_metadata",
+                {
+                    "p_conversation_id": conversation_id,
+                    "p_message_ids": message_ids,
+                    "p_metadata": metadata_update,
+                },
+            ).execute()
+
+        except Exception as e:
+            logger.error(f"Error merging messages metadata: {str(e)}", exc_info=True)
+
     async def update_message_metadata(
         self, conversation_id: str, message_id: str, metadata_update: Dict
     ) -> None:
         try:
+            if self.writer:
+                # El mensaje puede seguir en la cola: se fusiona ahí
+                if self.writer.merge_metadata(
+                    conversation_id, message_id, metadata_update
+                ):
+                    return
+                await self.writer.wait_written(conversation_id)
+
             result = (
-                self.supabase.table("messages")
+                await self.supabase.table("messages")
                 .select("metadata")
                 .eq("conversation_id", conversation_id)
                 .eq("message_id", message_id)
@@ -246,7 +563,7 @@ class DBStorage:
                 # Merge current metadata with updates
                 updated_metadata = {**current_metadata, **metadata_update}
 
-                self.supabase.table("messages").update(
+                await self.supabase.table("messages").update(
                     {"metadata": updated_metadata}
                 ).eq("conversation_id", conversation_id).eq(
                     "message_id", message_id
@@ -0,0 +1,75 @@
+-- Metadata compacta de mensajes. El payload crudo de Meta (original_message)
+-- sale de messages.metadata a un archivo aparte, y lo que se consulta de él
+-- pasa a columnas tipadas. messages.message_id ya es el wamid (y tiene índice),
+-- así que no se duplica en otra columna.
+--
+-- Orden de despliegue: aplicar este archivo, activar MESSAGE_COMPACT_STORAGE
+-- y correr el backfill (python -m core.storage.compact_backfill).
+
+alter table messages
+    add column if not exists message_type text,
+    add column if not exists media_id text,
+    add column if not exists media_mime_type text;
+
+-- Archivo de payloads crudos, escrito en lote por el MessageWriter.
+-- El ahorro está en sacar el payload de las filas calientes de messages, no
+-- en comprimirlo: TOAST solo comprime valores de más de ~2 KB y un mensaje
+-- típico de Meta ocupa menos, así que se guarda inline sin comprimir. lz4
+-- (PG 14+) aplica solo a los payloads grandes (interactivos, plantillas)
+create table if not exists message_payloads (
+    wamid text primary key,
+    conversation_id uuid,
+    received_at timestamptz not null default now(),
+    payload jsonb not null
+);
+
+alter table message_payloads alter column payload set compression lz4;
+
+-- Filas pendientes de backfill. Índice parcial: una fila compactada sale del
+-- índice, así que cada lote lee solo filas pendientes en vez de volver a
+-- recorrer las ya compactadas (costo total lineal, no cuadrático). Con
+-- MESSAGE_COMPACT_STORAGE activo las filas nuevas no entran; se puede
+-- borrar cuando el backfill termina
+create index if not exists messages_original_message_pending_idx
+    on messages (id)
+    where metadata ? 'original_message';
+
+-- Backfill de filas existentes, de a un lote por llamada para no tomar
+-- locks largos. Devuelve cuántas filas compactó (0 = terminado)
+create or replace function compact_messages_batch(p_batch_size integer)
+returns integer
+language plpgsql
+as $$
+declare
+    compacted integer;
+begin
+    with batch as (
+        select id, conversation_id, message_id, created_at,
+               metadata->'original_message' as original
+        from messages
+        where metadata ? 'original_message'
+        order by id
+        limit p_batch_size
+        for update skip locked
+    ),
+    archived as (
+        insert into message_payloads (wamid, conversation_id, received_at, payload)
+        select coalesce(original->>'id', message_id), conversation_id,
+               created_at, original
+        from batch
+        where jsonb_typeof(original) = 'object'
+          and coalesce(original->>'id', message_id) is not null
+        on conflict (wamid) do nothing
+    )
+    update messages m
+    set message_type = coalesce(b.original->>'type', m.metadata->>'type'),
+        media_id = b.original->(b.original->>'type')->>'id',
+        media_mime_type = b.original->(b.original->>'type')->>'mime_type',
+        metadata = m.metadata - 'original_message'
+    from batch b
+    where m.id = b.id;
+
+    get diagnostics compacted = row_count;
+    return compacted;
+end;
+$$;
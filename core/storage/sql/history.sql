@@ -0,0 +1,16 @@
+-- Índices de la API de historial (core/routers/history.py). Paginación por
+-- keyset: cada página es un index range scan que empieza en el cursor, sin
+-- OFFSET ni ordenamiento en memoria.
+
+-- Mensajes de una conversación en orden (created_at, id), en ambos sentidos.
+-- También sirve a get_recent_messages (hidratación del contexto)
+create index if not exists messages_conversation_created_id_idx
+    on messages (conversation_id, created_at desc, id desc);
+
+-- Conversaciones de una WABA por actividad, con filtro opcional por estado
+create index if not exists conversations_waba_status_activity_idx
+    on conversations (waba_id, status, last_activity_at desc, id desc);
+
+-- Sin filtro de estado: el índice anterior no sirve para el orden global
+create index if not exists conversations_waba_activity_idx
+    on conversations (waba_id, last_activity_at desc, id desc);
@@ -0,0 +1,24 @@
+-- Fusión en bloque de metadata (jsonb ||) para varios mensajes de una
+-- conversación, en un solo UPDATE. La usa AsyncDBStorage.merge_messages_metadata
+-- vía RPC de PostgREST. Devuelve el número de filas actualizadas.
+
+create or replace function merge_message_metadata(
+    p_conversation_id uuid,
+    p_message_ids text[],
+    p_metadata jsonb
+) returns integer
+language sql
+as $$
+    with updated as (
+        update messages
+        set metadata = coalesce(metadata, '{}'::jsonb) || p_metadata
+        where conversation_id = p_conversation_id
+          and message_id = any(p_message_ids)
+        returning 1
+    )
+    select count(*)::integer from updated;
+$$;
+
+-- Búsqueda por (conversación, mensaje) de las fusiones y de update_message_metadata
+create index if not exists messages_conversation_message_id_idx
+    on messages (conversation_id, message_id);
@@ -0,0 +1,24 @@
+-- core/storage/sql/message_statuses.sql
+-- Estados de entrega de los mensajes salientes (sent/delivered/read/failed).
+-- Se correlacionan con messages.message_id, que guarda el wamid saliente.
+
+create table if not exists message_statuses (
+    id bigserial primary key,
+    wamid text not null,
+    waba_id text not null,
+    recipient_id text,
+    status text not null,
+    status_at timestamptz,
+    pricing_category text,
+    error_code text,
+    error_title text,
+    created_at timestamptz not null default now(),
+    -- Meta reintenta: el mismo estado de un mensaje se guarda una sola vez
+    unique (wamid, status)
+);
+
+create index if not exists message_statuses_waba_status_at_idx
+    on message_statuses (waba_id, status_at desc);
+
+create index if not exists messages_message_id_idx
+    on messages (message_id);
@@ -0,0 +1,360 @@
+# core/storage/state.py
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from cachetools import TTLCache
+
+from core.config import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend:
+    """
+    Storage for the conversation state that must be shared between workers:
+    pending buffer messages, conversation locks and context history.
+
+    `shared` tells the managers whether the state lives outside the process.
+    When it does not, the in-process structures of MessageBufferManager and
+    ConversationContext are already the source of truth and no sync is needed.
+    """
+
+    shared = False
+
+    async def push_pending(self, key: str, message_id: str, message: Dict) -> None:
+        raise NotImplementedError
+
+    async def get_pending(self, key: str) -> List[Dict]:
+        raise NotImplementedError
+
+    async def ack_pending(self, key: str, message_ids: List[str]) -> None:
+        raise NotImplementedError
+
+    async def acquire_lock(self, key: str, timeout: float) -> Optional[str]:
+        """Acquire the lock for `key`. Returns a release token, or None on timeout"""
+        raise NotImplementedError
+
+    async def release_lock(self, key: str, token: str) -> None:
+        raise NotImplementedError
+
+    async def append_context(self, key: str, messages: List[Dict]) -> None:
+        raise NotImplementedError
+
+    async def get_context(self, key: str) -> List[Dict]:
+        raise NotImplementedError
+
+    async def has_context(self, key: str) -> bool:
+        """Whether a history is stored for `key`, without reading it"""
+        raise NotImplementedError
+
+    async def get_summary(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def fold_context(self, key: str, summary: str, folded: List[Dict]) -> bool:
+        """
+        Atomically replace the first messages of the history, if they still
+        are `folded`, by the rolling `summary`. Returns False otherwise.
+        """
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        """Drop the pending messages and context stored for `key`"""
+        raise NotImplementedError
+
+    async def claim(self, key: str, ttl: int) -> bool:
+        """Record `key` for `ttl` seconds. False if it was already recorded"""
+        raise NotImplementedError
+
+    async def unclaim(self, key: str) -> None:
+        """Forget a recorded key, so it can be claimed again"""
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: str) -> None:
+        """Notify the other processes sharing this backend. No-op when not shared"""
+
+    async def subscribe(
+        self, channel: str, handler: Callable[[str], Awaitable[None]]
+    ) -> None:
+        """Call `handler` for every message published on `channel` by any process"""
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    """Process-local backend. Only valid with a single worker process"""
+
+    def __init__(self, ttl: int = 3600):
+        self._pending = TTLCache(maxsize=10000, ttl=ttl)
+        self._contexts = TTLCache(maxsize=10000, ttl=ttl)
+        self._summaries = TTLCache(maxsize=10000, ttl=ttl)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Claves de claim(), una TTLCache por TTL pedido
+        self._claims: Dict[int, TTLCache] = {}
+
+    async def push_pending(self, key: str, message_id: str, message: Dict) -> None:
+        self._pending.setdefault(key, {})[message_id] = message
+
+    async def get_pending(self, key: str) -> List[Dict]:
+        return list(self._pending.get(key, {}).values())
+
+    async def ack_pending(self, key: str, message_ids: List[str]) -> None:
+        pending = self._pending.get(key)
+        if pending:
+            for message_id in message_ids:
+                pending.pop(message_id, None)
+
+    async def acquire_lock(self, key: str, timeout: float) -> Optional[str]:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        return str(uuid.uuid4())
+
+    async def release_lock(self, key: str, token: str) -> None:
+        lock = self._locks.get(key)
+        if lock and lock.locked():
+            lock.release()
+
+    async def append_context(self, key: str, messages: List[Dict]) -> None:
+        self._contexts.setdefault(key, []).extend(messages)
+
+    async def get_context(self, key: str) -> List[Dict]:
+        return list(self._contexts.get(key, []))
+
+    async def has_context(self, key: str) -> bool:
+        return bool(self._contexts.get(key))
+
+    async def get_summary(self, key: str) -> Optional[str]:
+        return self._summaries.get(key)
+
+    async def fold_context(self, key: str, summary: str, folded: List[Dict]) -> bool:
+        messages = self._contexts.get(key, [])
+        if messages[: len(folded)] != folded:
+            return False
+        del messages[: len(folded)]
+        self._summaries[key] = summary
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._pending.pop(key, None)
+        self._contexts.pop(key, None)
+        self._summaries.pop(key, None)
+
+    async def claim(self, key: str, ttl: int) -> bool:
+        if any(key in claims for claims in self._claims.values()):
+            return False
+        claims = self._claims.get(ttl)
+        if claims is None:
+            claims = self._claims[ttl] = TTLCache(maxsize=100000, ttl=ttl)
+        claims[key] = True
+        return True
+
+    async def unclaim(self, key: str) -> None:
+        for claims in self._claims.values():
+            claims.pop(key, None)
+
+
+# Libera el lock solo si sigue siendo nuestro (el token coincide)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+# Recorta la cabeza del historial y guarda el resumen, solo si la cabeza
+# sigue siendo la que se resumió
+_FOLD_CONTEXT_SCRIPT = """
+local head = redis.call("lrange", KEYS[1], 0, #ARGV - 2)
+if #head ~= #ARGV - 1 then
+    return 0
+end
+for i = 1, #head do
+    if head[i] ~= ARGV[i + 1] then
+        return 0
+    end
+end
+local ttl = redis.call("ttl", KEYS[1])
+if ttl <= 0 then
+    ttl = 3600
+end
+redis.call("ltrim", KEYS[1], #head, -1)
+redis.call("set", KEYS[2], ARGV[1], "EX", ttl)
+return 1
+"""
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Backend on a Redis-protocol store (Redis, KeyDB, Valkey, Dragonfly...).
+
+    Pending messages are a hash (id -> json) plus a sorted set for arrival
+    order; context history is a list; locks are SET NX PX keys released
+    through a token check, so an expired lock is never released by its
+    former owner.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        url: str,
+        ttl: int = 3600,
+        lock_ttl: int = 300,
+        prefix: str = "iass",
+        client=None,
+    ):
+        if client is None:
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError as e:
+                raise RuntimeError(
+                    "STATE_BACKEND=redis requires the 'redis' package"
+                ) from e
+            client = redis_asyncio.from_url(url, decode_responses=True)
+
+        self.redis = client
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.prefix = prefix
+        self._release_script = self.redis.register_script(_RELEASE_LOCK_SCRIPT)
+        self._fold_script = self.redis.register_script(_FOLD_CONTEXT_SCRIPT)
+        self._listeners: List[asyncio.Task] = []
+
+    def _k(self, kind: str, key: str) -> str:
+        return f"{self.prefix}:{kind}:{key}"
+
+    async def push_pending(self, key: str, message_id: str, message: Dict) -> None:
+        data_key, order_key = self._k("pending", key), self._k("pending_order", key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(data_key, message_id, json.dumps(message))
+            pipe.zadd(order_key, {message_id: time.time()}, nx=True)
+            pipe.expire(data_key, self.ttl)
+            pipe.expire(order_key, self.ttl)
+            await pipe.execute()
+
+    async def get_pending(self, key: str) -> List[Dict]:
+        message_ids = await self.redis.zrange(self._k("pending_order", key), 0, -1)
+        if not message_ids:
+            return []
+        values = await self.redis.hmget(self._k("pending", key), message_ids)
+        return [json.loads(value) for value in values if value is not None]
+
+    async def ack_pending(self, key: str, message_ids: List[str]) -> None:
+        if not message_ids:
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(self._k("pending", key), *message_ids)
+            pipe.zrem(self._k("pending_order", key), *message_ids)
+            await pipe.execute()
+
+    async def acquire_lock(self, key: str, timeout: float) -> Optional[str]:
+        token = str(uuid.uuid4())
+        lock_key = self._k("lock", key)
+        deadline = time.monotonic() + timeout
+        delay = 0.02
+
+        while True:
+            if await self.redis.set(lock_key, token, nx=True, px=self.lock_ttl * 1000):
+                return token
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # Otro worker tiene el lock: backoff exponencial acotado
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+
+    async def release_lock(self, key: str, token: str) -> None:
+        await self._release_script(keys=[self._k("lock", key)], args=[token])
+
+    async def append_context(self, key: str, messages: List[Dict]) -> None:
+        if not messages:
+            return
+        context_key = self._k("context", key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(context_key, *(json.dumps(m) for m in messages))
+            pipe.expire(context_key, self.ttl)
+            await pipe.execute()
+
+    async def get_context(self, key: str) -> List[Dict]:
+        values = await self.redis.lrange(self._k("context", key), 0, -1)
+        return [json.loads(value) for value in values]
+
+    async def has_context(self, key: str) -> bool:
+        # Redis borra las listas vacías: EXISTS basta, sin traer la lista
+        return bool(await self.redis.exists(self._k("context", key)))
+
+    async def get_summary(self, key: str) -> Optional[str]:
+        return await self.redis.get(self._k("summary", key))
+
+    async def fold_context(self, key: str, summary: str, folded: List[Dict]) -> bool:
+        # Misma serialización que append_context, para comparar byte a byte
+        result = await self._fold_script(
+            keys=[self._k("context", key), self._k("summary", key)],
+            args=[summary, *(json.dumps(m) for m in folded)],
+        )
+        return bool(result)
+
+    async def delete(self, key: str) -> None:
+        await self.redis.delete(
+            self._k("pending", key),
+            self._k("pending_order", key),
+            self._k("context", key),
+            self._k("summary", key),
+        )
+
+    async def claim(self, key: str, ttl: int) -> bool:
+        return bool(await self.redis.set(self._k("seen", key), "1", nx=True, ex=ttl))
+
+    async def unclaim(self, key: str) -> None:
+        await self.redis.delete(self._k("seen", key))
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self.redis.publish(self._k("channel", channel), message)
+
+    async def subscribe(
+        self, channel: str, handler: Callable[[str], Awaitable[None]]
+    ) -> None:
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self._k("channel", channel))
+        self._listeners.append(asyncio.create_task(self._listen(pubsub, handler)))
+
+    async def _listen(self, pubsub, handler: Callable[[str], Awaitable[None]]) -> None:
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    await handler(message["data"])
+                except Exception as e:
+                    logger.error(f"Error handling {message['channel']}: {str(e)}")
+        finally:
+            await pubsub.reset()
+
+    async def close(self) -> None:
+        for listener in self._listeners:
+            listener.cancel()
+        await asyncio.gather(*self._listeners, return_exceptions=True)
+        self._listeners = []
+        await self.redis.close()
+
+
+def create_state_backend(project_config) -> StateBackend:
+    """Build the backend selected by STATE_BACKEND"""
+    backend = (project_config.STATE_BACKEND or "memory").lower()
+    if backend == "redis":
+        logger.info("Using Redis state backend")
+        return RedisStateBackend(project_config.REDIS_URL)
+    if backend != "memory":
+        logger.warning(f"Unknown STATE_BACKEND '{backend}', using memory")
+    return MemoryStateBackend()
+
+
+state_backend = create_state_backend(config_manager.get_project_config())
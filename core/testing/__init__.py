@@ -0,0 +1,34 @@
+# core/testing/__init__.py
+"""
+In-process stand-ins for the external services (PostgREST, Meta webhooks),
+shared by the tests and the benchmarks. Nothing here is used at runtime.
+"""
+import os
+from typing import Dict
+
+# Valores de relleno para las variables que ProjectConfig y ClientConfig
+# exigen: la configuración se valida al importar core.config
+PLACEHOLDER_ENV: Dict[str, str] = {
+    "SUPABASE_URL": "http://127.0.0.1:54321",
+    "SUPABASE_SERVICE_ROLE_KEY": "test-key",
+    "SENDER_EMAIL": "bot@example.com",
+    "ADMIN_EMAIL": "admin@example.com",
+    "EMAIL_PASSWORD": "test",
+}
+for _client in ("DEMO", "EMPRENDEMY"):
+    for _var in (
+        "PHONE_NUMBER",
+        "FB_WABA",
+        "FB_PERMANENT_TOKEN",
+        "PHONE_NUMBER_ID",
+        "OPENAI_ASSIST_ID",
+        "OPENAI_API_KEY",
+        "APP_ID",
+    ):
+        PLACEHOLDER_ENV[f"{_var}_{_client}"] = "test"
+
+
+def use_placeholder_env() -> None:
+    """Fill in the required configuration, without overriding the environment"""
+    for key, value in PLACEHOLDER_ENV.items():
+        os.environ.setdefault(key, value)
@@ -0,0 +1,168 @@
+# core/testing/fakes.py
+"""In-process fakes (PostgREST client, webhook routing), for tests and benchmarks"""
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, client: "FakePostgrest", table: str):
+        self.client = client
+        self.table = table
+        self.op: Optional[str] = None
+        self.payload: Any = None
+        self.filters: List = []
+
+    def insert(self, rows, **kwargs):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.op, self.payload = "upsert", rows
+        return self
+
+    def update(self, values):
+        self.op, self.payload = "update", values
+        return self
+
+    def select(self, *columns):
+        self.op = "select"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(("eq", column, value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(("gte", column, value))
+        return self
+
+    def or_(self, filters):
+        self.filters.append(("or", filters))
+        return self
+
+    def order(self, column, desc=False, foreign_table=None):
+        self.filters.append(("order", column, desc, foreign_table))
+        return self
+
+    def limit(self, size, foreign_table=None):
+        self.filters.append(("limit", size, foreign_table))
+        return self
+
+    async def execute(self):
+        return await self.client._execute(self.table, self.op, self.payload, self.filters)
+
+
+class FakePostgrest:
+    """
+    Records every request as (table, op, payload). `fail` decides per
+    request whether to raise (return the exception), e.g. to reject rows
+    that violate a constraint. Selects return `select_result`, or its
+    result when it is a callable taking (table, filters); filters are
+    recorded as (method, *args). RPCs return `rpc_result(func, params)`.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests: List = []
+        self.rows: Dict[str, List[Dict]] = {}
+        self.fail: Optional[Callable[[str, str, Any], Optional[Exception]]] = None
+        self.select_result: Any = []
+        self.rpc_result: Optional[Callable[[str, Dict], Any]] = None
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    from_ = table
+
+    def rpc(self, func: str, params: Dict) -> _Query:
+        query = _Query(self, f"rpc/{func}")
+        query.op, query.payload = "rpc", params
+        return query
+
+    async def _execute(self, table, op, payload, filters):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.requests.append((table, op, payload))
+        error = self.fail(table, op, payload) if self.fail else None
+        if error:
+            raise error
+        if op in ("insert", "upsert"):
+            rows = payload if isinstance(payload, list) else [payload]
+            for row in rows:
+                row.setdefault("id", f"{table}-{len(self.rows.get(table, []))}")
+            self.rows.setdefault(table, []).extend(rows)
+            return _Result(rows)
+        if op == "rpc" and self.rpc_result:
+            return _Result(self.rpc_result(table[len("rpc/") :], payload))
+        if op == "select":
+            if callable(self.select_result):
+                return _Result(self.select_result(table, filters))
+            return _Result(list(self.select_result))
+        return _Result([])
+
+    def count(self, table: str, op: str) -> int:
+        return sum(1 for t, o, _ in self.requests if t == table and o == op)
+
+
+class RoutingStub:
+    """
+    Stands in for tenant resolution and the message handler of
+    core.routers.webhook_processor: every WABA resolves to one tenant and
+    handled messages are recorded as (sender, wamid), after `latency`.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        from core.routers import webhook_processor
+        from core.storage.cache import MessageBufferManager
+
+        self.latency = latency
+        self.handled: List = []
+        self.statuses: List = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._tenant = webhook_processor._Tenant(
+            "demo",
+            None,
+            SimpleNamespace(message_buffer_manager=MessageBufferManager()),
+            SimpleNamespace(waba_id="w1"),
+        )
+
+    async def resolve_tenant(self, waba_id, phone_id, tenants):
+        return self._tenant
+
+    async def handle_message(self, message, waba_id, sender, *args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            self.handled.append((sender, message["id"]))
+        finally:
+            self.in_flight -= 1
+
+    def record_status(self, waba_id, status):
+        self.statuses.append((waba_id, status.id, status.status))
+
+    def install(self, setattr_) -> None:
+        """Patch the module with `setattr_(obj, name, value)` (e.g. monkeypatch.setattr)"""
+        from core.routers import webhook_processor
+        from core.services.scheduler import ConversationScheduler
+        from core.utils.dedupe import WebhookDeduplicator
+
+        setattr_(webhook_processor, "_resolve_tenant", self.resolve_tenant)
+        setattr_(webhook_processor, "handle_message_case", self.handle_message)
+        setattr_(
+            webhook_processor,
+            "status_tracker",
+            SimpleNamespace(record=self.record_status),
+        )
+        setattr_(webhook_processor, "webhook_deduplicator", WebhookDeduplicator())
+        setattr_(webhook_processor, "conversation_scheduler", ConversationScheduler())
+        # El semáforo queda atado al loop en 3.9: uno nuevo por loop
+        setattr_(webhook_processor, "_fanout_semaphore", None)
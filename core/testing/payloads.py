@@ -0,0 +1,78 @@
+# core/testing/payloads.py
+"""Meta webhook payloads (Cloud API shapes), for tests and benchmarks"""
+from typing import Any, Dict, List
+
+WABA_ID = "102290129340398"
+PHONE_NUMBER_ID = "106540352242922"
+
+
+_BODY = "Hola, quería consultar por el curso de marketing digital y los medios de pago"
+_CONTEXT_WAMID = "wamid.HBgLMTY1MDM4Nzk0MzkVAgARGBI4Qzc5QjJGMTI1ODcwNTdCRkMA"
+
+
+def text_message(sender: str, wamid: str, body: str = _BODY) -> Dict[str, Any]:
+    return {
+        "from": sender,
+        "id": wamid,
+        "timestamp": "1749416383",
+        "text": {"body": body},
+        "type": "text",
+    }
+
+
+def interactive_message(sender: str, wamid: str) -> Dict[str, Any]:
+    return {
+        "context": {"from": "15550783881", "id": _CONTEXT_WAMID},
+        "from": sender,
+        "id": wamid,
+        "timestamp": "1750096325",
+        "type": "interactive",
+        "interactive": {
+            "type": "button_reply",
+            "button_reply": {"id": "pagar", "title": "Quiero pagar"},
+        },
+    }
+
+
+def status(recipient: str, wamid: str, state: str = "delivered") -> Dict[str, Any]:
+    return {
+        "id": wamid,
+        "status": state,
+        "timestamp": "1750263773",
+        "recipient_id": recipient,
+        "conversation": {
+            "id": "1c8b0a2f4e0c2b87e3c4d8b2d0a3f1e2",
+            "origin": {"type": "service"},
+        },
+        "pricing": {"billable": True, "pricing_model": "CBP", "category": "service"},
+    }
+
+
+def change(
+    messages: List[Dict[str, Any]] = (),
+    statuses: List[Dict[str, Any]] = (),
+    phone_number_id: str = PHONE_NUMBER_ID,
+) -> Dict[str, Any]:
+    value: Dict[str, Any] = {
+        "messaging_product": "whatsapp",
+        "metadata": {
+            "display_phone_number": "15550783881",
+            "phone_number_id": phone_number_id,
+        },
+    }
+    if messages:
+        value["contacts"] = [
+            {"profile": {"name": "Sheena Nelson"}, "wa_id": m["from"]} for m in messages
+        ]
+        value["messages"] = list(messages)
+    if statuses:
+        value["statuses"] = list(statuses)
+    return {"value": value, "field": "messages"}
+
+
+def envelope(*entries: Dict[str, Any]) -> Dict[str, Any]:
+    return {"object": "whatsapp_business_account", "entry": list(entries)}
+
+
+def entry(*changes: Dict[str, Any], waba_id: str = WABA_ID) -> Dict[str, Any]:
+    return {"id": waba_id, "changes": list(changes)}
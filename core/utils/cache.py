@@ -24,7 +24,7 @@ async def save_and_clear_wabas_cache():
     logger.info(f"WABAs to upsert: {len(wabas)}")
 
     if wabas:
-        result = upsert_waba(wabas)
+        result = await upsert_waba(wabas)
         if result.get("error"):
             logger.info("Error saving WABAs to database:", result["error"])
         else:
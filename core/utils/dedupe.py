@@ -0,0 +1,81 @@
+# core/utils/dedupe.py
+import logging
+from typing import Dict
+
+from cachetools import TTLCache
+
+from core.config import config_manager
+from core.storage.state import StateBackend, state_backend
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookDeduplicator:
+    """
+    Bounded, time-windowed memory of the webhook events already seen, keyed by
+    wamid. Meta retries deliveries, so an event seen within the window is a
+    retry and must not be processed again. The oldest keys are evicted first
+    when the store is full.
+
+    With a shared state backend the keys live there instead, so a retry
+    delivered to another worker is suppressed as well.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 100000,
+        window_seconds: int = 86400,
+        backend: StateBackend = None,
+    ):
+        self.window_seconds = window_seconds
+        self.backend = backend if backend is not None and backend.shared else None
+        self._seen = TTLCache(maxsize=maxsize, ttl=window_seconds)
+        self.checked = 0
+        self.released = 0
+        self.suppressed: Dict[str, int] = {"messages": 0, "statuses": 0}
+
+    async def is_duplicate(self, key: str, kind: str = "messages") -> bool:
+        """Check-and-record: True if `key` was already seen within the window"""
+        self.checked += 1
+        if self.backend:
+            duplicate = not await self.backend.claim(
+                f"dedupe:{key}", self.window_seconds
+            )
+        else:
+            duplicate = key in self._seen
+            if not duplicate:
+                self._seen[key] = True
+
+        if duplicate:
+            self.suppressed[kind] = self.suppressed.get(kind, 0) + 1
+            logger.info(f"Duplicate webhook event suppressed ({kind}): {key}")
+        return duplicate
+
+    async def forget(self, key: str) -> None:
+        """
+        Drop a recorded key whose event could not be processed, so Meta's
+        retry of it goes through instead of being suppressed
+        """
+        self.released += 1
+        if self.backend:
+            await self.backend.unclaim(f"dedupe:{key}")
+        else:
+            self._seen.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        return {
+            "shared": self.backend is not None,
+            "tracked": len(self._seen),
+            "checked": self.checked,
+            "released": self.released,
+            "suppressed": dict(self.suppressed),
+        }
+
+
+_project_config = config_manager.get_project_config()
+
+webhook_deduplicator = WebhookDeduplicator(
+    maxsize=_project_config.DEDUPE_MAXSIZE,
+    window_seconds=_project_config.DEDUPE_WINDOW_SECONDS,
+    backend=state_backend,
+)
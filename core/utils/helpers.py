@@ -8,7 +8,7 @@ from core.storage.cache import (
     ConversationContext,
     MessageBufferManager,
 )
-from core.storage.db import DBStorage
+from core.storage.db import AsyncDBStorage
 
 logger = logging.getLogger(__name__)
 
@@ -94,7 +94,7 @@ def create_instances(supabase_client):
         instructions_cache, \
         wabas_config_cache
 
-    db = DBStorage(supabase_client)
+    db = AsyncDBStorage(supabase_client)
     message_buffer_manager = MessageBufferManager()
     context = ConversationContext()
     # courses_cache = CoursesCache()
@@ -1,4 +1,6 @@
 # core/utils/supabase_client.py
+import httpx
+from postgrest import AsyncPostgrestClient
 from supabase import create_client
 from core.config import config_manager
 
@@ -8,3 +10,39 @@ project_config = config_manager.get_project_config()
 supabase = create_client(
     project_config.SUPABASE_URL, project_config.SUPABASE_SERVICE_ROLE_KEY
 )
+
+
+def create_async_postgrest(
+    url: str, key: str, max_connections: int = 20, timeout: float = 10.0
+) -> AsyncPostgrestClient:
+    """
+    PostgREST client for the async paths: one pooled HTTP/2 connection set
+    with keep-alive, shared by every query, so no round trip blocks the loop
+    """
+    rest_url = f"{url.rstrip('/')}/rest/v1"
+    headers = {
+        "apikey": key,
+        "Authorization": f"Bearer {key}",
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+    }
+    http_client = httpx.AsyncClient(
+        base_url=rest_url,
+        headers=headers,
+        http2=True,
+        timeout=timeout,
+        follow_redirects=True,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60,
+        ),
+    )
+    return AsyncPostgrestClient(rest_url, headers=headers, http_client=http_client)
+
+
+async_supabase = create_async_postgrest(
+    project_config.SUPABASE_URL,
+    project_config.SUPABASE_SERVICE_ROLE_KEY,
+    max_connections=project_config.DB_POOL_SIZE,
+)
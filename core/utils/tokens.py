@@ -0,0 +1,89 @@
+# core/utils/tokens.py
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - depende del entorno
+    tiktoken = None
+
+# Tokens extra por mensaje del formato chat (rol y separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+DEFAULT_ENCODING = "cl100k_base"
+# cl100k: gpt-4 / gpt-3.5; o200k: gpt-4o y posteriores
+PRELOADED_ENCODINGS = ("cl100k_base", "o200k_base")
+
+# Encoders cargados por load_encodings. La primera carga descarga y parsea el
+# archivo BPE (segundos): nunca se hace en el camino caliente, mientras no
+# estén cargados se estima
+_encodings: Dict[str, Any] = {}
+
+
+@lru_cache(maxsize=64)
+def _encoding_name(model: Optional[str]) -> str:
+    # Mismo mapeo que tiktoken.encoding_for_model, sin cargar el encoder
+    if tiktoken is None or not model:
+        return DEFAULT_ENCODING
+    if model in tiktoken.model.MODEL_TO_ENCODING:
+        return tiktoken.model.MODEL_TO_ENCODING[model]
+    for prefix, name in tiktoken.model.MODEL_PREFIX_TO_ENCODING.items():
+        if model.startswith(prefix):
+            return name
+    return DEFAULT_ENCODING
+
+
+def _get_encoding(model: Optional[str]):
+    return _encodings.get(_encoding_name(model)) or _encodings.get(DEFAULT_ENCODING)
+
+
+def _load_encoding(name: str):
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding {name}, estimating: {str(e)}")
+        return None
+
+
+async def load_encodings(names: Iterable[str] = PRELOADED_ENCODINGS) -> None:
+    """
+    Load the tiktoken encoders in a thread, off the event loop. Until then,
+    or if loading fails (no network, no cache), token counts are estimated.
+    """
+    if tiktoken is None:
+        return
+    for name in names:
+        if name in _encodings:
+            continue
+        encoding = await asyncio.to_thread(_load_encoding, name)
+        if encoding is not None:
+            _encodings[name] = encoding
+            logger.info(f"Loaded tiktoken encoding {name}")
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Tokens of a text. Uses tiktoken once its encoders are loaded; otherwise
+    estimates ~4 characters per token, which is close enough for budgeting.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(
+    messages: List[Dict[str, str]], model: Optional[str] = None
+) -> int:
+    """Prompt tokens of a list of chat messages"""
+    return sum(
+        count_tokens(str(message.get("content") or ""), model)
+        + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
@@ -2,8 +2,15 @@ import logging
 import multiprocessing
 import os
 
-# Configuración de workers
-workers = 1
+# Configuración de workers. Con más de uno, el estado de las conversaciones
+# (buffers, locks, contexto, de-duplicación de webhooks) tiene que estar en un
+# backend compartido
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+if workers > 1 and os.getenv("STATE_BACKEND", "memory").lower() != "redis":
+    logging.getLogger("gunicorn.error").warning(
+        "GUNICORN_WORKERS > 1 requires STATE_BACKEND=redis; using 1 worker"
+    )
+    workers = 1
 worker_class = "uvicorn.workers.UvicornWorker"
 timeout = 120
 bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
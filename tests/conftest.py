@@ -0,0 +1,6 @@
+# tests/conftest.py
+from core.testing import use_placeholder_env
+
+# La configuración se valida al importar core: valores de prueba, sin pisar
+# los del entorno
+use_placeholder_env()
@@ -0,0 +1,87 @@
+# tests/test_compact_storage.py
+import asyncio
+import os
+import re
+
+import pytest
+
+from core.services.message_writer import MessageWriter
+from core.storage import compact_backfill
+from core.storage.db import AsyncDBStorage
+from core.testing.fakes import FakePostgrest
+
+_IMAGE = {
+    "from": "5491",
+    "id": "wamid.img",
+    "timestamp": "1760000000",
+    "type": "image",
+    "image": {"id": "media-1", "mime_type": "image/jpeg", "sha256": "abc"},
+}
+
+
+def _message_data(original=_IMAGE):
+    return {
+        "message": {"id": original["id"], "text": {"body": ""}},
+        "type": original["type"],
+        "original_message": original,
+    }
+
+
+def _save(writer: bool):
+    async def run():
+        db = FakePostgrest()
+        message_writer = MessageWriter(db, flush_interval=60) if writer else None
+        storage = AsyncDBStorage(db, writer=message_writer, compact=True)
+        if writer:
+            await storage.save_message("c1", _message_data())
+            await message_writer.flush()
+        else:
+            db.select_result = [{"id": "c1"}]
+            await storage.save_message("c1", _message_data())
+        return db
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("writer", [True, False])
+def test_compact_rows_leave_the_payload_in_the_archive(writer):
+    db = _save(writer)
+    (message,) = db.rows["messages"]
+    assert "original_message" not in message["metadata"]
+    assert (message["message_type"], message["media_id"]) == ("image", "media-1")
+    assert message["media_mime_type"] == "image/jpeg"
+
+    (archived,) = [p for t, op, p in db.requests if t == "message_payloads"]
+    archived = archived[0] if isinstance(archived, list) else archived
+    assert archived["wamid"] == "wamid.img"
+    assert archived["payload"] == _IMAGE
+
+
+def test_backfill_calls_the_batch_rpc_until_nothing_is_left(monkeypatch):
+    db = FakePostgrest()
+    remaining = [2500]
+
+    def compact_batch(func, params):
+        assert func == "compact_messages_batch"
+        compacted = min(remaining[0], params["p_batch_size"])
+        remaining[0] -= compacted
+        return compacted
+
+    db.rpc_result = compact_batch
+    monkeypatch.setattr(compact_backfill, "async_supabase", db)
+    total = asyncio.run(compact_backfill.backfill(batch_size=1000, pause=0))
+
+    assert total == 2500
+    assert db.count("rpc/compact_messages_batch", "rpc") == 4
+
+
+def test_backfill_batches_read_the_pending_partial_index():
+    path = os.path.join(
+        os.path.dirname(compact_backfill.__file__), "sql", "compact_messages.sql"
+    )
+    with open(path) as f:
+        sql = f.read()
+    index = re.search(r"on messages \(id\)\s+where (.+?);", sql).group(1)
+    batch = re.search(r"from messages\s+where (.+?)\s+order by id", sql).group(1)
+    # Mismo predicado: el planner solo usa el índice parcial si coincide
+    assert index == batch == "metadata ? 'original_message'"
@@ -0,0 +1,152 @@
+# tests/test_conversation_context.py
+import asyncio
+
+import pytest
+
+from core.models.enums import MessageRole
+from core.storage import cache as cache_module
+from core.storage.cache import ConversationContext
+from core.storage.state import RedisStateBackend
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def _shared_contexts(n: int):
+    server = fakeredis.FakeServer()
+    return [
+        ConversationContext(
+            state_backend=RedisStateBackend(
+                "", client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+            )
+        )
+        for _ in range(n)
+    ]
+
+
+def test_load_reuses_the_stored_token_counts(monkeypatch):
+    async def run():
+        writer, reader = _shared_contexts(2)
+        for i in range(20):
+            writer.add_message("w1", "5491", MessageRole.USER, f"mensaje número {i}")
+        await writer.sync("w1", "5491")
+        expected = writer.contexts["5491_w1"].history_tokens
+
+        calls = []
+        monkeypatch.setattr(
+            cache_module, "count_tokens", lambda text: calls.append(text) or 1
+        )
+        await reader.load("w1", "5491")
+        return reader.contexts["5491_w1"].history_tokens, expected, calls
+
+    loaded, expected, calls = asyncio.run(run())
+    assert loaded == expected
+    assert calls == []
+
+
+def test_fold_matches_the_stored_entries():
+    async def run():
+        (context,) = _shared_contexts(1)
+        for i in range(10):
+            context.add_message("w1", "5491", MessageRole.USER, f"mensaje {i}" * 20)
+        await context.sync("w1", "5491")
+        await context.load("w1", "5491")
+
+        async def summarizer(previous, messages):
+            return f"resumen de {len(messages)}"
+
+        assert context.schedule_summary("w1", "5491", 100, summarizer, keep_recent=2)
+        await asyncio.gather(*context._summary_tasks.values())
+        stored = await context.state.get_context("5491_w1")
+        return context, stored
+
+    context, stored = asyncio.run(run())
+    assert context.summaries == 1
+    assert len(stored) == len(context.contexts["5491_w1"].messages)
+
+
+def _filled_context(count: int = 10) -> ConversationContext:
+    context = ConversationContext()
+    for i in range(count):
+        # 36 caracteres: 10 tokens estimados + 4 de formato
+        context.add_message("w1", "5491", MessageRole.USER, f"{i:02d}" + "x" * 34)
+    return context
+
+
+def test_an_over_budget_history_is_folded_down_to_half_the_budget():
+    calls = []
+
+    async def summarizer(previous, messages):
+        calls.append((previous, [m["content"][:2] for m in messages]))
+        return f"resumen {len(calls)}"
+
+    async def run():
+        context = _filled_context()
+        context.set_prefix_instructions(
+            "w1", "5491", [{"role": "system", "content": "instrucciones"}]
+        )
+        assert context.contexts["5491_w1"].history_tokens == 140
+        assert context.schedule_summary("w1", "5491", 100, summarizer, keep_recent=2)
+        # Un resumen en curso no se duplica
+        assert not context.schedule_summary("w1", "5491", 100, summarizer)
+        await asyncio.gather(*context._summary_tasks.values())
+        return context
+
+    context = asyncio.run(run())
+    assert calls == [(None, [f"{i:02d}" for i in range(7)])]
+    assert context.contexts["5491_w1"].history_tokens == 42
+    full = context.get_full_context("w1", "5491")
+    assert [m["role"] for m in full[:2]] == ["system", "system"]
+    assert full[1]["content"].endswith("resumen 1")
+    assert [m["content"][:2] for m in full[2:]] == ["07", "08", "09"]
+    assert context.get_token_stats()["summarized_messages"] == 7
+
+
+def test_folding_keeps_the_recent_messages_and_respects_the_budget():
+    async def summarizer(previous, messages):
+        return "resumen"
+
+    async def run():
+        context = _filled_context()
+        scheduled = [
+            context.schedule_summary("w1", "5491", 200, summarizer),
+            context.schedule_summary("w1", "5491", 0, summarizer),
+            context.schedule_summary("w1", "5491", 100, summarizer, keep_recent=6),
+        ]
+        await asyncio.gather(*context._summary_tasks.values())
+        return scheduled, context.get_messages("w1", "5491")
+
+    scheduled, messages = asyncio.run(run())
+    assert scheduled == [False, False, True]
+    assert len(messages) == 6
+
+
+def test_a_fold_is_dropped_if_the_history_changed_or_the_summary_failed():
+    async def run():
+        context = _filled_context()
+        gate = asyncio.Event()
+
+        async def slow(previous, messages):
+            await gate.wait()
+            return "resumen"
+
+        context.schedule_summary("w1", "5491", 100, slow, keep_recent=2)
+        context.reset_conversation("w1", "5491")
+        for i in range(3):
+            context.add_message("w1", "5491", MessageRole.USER, f"nuevo {i}")
+        gate.set()
+        await asyncio.gather(*context._summary_tasks.values())
+        after_reset = context.get_messages("w1", "5491")
+
+        async def failing(previous, messages):
+            raise RuntimeError("openai down")
+
+        other = _filled_context()
+        other.schedule_summary("w1", "5491", 100, failing)
+        await asyncio.gather(*other._summary_tasks.values())
+        return context, after_reset, other
+
+    context, after_reset, other = asyncio.run(run())
+    assert [m["content"] for m in after_reset] == ["nuevo 0", "nuevo 1", "nuevo 2"]
+    assert context.summaries == 0
+    assert other.summary_errors == 1
+    assert len(other.get_messages("w1", "5491")) == 10
@@ -0,0 +1,51 @@
+# tests/test_conversation_ids.py
+import asyncio
+
+from core.storage.conversations import ConversationIdCache
+from core.storage.db import AsyncDBStorage
+from core.testing.fakes import FakePostgrest
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_rollover_is_detected_after_24h_without_a_read():
+    clock = _Clock()
+    cache = ConversationIdCache(maxsize=10, timer=clock)
+    cache.set("w1", "5491", "c1")
+
+    clock.now += 23 * 3600
+    assert cache.get("w1", "5491") == ("c1", False)
+
+    cache.set("w1", "5491", "c1")
+    clock.now += 24 * 3600 + 1
+    assert cache.get("w1", "5491") == ("c1", True)
+    assert cache.get_stats()["rollovers"] == 1
+
+
+def test_storage_archives_and_creates_on_rollover():
+    clock = _Clock()
+
+    async def run():
+        db = FakePostgrest()
+        cache = ConversationIdCache(maxsize=10, timer=clock)
+        storage = AsyncDBStorage(db, conversation_ids=cache)
+
+        first = await storage.get_or_create_conversation("w1", "5491")
+        clock.now += 3600
+        same = await storage.get_or_create_conversation("w1", "5491")
+        clock.now += 25 * 3600
+        rolled = await storage.get_or_create_conversation("w1", "5491")
+        return db, cache, first, same, rolled
+
+    db, cache, first, same, rolled = asyncio.run(run())
+    assert first == same != rolled
+    # Solo el primer mensaje lee la base; el rollover se resuelve en memoria
+    assert db.count("conversations", "select") == 1
+    assert db.count("conversations", "update") == 1
+    assert cache.get_stats()["rollovers"] == 1
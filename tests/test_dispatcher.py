@@ -0,0 +1,44 @@
+# tests/test_dispatcher.py
+import asyncio
+
+import msgspec
+
+from core.routers import metrics
+from core.services import dispatcher
+
+
+def _control(request_id: int, op: str, *args) -> bytes:
+    return dispatcher._CONTROL + msgspec.msgpack.encode([request_id, op, list(args)])
+
+
+def test_worker_reports_its_local_metrics():
+    reply = asyncio.run(dispatcher._handle_control(_control(7, "metrics")))
+    request_id, ok, result = msgspec.msgpack.decode(reply)
+    assert (request_id, ok) == (7, True)
+    assert {"ingest", "scheduler", "clients"} <= set(result)
+
+
+def test_unknown_control_op_fails_without_raising():
+    reply = asyncio.run(dispatcher._handle_control(_control(1, "nope")))
+    assert msgspec.msgpack.decode(reply)[:2] == [1, False]
+
+
+class _StartedDispatcher:
+    started = True
+
+    def __init__(self, workers: int):
+        self.workers = workers
+
+    def get_stats(self):
+        return {"workers": self.workers}
+
+    async def call(self, op, *args, timeout=10.0):
+        assert op == "metrics"
+        return [{"clients": {"c": {"worker": i}}} for i in range(self.workers)]
+
+
+def test_front_metrics_gather_every_worker(monkeypatch):
+    monkeypatch.setattr(metrics, "webhook_dispatcher", _StartedDispatcher(3))
+    result = asyncio.run(metrics.get_metrics())
+    assert result["dispatcher"] == {"workers": 3}
+    assert [w["clients"]["c"]["worker"] for w in result["workers"]] == [0, 1, 2]
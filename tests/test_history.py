@@ -0,0 +1,126 @@
+# tests/test_history.py
+import asyncio
+import re
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.routers import history
+from core.storage.db import (
+    AsyncDBStorage,
+    _keyset_filter,
+    _page,
+    decode_cursor,
+    encode_cursor,
+)
+from core.testing.fakes import FakePostgrest
+
+_STAMP = "2026-10-17T12:00:00.000001+00:00"
+
+_KEYSET = re.compile(
+    r'^(\w+)\.(lt|gt)\."([^"]*)",and\(\1\.eq\."\3",id\.\2\."([^"]*)"\)$'
+)
+
+
+def _messages_table(rows):
+    """Select over `rows` that applies the keyset filter, order and limit"""
+
+    def select(table, filters):
+        result = list(rows)
+        for f in filters:
+            if f[0] == "or":
+                column, op, value, row_id = _KEYSET.match(f[1]).groups()
+                after = (lambda a, b: a < b) if op == "lt" else (lambda a, b: a > b)
+                result = [
+                    r
+                    for r in result
+                    if after(r[column], value)
+                    or (r[column] == value and after(r["id"], row_id))
+                ]
+        desc = next(f[2] for f in filters if f[0] == "order")
+        result.sort(key=lambda r: (r["created_at"], r["id"]), reverse=desc)
+        limit = next(f[1] for f in filters if f[0] == "limit")
+        return result[:limit]
+
+    return select
+
+
+def test_cursor_round_trips():
+    cursor = encode_cursor(_STAMP, "a1b2")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (_STAMP, "a1b2")
+    assert decode_cursor(encode_cursor(_STAMP, 42)) == (_STAMP, "42")
+
+
+@pytest.mark.parametrize(
+    "cursor", ["", "%%%", "bm90IGpzb24", encode_cursor("x", 1)[:-3]]
+)
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_keyset_filter_quotes_values_and_follows_the_order():
+    cursor = encode_cursor(_STAMP, "id-9")
+    assert _keyset_filter("created_at", cursor, descending=True) == (
+        f'created_at.lt."{_STAMP}",and(created_at.eq."{_STAMP}",id.lt."id-9")'
+    )
+    assert _keyset_filter("created_at", cursor, descending=False) == (
+        f'created_at.gt."{_STAMP}",and(created_at.eq."{_STAMP}",id.gt."id-9")'
+    )
+
+
+def test_page_has_a_cursor_only_when_there_are_more_rows():
+    rows = [{"id": str(i), "created_at": f"t{i}"} for i in range(3)]
+    assert _page(rows[:2], 2, "created_at")["next_cursor"] is None
+    page = _page(rows, 2, "created_at")
+    assert page["items"] == rows[:2]
+    assert decode_cursor(page["next_cursor"]) == ("t1", "1")
+
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_pages_split_rows_with_the_same_timestamp(descending):
+    # Un insert en bloque deja varios mensajes con el mismo created_at
+    rows = [
+        {"id": f"m{i}", "created_at": _STAMP if 2 <= i <= 6 else f"2026-10-17T1{i}"}
+        for i in range(10)
+    ]
+
+    async def run():
+        db = FakePostgrest()
+        db.select_result = _messages_table(rows)
+        storage = AsyncDBStorage(db)
+        seen, cursor = [], None
+        while True:
+            page = await storage.get_messages_page(
+                "c1", limit=3, cursor=cursor, descending=descending
+            )
+            seen.extend(r["id"] for r in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return seen
+
+    seen = asyncio.run(run())
+    expected = sorted(
+        rows, key=lambda r: (r["created_at"], r["id"]), reverse=descending
+    )
+    assert seen == [r["id"] for r in expected]
+
+
+def test_unknown_columns_are_rejected_before_querying():
+    db = FakePostgrest()
+    with pytest.raises(ValueError):
+        asyncio.run(AsyncDBStorage(db).get_messages_page("c1", columns=["password"]))
+    assert db.requests == []
+
+
+def test_bad_cursor_is_a_400(monkeypatch):
+    monkeypatch.setattr(history, "db", AsyncDBStorage(FakePostgrest()))
+    app = FastAPI()
+    app.include_router(history.router)
+    client = TestClient(app)
+
+    for path in ("/history/w1/conversations", "/history/conversations/c1/messages"):
+        response = client.get(path, params={"cursor": "%%%"})
+        assert response.status_code == 400
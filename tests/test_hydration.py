@@ -0,0 +1,112 @@
+# tests/test_hydration.py
+import asyncio
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from core.routers import webhook_processor
+from core.services import hydration
+from core.storage.cache import ConversationContext
+from core.storage.state import RedisStateBackend
+from core.testing.fakes import FakePostgrest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+_KEYSET = re.compile(r'\.lt\."([^"]+)",and\(.*id\.lt\."([^"]+)"\)')
+
+
+def _conversations(count: int):
+    # Muchas conversaciones empatadas en last_activity_at, cruzando páginas
+    return [
+        {
+            "id": f"conv-{i:04d}",
+            "waba_id": "w1",
+            "phone_number": f"549{i:04d}",
+            "last_activity_at": f"2026-10-16T12:00:{i // 7:02d}+00:00",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f"hola {i}",
+                    "created_at": "2026-10-16T11:00:00+00:00",
+                }
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def _keyset_select(rows):
+    def select(table, filters):
+        def position(row):
+            return row["last_activity_at"], row["id"]
+
+        result = sorted(rows, key=position, reverse=True)
+        for method, *args in filters:
+            if method == "or":
+                after = _KEYSET.search(args[0]).groups()
+                result = [r for r in result if position(r) < after]
+            elif method == "limit" and args[1] is None:
+                result = result[: args[0]]
+        return result
+
+    return select
+
+
+def test_prefetch_pages_on_a_keyset_and_primes_each_conversation_once(monkeypatch):
+    db = FakePostgrest()
+    db.select_result = _keyset_select(_conversations(95))
+    primed = []
+    context = SimpleNamespace(
+        prime=lambda waba_id, sender, messages: primed.append(sender)
+    )
+    monkeypatch.setattr(hydration, "async_supabase", db)
+    monkeypatch.setattr(
+        hydration,
+        "config_manager",
+        SimpleNamespace(resolve_client=lambda waba_id: ("demo", None)),
+    )
+    monkeypatch.setattr(
+        webhook_processor,
+        "get_or_create_container",
+        lambda client_id: SimpleNamespace(context=context),
+    )
+
+    count = asyncio.run(hydration.prefetch_recent_contexts(24, page_size=10))
+
+    assert count == 95
+    assert sorted(primed) == [f"549{i:04d}" for i in range(95)]
+    assert db.count("conversations", "select") == 10
+
+
+def test_hydrate_checks_the_shared_history_without_reading_it():
+    server = fakeredis.FakeServer()
+    backends = [
+        RedisStateBackend(
+            "", client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        )
+        for _ in range(2)
+    ]
+
+    async def run():
+        writer = ConversationContext(state_backend=backends[0])
+        writer.prime("w1", "5491", [{"role": "user", "content": "hola"}] * 200)
+        await writer.sync("w1", "5491")
+
+        reader = ConversationContext(state_backend=backends[1])
+        ranges = []
+        lrange = backends[1].redis.lrange
+
+        async def counting_lrange(*args):
+            ranges.append(args)
+            return await lrange(*args)
+
+        backends[1].redis.lrange = counting_lrange
+        loads = []
+        hit = await reader.hydrate("w1", "5491", lambda: loads.append(1) or [])
+        miss = await reader.hydrate("w1", "5492", lambda: loads.append(1) or [])
+        return hit, miss, ranges, loads
+
+    hit, miss, ranges, loads = asyncio.run(run())
+    assert (hit, miss) == (True, False)
+    assert ranges == [] and loads == [1]
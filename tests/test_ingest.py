@@ -0,0 +1,102 @@
+# tests/test_ingest.py
+import asyncio
+import json
+
+from core.models.webhook import decode_webhook
+from core.services.ingest import WebhookIngestQueue, WebhookJournal
+from core.testing import payloads
+
+
+def _raw(i: int) -> bytes:
+    return json.dumps(
+        payloads.envelope(
+            payloads.entry(
+                payloads.change(messages=[payloads.text_message("5491", f"wamid.{i}")])
+            )
+        )
+    ).encode()
+
+
+def _wamid(body) -> str:
+    return body.entry[0].changes[0].value.messages[0].id
+
+
+def _pending(path) -> list:
+    journal = WebhookJournal(str(path))
+    try:
+        return [entry_id for entry_id, _ in journal.pending()]
+    finally:
+        journal.close()
+
+
+def test_put_drains_in_order_and_acks_the_journal(tmp_path):
+    path = tmp_path / "ingest.db"
+    handled = []
+
+    async def handler(body):
+        handled.append(_wamid(body))
+
+    async def run():
+        queue = WebhookIngestQueue(handler, workers=1, journal_path=str(path))
+        await queue.start()
+        for i in range(5):
+            raw = _raw(i)
+            await queue.put(decode_webhook(raw), raw)
+        await queue.stop()
+        return queue.get_stats()
+
+    stats = asyncio.run(run())
+    assert handled == [f"wamid.{i}" for i in range(5)]
+    assert stats["processed"] == 5
+    assert _pending(path) == []
+
+
+def test_a_failed_payload_is_acked_and_not_replayed(tmp_path):
+    path = tmp_path / "ingest.db"
+
+    async def handler(body):
+        raise ValueError("bad payload")
+
+    async def run():
+        queue = WebhookIngestQueue(handler, workers=1, journal_path=str(path))
+        await queue.start()
+        raw = _raw(0)
+        await queue.put(decode_webhook(raw), raw)
+        await queue.stop()
+        return queue.get_stats()
+
+    assert asyncio.run(run())["failed"] == 1
+    assert _pending(path) == []
+
+
+def test_work_cancelled_on_stop_is_replayed_after_restart(tmp_path):
+    path = tmp_path / "ingest.db"
+    handled = []
+
+    async def stuck(body):
+        await asyncio.Event().wait()
+
+    async def handler(body):
+        handled.append(_wamid(body))
+
+    async def run():
+        queue = WebhookIngestQueue(stuck, workers=2, journal_path=str(path))
+        await queue.start()
+        for i in range(3):
+            raw = _raw(i)
+            await queue.put(decode_webhook(raw), raw)
+        await asyncio.sleep(0.01)
+        # Dos en proceso y uno en cola: el timeout cancela a los workers
+        await queue.stop(timeout=0.05)
+        pending = _pending(path)
+
+        restarted = WebhookIngestQueue(handler, workers=1, journal_path=str(path))
+        await restarted.start()
+        await restarted.stop()
+        return pending, restarted.get_stats()
+
+    pending, stats = asyncio.run(run())
+    assert len(pending) == 3
+    assert stats["replayed"] == 3
+    assert handled == ["wamid.0", "wamid.1", "wamid.2"]
+    assert _pending(path) == []
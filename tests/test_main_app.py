@@ -0,0 +1,47 @@
+# tests/test_main_app.py
+import pytest
+from fastapi.testclient import TestClient
+
+from core import main
+
+
+def _client(monkeypatch, dispatch_workers: int) -> TestClient:
+    config = main.config_manager.get_project_config().model_copy(
+        update={"DISPATCH_WORKERS": dispatch_workers}
+    )
+    monkeypatch.setattr(main.config_manager, "get_project_config", lambda: config)
+    # Sin `with`: el lifespan (workers, ingesta) no arranca
+    return TestClient(main.create_main_application())
+
+
+@pytest.mark.parametrize("dispatch_workers", [0, 2])
+def test_webhook_verification_is_served_in_every_run_mode(
+    monkeypatch, dispatch_workers
+):
+    client = _client(monkeypatch, dispatch_workers)
+    token = main.config_manager.get_project_config().FB_VERIFY_TOKEN
+    params = {"hub.mode": "subscribe", "hub.challenge": "42"}
+
+    response = client.get(
+        "/api/v1/webhook", params={**params, "hub.verify_token": token}
+    )
+    assert response.status_code == 200
+    assert response.text == "42"
+
+    rejected = client.get("/api/v1/webhook", params={**params, "hub.verify_token": "x"})
+    assert rejected.status_code == 403
+
+
+def test_dispatch_mode_posts_go_to_the_dispatcher(monkeypatch):
+    dispatched = []
+
+    async def dispatch(raw, payload):
+        dispatched.append(raw)
+
+    monkeypatch.setattr(main.webhook_dispatcher, "dispatch", dispatch)
+    client = _client(monkeypatch, 2)
+
+    body = b'{"object": "whatsapp_business_account", "entry": []}'
+    response = client.post("/api/v1/webhook", content=body)
+    assert response.status_code == 200
+    assert len(dispatched) == 1
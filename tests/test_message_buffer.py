@@ -0,0 +1,142 @@
+# tests/test_message_buffer.py
+import asyncio
+from types import SimpleNamespace
+
+from core.storage.cache import MessageBufferManager
+
+WABA = SimpleNamespace(waba_id="w1")
+
+
+def _message(i: int) -> dict:
+    return {"message": {"id": f"m{i}", "text": {"body": "hola"}}}
+
+
+def test_processed_messages_leave_the_buffer():
+    async def run():
+        manager = MessageBufferManager()
+        key = manager.get_or_create_buffer(WABA, "5491", "c1")
+        for i in range(3):
+            await manager.add_message(key, _message(i))
+
+        turn = [m["message"]["id"] for m in manager.get_unprocessed_messages(key)]
+        await manager.add_message(key, _message(3))
+        new_while_processing = await manager.has_new_pending_messages(key, turn)
+        manager.mark_messages_processed(key, turn)
+        return manager, key, turn, new_while_processing
+
+    manager, key, turn, new_while_processing = asyncio.run(run())
+    assert turn == ["m0", "m1", "m2"]
+    assert new_while_processing
+    # Solo queda el pendiente: los procesados no se conservan hasta el TTL
+    assert list(manager.get_buffer(key).pending) == ["m3"]
+
+
+def test_lock_is_handed_to_waiters_in_fifo_order():
+    async def run():
+        manager = MessageBufferManager()
+        order = []
+
+        async def turn(i: int):
+            await manager.acquire_lock("k")
+            order.append(i)
+            await asyncio.sleep(0)
+            manager.release_lock("k")
+
+        await manager.acquire_lock("k")
+        tasks = []
+        for i in range(5):
+            tasks.append(asyncio.create_task(turn(i)))
+            await asyncio.sleep(0)
+        assert manager.thread_locks["k"].refs == 6
+
+        manager.release_lock("k")
+        # Se cede directamente: nadie puede colarse entre release y el waiter
+        assert manager.is_locked("k")
+        await asyncio.gather(*tasks)
+        return order, manager
+
+    order, manager = asyncio.run(run())
+    assert order == [0, 1, 2, 3, 4]
+    assert manager.thread_locks == {}
+
+
+def test_lock_entries_are_dropped_when_no_holder_or_waiter_is_left():
+    async def run():
+        manager = MessageBufferManager()
+        await manager.acquire_lock("k")
+
+        timed_out = asyncio.create_task(manager.acquire_lock("k", max_wait=0.01))
+        cancelled = asyncio.create_task(manager.acquire_lock("k"))
+        await asyncio.sleep(0.05)
+        cancelled.cancel()
+        await asyncio.gather(timed_out, cancelled, return_exceptions=True)
+        # Solo queda la referencia del dueño
+        refs = manager.thread_locks["k"].refs
+
+        manager.clear_conversation("k")
+        held_after_clear = manager.is_locked("k")
+        manager.release_lock("k")
+        return manager, timed_out, cancelled, refs, held_after_clear
+
+    manager, timed_out, cancelled, refs, held_after_clear = asyncio.run(run())
+    assert isinstance(timed_out.exception(), TimeoutError)
+    assert cancelled.cancelled()
+    assert refs == 1 and held_after_clear
+    assert manager.thread_locks == {}
+    assert manager.get_lock_stats()["timeouts"] == 1
+
+
+def test_a_burst_is_answered_as_one_turn_after_the_quiet_period():
+    async def run():
+        manager = MessageBufferManager()
+        key = manager.get_or_create_buffer(WABA, "5491", "c1")
+        await manager.add_message(key, _message(0))
+
+        async def burst():
+            for i in range(1, 5):
+                await asyncio.sleep(0.02)
+                await manager.add_message(key, _message(i))
+
+        sender = asyncio.create_task(burst())
+        await manager.wait_for_quiet_period(key, quiet_period=0.2, max_wait=5)
+        # La espera termina recién cuando la ráfaga se calla
+        turn = [m["message"]["id"] for m in manager.get_unprocessed_messages(key)]
+        burst_done = sender.done()
+        manager.record_turn(len(turn))
+        return turn, burst_done, manager.get_coalescing_stats()
+
+    turn, burst_done, stats = asyncio.run(run())
+    assert burst_done
+    assert turn == [f"m{i}" for i in range(5)]
+    assert (stats["turns"], stats["messages"], stats["llm_calls_saved"]) == (1, 5, 4)
+
+
+def test_the_quiet_period_wait_is_capped_by_max_wait():
+    async def run():
+        manager = MessageBufferManager()
+        key = manager.get_or_create_buffer(WABA, "5491", "c1")
+        stop = asyncio.Event()
+
+        async def chatty():
+            i = 0
+            while not stop.is_set():
+                await manager.add_message(key, _message(i))
+                i += 1
+                await asyncio.sleep(0.01)
+
+        sender = asyncio.create_task(chatty())
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await manager.wait_for_quiet_period(key, quiet_period=0.05, max_wait=0.1)
+        waited = loop.time() - start
+        stop.set()
+        await sender
+
+        start = loop.time()
+        await manager.wait_for_quiet_period(key, quiet_period=0, max_wait=5)
+        return waited, loop.time() - start
+
+    waited, disabled = asyncio.run(run())
+    # Mensajes cada 10 ms: nunca hay 50 ms de silencio, corta el tope
+    assert 0.1 <= waited < 1.0
+    assert disabled < 0.01
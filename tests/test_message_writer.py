@@ -0,0 +1,275 @@
+# tests/test_message_writer.py
+import asyncio
+
+from postgrest.exceptions import APIError
+
+from core.services.message_writer import MessageWriter
+from core.storage.db import AsyncDBStorage
+from core.testing.fakes import FakePostgrest
+
+
+def _row(conversation_id: str, i: int) -> dict:
+    return {"conversation_id": conversation_id, "message_id": f"m{i}", "content": "x"}
+
+
+def _bad_row_rejected(table, op, payload):
+    # Violación de constraint: el lote que contiene la fila mala falla entero
+    if table == "messages" and any(r["message_id"] == "bad" for r in payload):
+        return APIError({"code": "23502", "message": "null value in column"})
+    return None
+
+
+def test_batches_keep_order_and_coalesce_activity():
+    async def run():
+        db = FakePostgrest()
+        writer = MessageWriter(db, flush_interval=60, batch_size=50)
+        writer.start()
+        for i in range(30):
+            for conv in ("c1", "c2", "c3"):
+                await writer.put(_row(conv, i))
+        await writer.stop()
+        return db
+
+    db = asyncio.run(run())
+    assert db.count("messages", "insert") == 2
+    assert db.count("conversations", "update") == 3
+    for conv in ("c1", "c2", "c3"):
+        rows = [r for r in db.rows["messages"] if r["conversation_id"] == conv]
+        assert [r["message_id"] for r in rows] == [f"m{i}" for i in range(30)]
+        stamps = [r["created_at"] for r in rows]
+        assert stamps == sorted(stamps) and len(set(stamps)) == 30
+
+
+def test_bad_row_is_dead_lettered_and_does_not_block_the_queue():
+    async def run():
+        db = FakePostgrest()
+        db.fail = _bad_row_rejected
+        writer = MessageWriter(db, flush_interval=60, batch_size=8)
+        writer.start()
+        for i in range(7):
+            await writer.put(_row("c1", i))
+        await writer.put({**_row("c1", 0), "message_id": "bad"})
+        for i in range(7, 12):
+            await writer.put(_row("c1", i))
+        await writer.stop()
+        return db, writer
+
+    db, writer = asyncio.run(run())
+    written = [r["message_id"] for r in db.rows["messages"]]
+    assert written == [f"m{i}" for i in range(12)]
+    assert writer.dead_lettered == 1
+    assert writer.dead_letters[0][1]["message_id"] == "bad"
+    assert writer.get_stats()["queue_depth"] == 0
+
+
+def test_transient_errors_back_off_then_give_up():
+    async def run():
+        db = FakePostgrest()
+        db.fail = lambda table, op, payload: ConnectionError("db down")
+        writer = MessageWriter(db, flush_interval=0.001, batch_size=10, max_retries=3)
+        await writer.put(_row("c1", 0))
+        for _ in range(10):
+            await asyncio.sleep(0.05)
+            await writer.flush()
+        return db, writer
+
+    db, writer = asyncio.run(run())
+    # 1 intento + 3 reintentos, después se descarta en vez de bloquear
+    assert db.count("messages", "insert") == 4
+    assert writer.retries == 3
+    assert writer.dead_lettered == 1
+    assert writer.get_stats()["queue_depth"] == 0
+
+
+def test_put_does_not_wait_on_a_failing_db_and_caps_memory():
+    async def run():
+        # Una base lenta: si put() esperara un flush tardaría >= 1 s
+        db = FakePostgrest(latency=1.0)
+        db.fail = lambda table, op, payload: ConnectionError("db down")
+        writer = MessageWriter(db, flush_interval=60, batch_size=10, max_pending=100)
+        writer.start()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for i in range(500):
+            await writer.put(_row("c1", i))
+        elapsed = loop.time() - start
+        writer._timer_task.cancel()
+        return writer, elapsed
+
+    writer, elapsed = asyncio.run(run())
+    assert elapsed < 0.5
+    assert writer.get_stats()["queue_depth"] <= 100
+    assert writer.dropped >= 400
+
+
+def test_failed_merge_is_dead_lettered():
+    async def run():
+        db = FakePostgrest()
+        db.fail = lambda table, op, payload: (
+            APIError({"code": "22P02", "message": "invalid input syntax for type uuid"})
+            if op == "rpc"
+            else None
+        )
+        writer = MessageWriter(db, flush_interval=60)
+        await writer.merge_metadata_many("not-a-uuid", ["m1"], {"a": 1})
+        await writer.put(_row("c1", 0))
+        return db, writer
+
+    db, writer = asyncio.run(run())
+    assert writer.get_stats()["pending_merges"] == 0
+    assert writer.dead_lettered == 1
+    assert [r["message_id"] for r in db.rows["messages"]] == ["m0"]
+
+
+def test_merge_updates_queued_rows_and_batches_the_rest_after_the_inserts():
+    async def run():
+        db = FakePostgrest()
+        writer = MessageWriter(db, flush_interval=60)
+        writer.start()
+        for i in range(3):
+            await writer.put(_row("c1", i))
+        await writer.flush()
+        for i in range(3, 5):
+            await writer.put(_row("c1", i))
+
+        await writer.merge_metadata_many(
+            "c1", ["m0", "m1", "m2", "m3", "m4"], {"category": "precios"}
+        )
+        # No espera al DB: las filas en cola ya tienen la metadata
+        assert db.count("rpc/merge_message_metadata", "rpc") == 0
+        assert writer.has_pending("c1")
+        await writer.stop()
+        return db, writer
+
+    db, writer = asyncio.run(run())
+    merges = [r for r in db.requests if r[1] == "rpc"]
+    assert merges == [
+        (
+            "rpc/merge_message_metadata",
+            "rpc",
+            {
+                "p_conversation_id": "c1",
+                "p_message_ids": ["m0", "m1", "m2"],
+                "p_metadata": {"category": "precios"},
+            },
+        )
+    ]
+    # La RPC va después del insert de las filas de su flush
+    tables = [table for table, _, _ in db.requests]
+    assert tables.index("rpc/merge_message_metadata") > max(
+        i for i, table in enumerate(tables) if table == "messages"
+    )
+    queued = [r for r in db.rows["messages"] if r["message_id"] in ("m3", "m4")]
+    assert all(r["metadata"] == {"category": "precios"} for r in queued)
+    assert writer.metadata_merged == 2
+    assert writer.metadata_rpcs == 1
+
+
+def test_storage_merges_metadata_in_one_rpc_without_a_writer():
+    async def run():
+        db = FakePostgrest()
+        storage = AsyncDBStorage(db)
+        await storage.merge_messages_metadata("c1", ["m0", "m1", "m2"], {"a": 1})
+        await storage.merge_messages_metadata("c1", [], {"a": 1})
+        return db
+
+    db = asyncio.run(run())
+    assert db.requests == [
+        (
+            "rpc/merge_message_metadata",
+            "rpc",
+            {
+                "p_conversation_id": "c1",
+                "p_message_ids": ["m0", "m1", "m2"],
+                "p_metadata": {"a": 1},
+            },
+        )
+    ]
+
+
+def _failing(times: int):
+    """fail hook: the first `times` requests raise a transient error"""
+    calls = []
+
+    def fail(table, op, payload):
+        calls.append(table)
+        if len(calls) <= times:
+            return ConnectionError("db down")
+        return None
+
+    return fail
+
+
+def test_wait_written_waits_through_the_backoff():
+    async def run():
+        db = FakePostgrest()
+        db.fail = _failing(2)
+        writer = MessageWriter(db, flush_interval=0.01)
+        writer.start()
+        await writer.put(_row("c1", 0))
+        await writer.flush()
+        # Primer intento fallido: la fila sigue en cola, en backoff
+        assert writer.has_pending("c1")
+        await writer.wait_written("c1")
+        written = [r["message_id"] for r in db.rows.get("messages", [])]
+        await writer.stop()
+        return written, writer
+
+    written, writer = asyncio.run(run())
+    assert written == ["m0"]
+    assert writer.retries == 2
+
+
+def test_wait_written_returns_once_the_rows_are_dead_lettered():
+    async def run():
+        db = FakePostgrest()
+        db.fail = lambda table, op, payload: ConnectionError("db down")
+        writer = MessageWriter(db, flush_interval=0.001, max_retries=2)
+        writer.start()
+        await writer.put(_row("c1", 0))
+        await asyncio.wait_for(writer.wait_written("c1"), timeout=5)
+        writer._timer_task.cancel()
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.dead_lettered == 1
+    assert not writer.has_pending("c1")
+
+
+def test_stop_retries_a_transient_error_without_waiting_the_backoff():
+    async def run():
+        db = FakePostgrest()
+        db.fail = _failing(1)
+        # Backoff largo: stop() no lo espera
+        writer = MessageWriter(db, flush_interval=60)
+        writer.start()
+        for i in range(3):
+            await writer.put(_row("c1", i))
+        await asyncio.wait_for(writer.stop(), timeout=5)
+        return db, writer
+
+    db, writer = asyncio.run(run())
+    assert [r["message_id"] for r in db.rows["messages"]] == ["m0", "m1", "m2"]
+    assert writer.dropped == 0
+
+
+def test_stop_logs_and_counts_what_could_not_be_written(caplog):
+    async def run():
+        db = FakePostgrest()
+        db.fail = lambda table, op, payload: ConnectionError("db down")
+        writer = MessageWriter(db, flush_interval=60, max_retries=1)
+        writer.start()
+        for i in range(5):
+            await writer.put(_row("c1", i))
+        await writer.merge_metadata_many("c1", ["old"], {"a": 1})
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(run())
+    stats = writer.get_stats()
+    assert stats["queue_depth"] == 0 and stats["pending_merges"] == 0
+    # El lote de mensajes agota su reintento; la fusión no se llegó a reintentar
+    assert writer.dead_lettered == 5
+    assert writer.dropped == 1
+    assert not writer.has_pending("c1")
+    assert "stopped with 1 unwritten entries" in caplog.text
@@ -0,0 +1,101 @@
+# tests/test_multi_worker.py
+"""Two workers sharing one Redis (fakeredis): what STATE_BACKEND=redis promises"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from core.models.enums import MessageRole
+from core.storage.cache import ConversationContext, MessageBufferManager
+from core.storage.state import RedisStateBackend
+from core.utils.dedupe import WebhookDeduplicator
+
+fakeredis = pytest.importorskip("fakeredis")
+
+WABA = SimpleNamespace(waba_id="w1")
+
+
+def _workers(n: int):
+    server = fakeredis.FakeServer()
+    return [
+        RedisStateBackend(
+            "", client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        )
+        for _ in range(n)
+    ]
+
+
+def test_turns_serialize_and_see_each_other():
+    async def run():
+        backends = _workers(2)
+        workers = [
+            (
+                MessageBufferManager(state_backend=backend),
+                ConversationContext(state_backend=backend),
+            )
+            for backend in backends
+        ]
+        keys = [m.get_or_create_buffer(WABA, "5491", "c1") for m, _ in workers]
+        assert keys[0] == keys[1]
+        key = keys[0]
+
+        # Cada worker recibe un mensaje distinto del mismo sender
+        for (manager, context), (message_id, text) in zip(
+            workers, [("m1", "hola"), ("m2", "que tal")]
+        ):
+            await manager.add_message(key, {"message": {"id": message_id}})
+            context.add_message("w1", "5491", MessageRole.USER, text)
+            await context.sync("w1", "5491")
+
+        order, seen = [], {}
+
+        async def drain(name, manager, context):
+            async with manager.with_lock(key, max_wait=5):
+                order.append(f"{name}-in")
+                await manager.sync_pending(key)
+                await context.load("w1", "5491")
+                ids = [m["message"]["id"] for m in manager.get_unprocessed_messages(key)]
+                seen[name] = (ids, [m["content"] for m in context.get_messages("w1", "5491")])
+                await asyncio.sleep(0.05)
+                context.add_message("w1", "5491", MessageRole.ASSISTANT, f"resp {name}")
+                await context.sync("w1", "5491")
+                await manager.ack_messages(key, ids)
+                order.append(f"{name}-out")
+
+        await asyncio.gather(*(drain(n, m, c) for n, (m, c) in zip("AB", workers)))
+        pending = await backends[1].get_pending(key)
+        for backend in backends:
+            await backend.close()
+        return order, seen, pending
+
+    order, seen, pending = asyncio.run(run())
+    assert order in (["A-in", "A-out", "B-in", "B-out"], ["B-in", "B-out", "A-in", "A-out"])
+    first, second = ("A", "B") if order[0] == "A-in" else ("B", "A")
+    assert seen[first] == (["m1", "m2"], ["hola", "que tal"])
+    assert seen[second] == ([], ["hola", "que tal", f"resp {first}"])
+    assert pending == []
+
+
+def test_a_retry_delivered_to_another_worker_is_suppressed():
+    async def run():
+        dedupers = [WebhookDeduplicator(backend=backend) for backend in _workers(2)]
+        first = await dedupers[0].is_duplicate("wamid.1")
+        retry = await dedupers[1].is_duplicate("wamid.1")
+        other = await dedupers[1].is_duplicate("wamid.2")
+        return first, retry, other, dedupers[1].get_stats()
+
+    first, retry, other, stats = asyncio.run(run())
+    assert (first, retry, other) == (False, True, False)
+    assert stats["shared"] and stats["suppressed"]["messages"] == 1
+
+
+def test_a_forgotten_event_is_processed_by_another_worker():
+    async def run():
+        dedupers = [WebhookDeduplicator(backend=backend) for backend in _workers(2)]
+        await dedupers[0].is_duplicate("wamid.1")
+        await dedupers[0].forget("wamid.1")
+        retry = await dedupers[1].is_duplicate("wamid.1")
+        again = await dedupers[0].is_duplicate("wamid.1")
+        return retry, again
+
+    assert asyncio.run(run()) == (False, True)
@@ -0,0 +1,61 @@
+# tests/test_prompt_prefix.py
+from itertools import permutations
+from types import SimpleNamespace
+
+from core.models.enums import InstructionsStrategy, MessageRole
+from core.models.waba import WABAConfig
+from core.storage.cache import ConversationContext
+
+_CLASSIFIED = SimpleNamespace(
+    instructions_strategy=InstructionsStrategy.CLASSIFIED,
+    custom_instructions={
+        "base": "Sos un asistente.",
+        "precios": "Los precios son...",
+        "cursos": "Los cursos son...",
+        "pagos": "Los pagos son...",
+    },
+)
+
+
+def test_instructions_are_identical_for_any_category_order():
+    texts = {
+        WABAConfig.get_instructions(_CLASSIFIED, *order)[0]["content"]
+        for order in permutations(["pagos", "base", "cursos"])
+    }
+    assert len(texts) == 1
+    (text,) = texts
+    # Base primero y después el orden de custom_instructions
+    assert text.index("Sos un asistente") < text.index("cursos") < text.index("pagos")
+    assert "precios" not in text
+
+
+def test_full_context_goes_from_most_to_least_stable():
+    context = ConversationContext()
+    context.set_prefix_instructions("w1", "5491", [{"role": "system", "content": "P"}])
+    context.add_message("w1", "5491", MessageRole.USER, "hola")
+    context.add_temp_context("w1", "5491", "T")
+    context.contexts["5491_w1"].summary = "S"
+
+    first = context.get_full_context("w1", "5491")
+    assert [m["content"][-1] for m in first] == ["P", "S", "a", "T"]
+
+    # Otro turno: el contexto temporal cambia pero el prefijo anterior se repite
+    context.clear_temp_context("w1", "5491")
+    context.add_message("w1", "5491", MessageRole.ASSISTANT, "buenas")
+    context.add_temp_context("w1", "5491", "U")
+    second = context.get_full_context("w1", "5491")
+    assert second[: len(first) - 1] == first[:-1]
+
+
+def test_prompt_cache_hits_are_reported_token_weighted():
+    context = ConversationContext()
+    context.record_prompt_tokens(1000, 0)
+    context.record_prompt_tokens(1000, 768)
+    context.record_prompt_tokens(2000, 1536)
+
+    cache = context.get_token_stats()["prompt_cache"]
+    assert cache == {
+        "cached_tokens": 2304,
+        "hit_rate": 0.576,
+        "completions_with_hits": 2,
+    }
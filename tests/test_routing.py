@@ -0,0 +1,62 @@
+# tests/test_routing.py
+from types import SimpleNamespace
+
+from core.config.manager import ConfigManager
+
+
+def _config(waba_id: str, phone_number_id: str):
+    return SimpleNamespace(
+        waba_config=SimpleNamespace(waba_id=waba_id, phone_number_id=phone_number_id)
+    )
+
+
+def test_resolve_by_phone_number_id_then_waba():
+    manager = ConfigManager()
+    manager.register_client("a", _config("waba-a", "phone-a"))
+    manager.register_client("b", _config("waba-b", "phone-b"))
+
+    assert manager.resolve_client("waba-b")[0] == "b"
+    assert manager.resolve_client(None, "phone-a")[0] == "a"
+    # El phone number ID tiene prioridad sobre el WABA ID
+    assert manager.resolve_client("waba-a", "phone-b")[0] == "b"
+    assert manager.resolve_client("waba-a", "unknown")[0] == "a"
+    assert manager.resolve_client("unknown", "unknown") == (None, None)
+
+
+def test_reregistering_a_client_moves_its_index_entries():
+    manager = ConfigManager()
+    manager.register_client("a", _config("waba-old", "phone-old"))
+    manager.register_client("a", _config("waba-new", "phone-new"))
+
+    assert manager.resolve_client("waba-old", "phone-old") == (None, None)
+    assert manager.resolve_client("waba-new")[0] == "a"
+
+
+def test_a_shared_waba_routes_by_phone_number_id(caplog):
+    manager = ConfigManager()
+    manager.register_client("a", _config("waba-shared", "phone-a"))
+    manager.register_client("b", _config("waba-shared", "phone-b"))
+
+    # Sin importar el orden de registro, cada número va a su cliente
+    assert manager.resolve_client("waba-shared", "phone-a")[0] == "a"
+    assert manager.resolve_client("waba-shared", "phone-b")[0] == "b"
+    # La WABA sola es ambigua: no se adivina el cliente
+    assert manager.resolve_client("waba-shared") == (None, None)
+    assert manager.resolve_client("waba-shared", "phone-unknown") == (None, None)
+    assert "shared by clients ['a', 'b']" in caplog.text
+
+
+def test_unregistering_a_client_keeps_the_others_on_a_shared_waba():
+    manager = ConfigManager()
+    manager.register_client("a", _config("waba-shared", "phone-a"))
+    manager.register_client("b", _config("waba-shared", "phone-b"))
+
+    manager.unregister_client("a")
+
+    assert manager.get_client_config("a") is None
+    assert manager.resolve_client("waba-shared", "phone-a")[0] == "b"
+    assert manager.resolve_client("waba-shared")[0] == "b"
+
+    manager.unregister_client("b")
+    manager.unregister_client("b")
+    assert manager.resolve_client("waba-shared", "phone-b") == (None, None)
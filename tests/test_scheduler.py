@@ -0,0 +1,95 @@
+# tests/test_scheduler.py
+import asyncio
+
+import pytest
+
+from core.services.scheduler import ConversationScheduler
+
+
+def _keys_on_distinct_lanes(scheduler: ConversationScheduler, count: int) -> list:
+    keys, lanes = [], set()
+    i = 0
+    while len(keys) < count:
+        key = f"549{i}_w1"
+        if scheduler.lane_for(key) not in lanes:
+            keys.append(key)
+            lanes.add(scheduler.lane_for(key))
+        i += 1
+    return keys
+
+
+def test_work_of_a_conversation_runs_in_order_and_others_in_parallel():
+    async def run():
+        scheduler = ConversationScheduler(lanes=4)
+        a, b = _keys_on_distinct_lanes(scheduler, 2)
+        log, in_flight, peak = [], {a: 0, b: 0}, {a: 0, b: 0, "total": 0}
+
+        def work(key: str, i: int):
+            async def factory():
+                in_flight[key] += 1
+                peak[key] = max(peak[key], in_flight[key])
+                peak["total"] = max(peak["total"], sum(in_flight.values()))
+                await asyncio.sleep(0.01)
+                log.append((key, i))
+                in_flight[key] -= 1
+                return i
+
+            return factory
+
+        results = await asyncio.gather(
+            *(scheduler.run(key, work(key, i)) for i in range(5) for key in (a, b))
+        )
+        await scheduler.stop()
+        return a, b, log, peak, results
+
+    a, b, log, peak, results = asyncio.run(run())
+    for key in (a, b):
+        assert [i for k, i in log if k == key] == list(range(5))
+        assert peak[key] == 1
+    assert results == [i for i in range(5) for _ in range(2)]
+    # Un turno a la vez por conversación, las dos conversaciones a la par
+    assert peak["total"] == 2
+
+
+def test_a_failure_reaches_the_caller_and_the_lane_keeps_going():
+    async def run():
+        scheduler = ConversationScheduler(lanes=1)
+
+        async def fail():
+            raise ValueError("boom")
+
+        async def ok():
+            return "ok"
+
+        with pytest.raises(ValueError):
+            await scheduler.run("k", fail)
+        result = await scheduler.run("k", ok)
+        await scheduler.stop()
+        return result, scheduler.get_stats()
+
+    result, stats = asyncio.run(run())
+    assert result == "ok"
+    assert stats["completed"] == [2]
+
+
+def test_drain_requests_during_a_drain_coalesce_into_one_more_run():
+    async def run():
+        scheduler = ConversationScheduler(lanes=2)
+        runs = []
+        release = asyncio.Event()
+
+        async def drain():
+            runs.append(len(runs))
+            if len(runs) == 1:
+                await release.wait()
+
+        for _ in range(4):
+            scheduler.request_drain("k", drain)
+            await asyncio.sleep(0)
+        release.set()
+        await scheduler.stop()
+        return runs, scheduler.get_stats()
+
+    runs, stats = asyncio.run(run())
+    assert runs == [0, 1]
+    assert (stats["drains_started"], stats["drains_coalesced"]) == (1, 3)
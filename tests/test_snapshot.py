@@ -0,0 +1,85 @@
+# tests/test_snapshot.py
+import asyncio
+import gc
+
+import pytest
+
+from clients import register_all_clients
+from core.models.enums import MessageRole
+from core.routers import webhook_processor
+from core.services.snapshot import StateSnapshotter
+
+
+@pytest.fixture
+def containers(monkeypatch):
+    # El restore solo carga clientes registrados. Containers propios del
+    # test, sin tocar los del proceso
+    register_all_clients()
+    registry = {}
+    monkeypatch.setattr(webhook_processor, "_client_containers", registry)
+    return registry
+
+
+def _fill(context, conversations: int = 3, messages: int = 4) -> None:
+    for c in range(conversations):
+        for i in range(messages):
+            context.add_message("w1", f"549{c}", MessageRole.USER, f"mensaje {c}.{i}")
+
+
+def test_contexts_survive_a_restart(containers, tmp_path):
+    path = str(tmp_path / "state.snapshot")
+
+    async def run():
+        context = webhook_processor.get_or_create_container("demo").context
+        _fill(context)
+        context.contexts["5490_w1"].summary = "resumen previo"
+        expected = {
+            key: (context.get_messages("w1", key.split("_")[0]), state.summary)
+            for key, state in context.contexts.items()
+        }
+        await StateSnapshotter(path, interval=0).write()
+
+        containers.clear()
+        counts = await StateSnapshotter(path, interval=0).restore()
+        restored = webhook_processor.get_or_create_container("demo").context
+        got = {
+            key: (restored.get_messages("w1", key.split("_")[0]), state.summary)
+            for key, state in restored.contexts.items()
+        }
+        return counts, expected, got
+
+    counts, expected, got = asyncio.run(run())
+    assert counts["contexts"] == 3
+    assert got == expected
+
+
+def test_restore_leaves_the_gc_as_it_found_it(containers, tmp_path):
+    path = str(tmp_path / "state.snapshot")
+
+    async def run():
+        _fill(webhook_processor.get_or_create_container("demo").context)
+        await StateSnapshotter(path, interval=0).write()
+        containers.clear()
+
+        await StateSnapshotter(path, interval=0).restore()
+        enabled_after = gc.isenabled()
+
+        containers.clear()
+        gc.disable()
+        try:
+            await StateSnapshotter(path, interval=0).restore()
+            disabled_after = not gc.isenabled()
+        finally:
+            gc.enable()
+        return enabled_after, disabled_after
+
+    assert asyncio.run(run()) == (True, True)
+
+
+def test_an_unreadable_snapshot_is_ignored(containers, tmp_path):
+    path = tmp_path / "state.snapshot"
+    path.write_bytes(b"\x93not msgpack")
+
+    counts = asyncio.run(StateSnapshotter(str(path), interval=0).restore())
+    assert counts == {}
+    assert gc.isenabled()
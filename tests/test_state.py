@@ -0,0 +1,40 @@
+# tests/test_state.py
+import asyncio
+
+import pytest
+
+from core.storage.state import MemoryStateBackend, RedisStateBackend
+
+
+def _backend(kind: str):
+    if kind == "memory":
+        return MemoryStateBackend()
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisStateBackend("", client=fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+@pytest.mark.parametrize("kind", ["memory", "redis"])
+def test_claim_is_check_and_set_until_unclaimed(kind):
+    backend = _backend(kind)
+
+    async def run():
+        first = await backend.claim("dedupe:wamid.1", 60)
+        again = await backend.claim("dedupe:wamid.1", 60)
+        other = await backend.claim("dedupe:wamid.2", 30)
+        await backend.unclaim("dedupe:wamid.1")
+        reclaimed = await backend.claim("dedupe:wamid.1", 60)
+        return first, again, other, reclaimed
+
+    assert asyncio.run(run()) == (True, False, True, True)
+
+
+def test_memory_claims_expire_after_their_ttl():
+    backend = MemoryStateBackend()
+
+    async def run():
+        await backend.claim("short", 0.05)
+        await backend.claim("long", 60)
+        await asyncio.sleep(0.1)
+        return await backend.claim("short", 0.05), await backend.claim("long", 60)
+
+    assert asyncio.run(run()) == (True, False)
@@ -0,0 +1,21 @@
+# tests/test_statuses.py
+import asyncio
+
+from core.models.webhook import WebhookStatus
+from core.services.statuses import StatusTracker
+from core.testing.fakes import FakePostgrest
+
+
+def test_statuses_are_upserted_in_batches_on_the_async_client():
+    async def run():
+        db = FakePostgrest(latency=0.01)
+        tracker = StatusTracker(db, flush_interval=60, batch_size=10)
+        for i in range(25):
+            tracker.record("w1", WebhookStatus(id=f"wamid.{i}", status="delivered"))
+        await tracker.flush()
+        return db, tracker
+
+    db, tracker = asyncio.run(run())
+    assert db.count("message_statuses", "upsert") == 3
+    assert len(db.rows["message_statuses"]) == 25
+    assert tracker.get_stats()["by_waba"]["w1"]["delivered"] == 25
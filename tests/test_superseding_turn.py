@@ -0,0 +1,97 @@
+# tests/test_superseding_turn.py
+import asyncio
+from types import SimpleNamespace
+
+from core.services.openai_handler import OpenAIHandler
+
+
+class _Buffer:
+    """Buffer manager stub: a new message 'arrives' when `arrived` is set"""
+
+    def __init__(self, watcher_error: Exception = None):
+        self.arrived = asyncio.Event()
+        self.watcher_error = watcher_error
+        self.cancelled_turns = 0
+
+    async def wait_for_new_message(self, key, processing_ids):
+        if self.watcher_error:
+            raise self.watcher_error
+        await self.arrived.wait()
+
+    async def has_new_pending_messages(self, key, processing_ids):
+        return self.arrived.is_set()
+
+    def record_cancelled_turn(self, elapsed, tokens_saved):
+        self.cancelled_turns += 1
+
+
+def _handler(buffer: _Buffer) -> OpenAIHandler:
+    return OpenAIHandler(
+        client_id="demo",
+        waba_conf=SimpleNamespace(waba_id="w1"),
+        sender_phone="5491",
+        conversation_id="c1",
+        current_processing_ids=["m1"],
+        service_container=SimpleNamespace(message_buffer_manager=buffer),
+    )
+
+
+def test_uncommitted_turn_is_cancelled_by_a_new_message():
+    async def run():
+        buffer = _Buffer()
+        handler = _handler(buffer)
+        effects = []
+
+        async def turn():
+            await asyncio.sleep(0.05)
+            if await handler.commit_response():
+                effects.append("sent")
+
+        asyncio.get_running_loop().call_later(0.01, buffer.arrived.set)
+        await handler.run_superseding_turn(turn)
+        return handler, buffer, effects
+
+    handler, buffer, effects = asyncio.run(run())
+    assert handler.superseded and buffer.cancelled_turns == 1
+    assert effects == []
+
+
+def test_committed_side_effect_runs_once_and_the_turn_finishes():
+    async def run():
+        buffer = _Buffer()
+        handler = _handler(buffer)
+        effects = []
+
+        async def turn():
+            assert await handler.commit_response()
+            # La herramienta tarda; el mensaje nuevo llega mientras tanto
+            buffer.arrived.set()
+            await asyncio.sleep(0.02)
+            effects.append("email")
+            await asyncio.sleep(0.02)
+            effects.append("follow-up")
+
+        await handler.run_superseding_turn(turn)
+        return handler, buffer, effects
+
+    handler, buffer, effects = asyncio.run(run())
+    assert not handler.superseded and buffer.cancelled_turns == 0
+    assert effects == ["email", "follow-up"]
+
+
+def test_failing_watcher_lets_the_turn_finish():
+    async def run():
+        buffer = _Buffer(watcher_error=ConnectionError("redis down"))
+        handler = _handler(buffer)
+        effects = []
+
+        async def turn():
+            await asyncio.sleep(0.02)
+            effects.append("sent")
+
+        await handler.run_superseding_turn(turn)
+        return handler, effects
+
+    handler, effects = asyncio.run(run())
+    assert not handler.superseded
+    assert effects == ["sent"]
@@ -0,0 +1,61 @@
+# tests/test_tokens.py
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from core.utils import tokens
+
+
+class _Encoding:
+    def encode(self, text):
+        return text.split()
+
+
+def _fake_tiktoken(get_encoding):
+    return SimpleNamespace(
+        get_encoding=get_encoding,
+        model=SimpleNamespace(
+            MODEL_TO_ENCODING={"gpt-4": "cl100k_base"},
+            MODEL_PREFIX_TO_ENCODING={"gpt-4o-": "o200k_base"},
+        ),
+    )
+
+
+def test_encoders_load_off_the_loop_and_are_used_once_loaded(monkeypatch):
+    loaded_on = []
+
+    def get_encoding(name):
+        loaded_on.append(threading.get_ident())
+        return _Encoding()
+
+    monkeypatch.setattr(tokens, "tiktoken", _fake_tiktoken(get_encoding))
+    monkeypatch.setattr(tokens, "_encodings", {})
+    tokens._encoding_name.cache_clear()
+
+    text = "uno dos tres cuatro cinco seis siete ocho"
+    # Antes de cargar: estimación, sin tocar tiktoken
+    assert tokens.count_tokens(text, "gpt-4") == len(text) // 4 + 1
+    assert loaded_on == []
+
+    asyncio.run(tokens.load_encodings())
+    tokens._encoding_name.cache_clear()
+
+    assert len(loaded_on) == 2
+    assert threading.get_ident() not in loaded_on
+    assert tokens.count_tokens(text, "gpt-4") == 8
+    assert tokens.count_tokens(text, "gpt-4o-mini") == 8
+
+
+def test_a_failed_load_falls_back_to_the_estimate(monkeypatch):
+    def get_encoding(name):
+        raise OSError("network unreachable")
+
+    monkeypatch.setattr(tokens, "tiktoken", _fake_tiktoken(get_encoding))
+    monkeypatch.setattr(tokens, "_encodings", {})
+    tokens._encoding_name.cache_clear()
+
+    asyncio.run(tokens.load_encodings())
+    tokens._encoding_name.cache_clear()
+
+    assert tokens._encodings == {}
+    assert tokens.count_message_tokens([{"content": "x" * 40}]) == 11 + 4
@@ -0,0 +1,58 @@
+# tests/test_waba_config_cache.py
+import asyncio
+
+import pytest
+
+from core.services.cache import WABAConfigCache
+from core.storage.state import RedisStateBackend
+from core.testing.fakes import FakePostgrest
+
+
+def test_failed_reload_keeps_the_cached_config():
+    async def run():
+        db = FakePostgrest()
+        db.fail = lambda table, op, payload: ConnectionError("db down")
+        cache = WABAConfigCache(db)
+        cached = object()
+        cache._cache["demo:w1"] = cached
+        cache._loaded_at["demo:w1"] = 0.0
+        with pytest.raises(ConnectionError):
+            await cache.reload("demo", "w1")
+        return cache, cached
+
+    cache, cached = asyncio.run(run())
+    assert cache._cache["demo:w1"] is cached
+    assert cache.is_cached("demo", "w1")
+
+
+def test_reload_is_published_to_every_process():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def run():
+        server = fakeredis.FakeServer()
+        backends = [
+            RedisStateBackend(
+                "", client=fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+            )
+            for _ in range(3)
+        ]
+        received = {i: [] for i in range(3)}
+        for i, backend in enumerate(backends):
+
+            async def handler(message, i=i):
+                received[i].append(message)
+
+            await backend.subscribe("waba_config_reload", handler)
+
+        await asyncio.sleep(0.05)
+        await backends[0].publish("waba_config_reload", "p0:w1")
+        for _ in range(50):
+            if all(received.values()):
+                break
+            await asyncio.sleep(0.01)
+        for backend in backends:
+            await backend.close()
+        return received
+
+    received = asyncio.run(run())
+    assert received == {i: ["p0:w1"] for i in range(3)}
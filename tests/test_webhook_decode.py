@@ -0,0 +1,90 @@
+# tests/test_webhook_decode.py
+import json
+
+import pytest
+
+from core.models.webhook import decode_webhook, encode_webhook
+from core.services.dispatcher import partition_by_conversation
+from core.testing import payloads
+
+
+def _unknown_fields_message(sender: str, wamid: str) -> dict:
+    # Campos que el struct no declara (tipos nuevos de Meta, por ejemplo)
+    return {
+        **payloads.text_message(sender, wamid),
+        "identity": {"acknowledged": True, "hash": "c2hh"},
+        "text": {"body": "hola", "preview_url": False},
+    }
+
+
+def test_decode_types_messages_and_statuses():
+    raw = json.dumps(
+        payloads.envelope(
+            payloads.entry(
+                payloads.change(
+                    messages=[payloads.text_message("5491", "wamid.1", "hola")],
+                    statuses=[payloads.status("5492", "wamid.0", "read")],
+                )
+            )
+        )
+    ).encode()
+
+    value = decode_webhook(raw).normalized().entry[0].changes[0].value
+    message, status = value.messages[0], value.statuses[0]
+    assert (message.from_, message.id, message.text.body) == ("5491", "wamid.1", "hola")
+    assert message.to_dict()["from"] == "5491"
+    assert (status.id, status.status, status.recipient_id) == ("wamid.0", "read", "5492")
+    assert decode_webhook(encode_webhook(decode_webhook(raw))) == decode_webhook(raw)
+
+
+def test_dashboard_test_payload_is_wrapped():
+    raw = json.dumps(
+        payloads.change(messages=[payloads.interactive_message("5491", "wamid.1")])
+    ).encode()
+
+    payload = decode_webhook(raw).normalized()
+    assert payload.entry[0].id == payloads.PHONE_NUMBER_ID
+    message = payload.entry[0].changes[0].value.messages[0]
+    assert message.interactive["button_reply"]["id"] == "pagar"
+
+
+def test_invalid_bodies_raise_value_error():
+    with pytest.raises(ValueError):
+        decode_webhook(b"{not json")
+    with pytest.raises(ValueError):
+        decode_webhook(b'{"entry": "nope"}')
+    with pytest.raises(ValueError):
+        decode_webhook(b"{}").normalized()
+
+
+def test_messages_keep_the_fields_meta_sent():
+    originals = [
+        _unknown_fields_message("5491", "wamid.1"),
+        _unknown_fields_message("5492", "wamid.2"),
+    ]
+    raw = json.dumps(
+        payloads.envelope(
+            payloads.entry(payloads.change(messages=originals[:1])),
+            payloads.entry(payloads.change(messages=originals[1:])),
+        )
+    ).encode()
+
+    payload = decode_webhook(raw)
+    messages = [entry.changes[0].value.messages[0] for entry in payload.entry]
+    assert [m.original() for m in messages] == originals
+    assert "identity" not in messages[0].to_dict()
+
+    # El reenvío a los workers (un lote partido) tampoco los pierde
+    parts = partition_by_conversation(payload, lambda key: int(key[3]) % 2)
+    assert len(parts) == 2
+    for part in parts.values():
+        value = decode_webhook(encode_webhook(part)).entry[0].changes[0].value
+        assert value.messages[0].original() in originals
+
+
+def test_dashboard_test_payload_keeps_the_raw_message():
+    original = _unknown_fields_message("5491", "wamid.1")
+    raw = json.dumps(payloads.change(messages=[original])).encode()
+
+    message = decode_webhook(raw).normalized().entry[0].changes[0].value.messages[0]
+    assert message.original() == original
@@ -0,0 +1,143 @@
+# tests/test_webhook_fanout.py
+import asyncio
+import json
+
+from core.models.webhook import decode_webhook
+from core.routers import webhook_processor
+from core.testing import payloads
+from core.testing.fakes import RoutingStub
+
+
+def _batched_payload():
+    # 2 entries (WABAs), 3 senders x 3 mensajes y 1 status por entry
+    entries = []
+    for e in range(2):
+        messages = [
+            payloads.text_message(f"549{e}{s}", f"wamid.{e}.{s}.{i}", f"msg {i}")
+            for i in range(3)
+            for s in range(3)
+        ]
+        statuses = [payloads.status(f"549{e}9", f"wamid.out.{e}")]
+        entries.append(
+            payloads.entry(
+                payloads.change(messages=messages, statuses=statuses),
+                waba_id=f"waba{e}",
+            )
+        )
+    return decode_webhook(json.dumps(payloads.envelope(*entries)).encode())
+
+
+def test_every_entry_message_and_status_is_processed_in_sender_order(monkeypatch):
+    stub = RoutingStub(latency=0.01)
+    stub.install(monkeypatch.setattr)
+
+    async def run():
+        await webhook_processor.process_meta_webhook(_batched_payload())
+        await webhook_processor.conversation_scheduler.stop()
+
+    asyncio.run(run())
+
+    assert len(stub.handled) == 18
+    for e in range(2):
+        for s in range(3):
+            sender = f"549{e}{s}"
+            wamids = [wamid for who, wamid in stub.handled if who == sender]
+            assert wamids == [f"wamid.{e}.{s}.{i}" for i in range(3)]
+    assert sorted(stub.statuses) == [
+        ("waba0", "wamid.out.0", "delivered"),
+        ("waba1", "wamid.out.1", "delivered"),
+    ]
+    # Senders distintos corren en paralelo
+    assert stub.max_in_flight > 1
+
+
+def test_a_retried_batch_is_suppressed(monkeypatch):
+    stub = RoutingStub()
+    stub.install(monkeypatch.setattr)
+
+    async def run():
+        await webhook_processor.process_meta_webhook(_batched_payload())
+        await webhook_processor.process_meta_webhook(_batched_payload())
+        await webhook_processor.conversation_scheduler.stop()
+
+    asyncio.run(run())
+
+    assert len(stub.handled) == 18
+    assert len(stub.statuses) == 2
+    assert webhook_processor.webhook_deduplicator.get_stats()["suppressed"] == {
+        "messages": 18,
+        "statuses": 2,
+    }
+
+
+def test_a_message_that_failed_is_processed_on_retry(monkeypatch):
+    stub = RoutingStub()
+    stub.install(monkeypatch.setattr)
+    failing = {"wamid.0.1.1"}
+
+    async def flaky_handler(message, *args):
+        if message["id"] in failing:
+            failing.discard(message["id"])
+            raise ConnectionError("db down")
+        await stub.handle_message(message, *args)
+
+    monkeypatch.setattr(webhook_processor, "handle_message_case", flaky_handler)
+
+    async def run():
+        await webhook_processor.process_meta_webhook(_batched_payload())
+        await webhook_processor.process_meta_webhook(_batched_payload())
+        await webhook_processor.conversation_scheduler.stop()
+
+    asyncio.run(run())
+
+    assert len(stub.handled) == 18
+    assert webhook_processor.webhook_deduplicator.get_stats()["suppressed"] == {
+        "messages": 17,
+        "statuses": 2,
+    }
+
+
+def test_messages_of_an_unresolved_tenant_are_not_recorded(monkeypatch):
+    stub = RoutingStub()
+    stub.install(monkeypatch.setattr)
+    resolved = stub.resolve_tenant
+
+    async def unresolved_once(waba_id, phone_id, tenants):
+        monkeypatch.setattr(webhook_processor, "_resolve_tenant", resolved)
+        return None
+
+    monkeypatch.setattr(webhook_processor, "_resolve_tenant", unresolved_once)
+
+    async def run():
+        await webhook_processor.process_meta_webhook(_batched_payload())
+        await webhook_processor.process_meta_webhook(_batched_payload())
+        await webhook_processor.conversation_scheduler.stop()
+
+    asyncio.run(run())
+
+    # La primera entry del primer intento no tuvo cliente: pasa en el reintento
+    assert len(stub.handled) == 18
+    assert webhook_processor.webhook_deduplicator.get_stats()["suppressed"]["messages"] == 9
+
+
+def test_handlers_get_the_message_as_meta_sent_it(monkeypatch):
+    stub = RoutingStub()
+    stub.install(monkeypatch.setattr)
+    received = []
+
+    async def handle_message(message, *args):
+        received.append(message)
+
+    monkeypatch.setattr(webhook_processor, "handle_message_case", handle_message)
+    original = {**payloads.text_message("5491", "wamid.1"), "identity": {"a": 1}}
+    raw = json.dumps(
+        payloads.envelope(payloads.entry(payloads.change(messages=[original])))
+    ).encode()
+
+    async def run():
+        await webhook_processor.process_meta_webhook(decode_webhook(raw))
+        await webhook_processor.conversation_scheduler.stop()
+
+    asyncio.run(run())
+    # Es el original_message que se guarda: sin perder campos desconocidos
+    assert received == [original]